@@ -7,15 +7,28 @@ import os
 import json
 import time
 import sys
-
-try:
-    import pandas as pd
-except ImportError as e:
-    print(f"Warning: pandas import failed: {e}", file=sys.stderr)
-    pd = None
+import functools
+import itertools
+import math
+import re
+import threading
 
 try:
     from scrape_page_numbers import scrape_page_number, construct_url, DEFAULT_DELAY_SECONDS, MIN_DELAY_SECONDS
+    from batch import RateLimiter, scrape_batch, DEFAULT_WORKERS, MAX_WORKERS
+    from result_cache import ResultCache
+    from http_cache import ValidatorStore
+    import http_client
+    from job_store import JobStore, DOWNLOAD_FORMATS, is_valid_job_id
+    from ingest import iter_identifiers, unique, create_seen_set, DEDUPE_EXACT, DEDUPE_MODES
+    from job_queue import create_job_queue, JobWorkerPool, FINAL_EVENT_TYPES
+    from rate_control import AdaptiveRateLimiter
+    from strategy_stats import StrategyStats
+    from identifiers import iter_plans
+    from prefetch import prefetch_page_counts, PrefetchStats
+    from instrumentation import MetricsSummary
+    from metrics_registry import Registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+    from retry_policy import KIND_DETAILS, KIND_METADATA, KIND_PAGE_NUMBERS_JSON, KIND_SCANDATA, KIND_SEARCH
 except ImportError as e:
     print(f"Error: Failed to import scrape_page_numbers: {e}", file=sys.stderr)
     raise
@@ -25,7 +38,8 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
 
 app = Flask(__name__, template_folder=TEMPLATE_DIR)
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# Largest accepted request body; uploads are streamed to disk, so this only bounds disk use
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('SCRAPER_MAX_UPLOAD_MB', 512)) * 1024 * 1024
 
 # Use /tmp for results file on Vercel (serverless functions have limited write access)
 # On local development, use current directory
@@ -36,7 +50,59 @@ if not os.path.exists(TMP_DIR):
         os.makedirs(TMP_DIR, exist_ok=True)
     except:
         TMP_DIR = os.getcwd()
-RESULTS_FILE = os.path.join(TMP_DIR, 'scraping_results.xlsx')
+# Every scrape gets its own job directory here, so concurrent runs don't clobber each other
+JOBS_DIR = os.getenv('SCRAPER_JOBS_DIR') or os.path.join(TMP_DIR, 'scraper_jobs')
+CACHE_FILE = os.getenv('SCRAPER_CACHE_FILE') or os.path.join(TMP_DIR, 'page_number_cache.sqlite3')
+
+# Scrapes run as background jobs; 'sqlite' shares the queue between processes on this host
+JOB_QUEUE_BACKEND = os.getenv('SCRAPER_JOB_QUEUE', 'local')
+JOB_QUEUE_FILE = os.getenv('SCRAPER_JOB_QUEUE_FILE') or os.path.join(TMP_DIR, 'scraper_jobs.sqlite3')
+EVENT_KEEPALIVE_SECONDS = 15  # Send an SSE comment this often while a job is quiet
+
+# Adaptive rate control for jobs that ask for it ("adaptive": true), or for all jobs when set
+ADAPTIVE_RATE_DEFAULT = os.getenv('SCRAPER_ADAPTIVE_RATE', '').lower() in ('1', 'true', 'yes')
+
+# Resolve page counts with bulk search requests before scraping ("prefetch": true), or for all jobs when set
+PREFETCH_DEFAULT = os.getenv('SCRAPER_PREFETCH', '').lower() in ('1', 'true', 'yes')
+# Record per-identifier requests, bytes and timings in results (request field "metrics" overrides this)
+METRICS_DEFAULT = os.getenv('SCRAPER_METRICS', '').lower() in ('1', 'true', 'yes')
+# How uploads are deduplicated: 'exact', or 'bloom' for multi-million lists (?dedupe= overrides this)
+DEDUPE_MODE = os.getenv('SCRAPER_DEDUPE', DEDUPE_EXACT)
+UPLOAD_PREVIEW_SIZE = 20  # Identifiers echoed back by /api/upload
+
+_result_cache = None
+_job_store = None
+_job_queue = None
+_job_pool = None
+_rate_controller = None
+_strategy_stats = None
+_init_lock = threading.Lock()  # Guards the lazy set-up above, so concurrent first requests create one of each
+
+# Per-identifier-family fallback method statistics, saved here after each job when set
+STRATEGY_STATS_FILE = os.getenv('SCRAPER_STRATEGY_STATS_FILE')
+
+# Optional conditional-request revalidation of archive.org responses
+HTTP_CACHE_DIR = os.getenv('SCRAPER_HTTP_CACHE_DIR')
+if HTTP_CACHE_DIR:
+    http_client.set_validator_store(ValidatorStore(HTTP_CACHE_DIR))
+
+
+def get_result_cache():
+    """Return the process-wide result cache, opening it on first use"""
+    global _result_cache
+    with _init_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(CACHE_FILE)
+    return _result_cache
+
+
+def get_job_store():
+    """Return the process-wide job store, creating its directory on first use"""
+    global _job_store
+    with _init_lock:
+        if _job_store is None:
+            _job_store = JobStore(JOBS_DIR)
+    return _job_store
 
 
 @app.route('/')
@@ -45,171 +111,512 @@ def index():
     return render_template('index.html')
 
 
-@app.route('/api/scrape', methods=['POST'])
-def scrape_endpoint():
-    """API endpoint to scrape page numbers with progress updates"""
-    data = request.get_json()
+def get_rate_controller():
+    """
+    Return the process-wide adaptive rate limiter, shared by all adaptive jobs
+    (archive.org throttles the host, not a single job).
+    """
+    global _rate_controller
+    with _init_lock:
+        if _rate_controller is None:
+            _rate_controller = AdaptiveRateLimiter.from_delay(DEFAULT_DELAY_SECONDS, MIN_DELAY_SECONDS, MAX_WORKERS,
+                                                              concurrency=DEFAULT_WORKERS)
+            http_client.set_response_observer(_rate_controller)
+    return _rate_controller
+
+
+def get_strategy_stats():
+    """Return the process-wide strategy statistics, shared by all jobs so each learns from the last"""
+    global _strategy_stats
+    with _init_lock:
+        if _strategy_stats is None:
+            _strategy_stats = StrategyStats(STRATEGY_STATS_FILE)
+    return _strategy_stats
+
+
+def get_job_queue():
+    """Return the process-wide job queue, starting its worker pool on first use"""
+    global _job_queue, _job_pool
+    with _init_lock:
+        if _job_queue is None:
+            _job_queue = create_job_queue(JOB_QUEUE_BACKEND, JOB_QUEUE_FILE)
+            _job_pool = JobWorkerPool(_job_queue, run_scrape_job,
+                                      on_failure=lambda job_id, error: get_job_store().fail_job(job_id, error))
+            _job_pool.start()
+    return _job_queue
+
+
+# Prometheus metrics served at /metrics (counted per process)
+METRICS = Registry()
+IDENTIFIERS_PROCESSED = METRICS.counter('scraper_identifiers_total', 'Identifiers scraped by jobs, by outcome', ('status',))
+FAILURES = METRICS.counter('scraper_failures_total', 'Failed identifiers by error class', ('error_class',))
+STRATEGY_HITS = METRICS.counter('scraper_strategy_hits_total', 'Identifiers whose page count each method found', ('method',))
+IDENTIFIER_SECONDS = METRICS.histogram('scraper_identifier_duration_seconds',
+                                       'Time to scrape one identifier, cache hits included',
+                                       buckets=(0.01, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+ARCHIVE_REQUESTS = METRICS.counter('scraper_archive_requests_total',
+                                   'Requests sent to archive.org (retries included) by endpoint type and status',
+                                   ('endpoint', 'status'))
+ARCHIVE_SECONDS = METRICS.histogram('scraper_archive_request_duration_seconds',
+                                    'Time until archive.org response headers arrive, by endpoint type', ('endpoint',),
+                                    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30))
+JOBS_IN_FLIGHT = METRICS.gauge('scraper_jobs_in_flight', 'Scrape jobs running in this process')
+METRICS.counter('scraper_result_cache_lookups_total', 'Result cache lookups by outcome', ('outcome',),
+                callback=lambda: {'hit': _result_cache.hits, 'miss': _result_cache.misses} if _result_cache else None)
+METRICS.gauge('scraper_result_cache_hit_ratio', 'Share of result cache lookups that were hits',
+              callback=lambda: (_result_cache.hits / (_result_cache.hits + _result_cache.misses)
+                                if _result_cache and _result_cache.hits + _result_cache.misses else None))
+METRICS.counter('scraper_http_revalidated_total', 'archive.org responses reused after a 304 Not Modified',
+                callback=lambda: http_client.get_validator_store().revalidated if http_client.get_validator_store() else None)
+
+# Adaptive rate controller state (see AdaptiveRateLimiter.snapshot), once an adaptive job has run
+for _field, _type, _name, _help in (
+        ('rate', 'gauge', 'scraper_adaptive_rate', 'Requests per second allowed by the adaptive controller'),
+        ('concurrency_limit', 'gauge', 'scraper_adaptive_concurrency_limit', 'Concurrent identifiers allowed by the adaptive controller'),
+        ('active', 'gauge', 'scraper_adaptive_active', 'Identifiers currently holding an adaptive slot'),
+        ('latency', 'gauge', 'scraper_adaptive_latency_seconds', 'Smoothed archive.org response latency'),
+        ('backoffs', 'counter', 'scraper_adaptive_backoffs_total', 'Times the adaptive controller backed off'),
+        ('throttled', 'counter', 'scraper_adaptive_throttled_total', 'Throttled or timed-out archive.org requests')):
+    getattr(METRICS, _type)(_name, _help, callback=lambda field=_field: (
+        _rate_controller.snapshot()[field] if _rate_controller is not None else None))
+
+# Endpoint type of each request kind, for the archive.org metrics
+ENDPOINT_TYPES = {
+    KIND_DETAILS: 'details',
+    KIND_METADATA: 'metadata',
+    KIND_PAGE_NUMBERS_JSON: 'download',
+    KIND_SCANDATA: 'download',
+    KIND_SEARCH: 'search',
+}
+HTTP_ERROR_PATTERN = re.compile(r'^(\d)\d\d (?:Client|Server) Error')
+
+
+def record_archive_request(kind, status, seconds):
+    """Count one archive.org request and its latency (installed as the http_client request recorder)"""
+    endpoint = ENDPOINT_TYPES.get(kind, 'other')
+    ARCHIVE_REQUESTS.inc(endpoint=endpoint, status=status if status is not None else 'error')
+    ARCHIVE_SECONDS.observe(seconds, endpoint=endpoint)
+
+
+http_client.set_request_recorder(record_archive_request)
+
+
+def error_class(result):
+    """
+    Classify a failed result for the failure metrics.
     
-    if not data:
-        return jsonify({'error': 'No data provided'}), 400
+    Returns:
+        not_found, no_page_count, deadline, http_4xx/http_5xx, transient or other
+    """
+    error = result.get('error') or ''
+    if error.startswith('Identifier not found (404)'):
+        return 'not_found'
+    if error.startswith('Page number could not be extracted'):
+        return 'no_page_count'
+    if error.startswith('Deadline of'):
+        return 'deadline'
+    match = HTTP_ERROR_PATTERN.match(error)
+    if match:
+        return f'http_{match.group(1)}xx'
+    return 'transient' if result.get('retryable') else 'other'
+
+
+def record_result(result):
+    """Count one finished identifier in the metrics"""
+    if result['success']:
+        IDENTIFIERS_PROCESSED.inc(status='success')
+        STRATEGY_HITS.inc(method=result.get('method') or 'unknown')
+    else:
+        IDENTIFIERS_PROCESSED.inc(status='failure')
+        FAILURES.inc(error_class=error_class(result))
+
+
+def timed_scrape(scrape):
+    """Wrap a scrape function so each identifier's duration is recorded"""
+    def wrapper(identifier):
+        start = time.perf_counter()
+        try:
+            return scrape(identifier)
+        finally:
+            IDENTIFIER_SECONDS.observe(time.perf_counter() - start)
+    return wrapper
+
+
+def run_scrape_job(job_id, payload, emit):
+    """
+    Scrape one job's identifiers in a background worker, recording results in
+    the job store and progress as job events.
     
-    identifiers = data.get('identifiers', [])
+    Args:
+        job_id: The job ID
+        payload: Job settings from parse_scrape_request
+        emit: Function recording an event for the job
+    """
+    JOBS_IN_FLIGHT.inc()
+    try:
+        _run_scrape_job(job_id, payload, emit)
+    finally:
+        JOBS_IN_FLIGHT.dec()
+        if payload.get('upload_id'):
+            get_job_store().unpin_upload(payload['upload_id'], job_id)
+
+
+def job_identifiers(payload):
+    """Return an iterator over a job's identifiers (read lazily from its upload, if it has one)"""
+    if payload.get('upload_id'):
+        return get_job_store().iter_upload(payload['upload_id'])
+    return iter(payload['identifiers'])
+
+
+def _run_scrape_job(job_id, payload, emit):
+    delay = payload['delay']
+    total = payload['total']
+    cache = get_result_cache() if payload['cache'] else None
+    job_store = get_job_store()
     
-    if not identifiers:
-        return jsonify({'error': 'No identifiers provided'}), 400
+    # Every request takes a token from one global rate limiter (cache hits send none); results arrive in input order
+    limiter = get_rate_controller() if payload.get('adaptive') else RateLimiter.from_delay(delay)
     
-    # Get delay from request (default to DEFAULT_DELAY_SECONDS)
-    delay = max(float(data.get('delay', DEFAULT_DELAY_SECONDS)), MIN_DELAY_SECONDS)
+    def progress_event(index, identifier):
+        event = {
+            'type': 'progress',
+            'current': index,
+            'total': total,
+            'percent': int((index / total) * 100) if total > 0 else 0,
+            'identifier': identifier,
+            'status': 'processing',
+            'delay': delay,
+            'job_id': job_id
+        }
+        if payload.get('adaptive'):
+            event['rate'] = limiter.snapshot()
+        return event
     
-    # Remove duplicates while preserving order
-    seen = set()
-    identifiers = [id for id in identifiers if id not in seen and not seen.add(id)]
+    # Results are recorded in this job's own file as they arrive
+    writer = job_store.result_writer(job_id)
+    successful = 0
     
-    total = len(identifiers)
-    results = []
+    # Identifiers are streamed through the batch; a second cursor names the one we're waiting on
+    identifiers, upcoming = itertools.tee(job_identifiers(payload))
+    emit(progress_event(0, next(upcoming, None)))
     
-    @stream_with_context
-    def generate():
-        """Generate progress updates and results"""
-        for index, identifier in enumerate(identifiers):
-            # Add rate limiting delay (except for the first request)
-            if index > 0:
-                time.sleep(delay)
-            
-            # Send progress update before processing
-            progress_percent = int(((index) / total) * 100) if total > 0 else 0
-            progress_data = {
-                'type': 'progress',
-                'current': index,
-                'total': total,
-                'percent': progress_percent,
-                'identifier': identifier,
-                'status': 'processing',
-                'delay': delay
-            }
-            yield f"data: {json.dumps(progress_data)}\n\n"
-            
-            # Scrape the identifier
-            result = scrape_page_number(identifier)
-            results.append(result)
-            
-            # Send result update with updated progress
-            completed_percent = int(((index + 1) / total) * 100) if total > 0 else 100
-            result_data = {
-                'type': 'result',
-                'result': result,
-                'current': index + 1,
-                'total': total,
-                'percent': completed_percent
-            }
-            yield f"data: {json.dumps(result_data)}\n\n"
+    # Identifiers resolved by bulk search requests skip the per-identifier fallback chain
+    prefetched = None
+    if payload.get('prefetch'):
+        lookup = (identifier for identifier in job_identifiers(payload)
+                  if cache is None or payload['refresh'] or not cache.contains(identifier))
+        prefetch_stats = PrefetchStats()
+        prefetched = prefetch_page_counts(lookup, limiter=limiter, stats=prefetch_stats)
+        emit({'type': 'prefetch', 'resolved': len(prefetched), 'total': prefetch_stats.identifiers,
+              'requests': prefetch_stats.requests, 'job_id': job_id})
+    
+    stats = get_strategy_stats()
+    metrics_summary = MetricsSummary() if payload.get('metrics') else None
+    scrape = functools.partial(scrape_page_number, cache=cache, refresh=payload['refresh'], limiter=limiter,
+                               stats=stats, prefetched=prefetched, instrument=metrics_summary is not None)
+    planned = lambda plan: scrape(plan.identifier, plan=plan)
+    for index, result in enumerate(scrape_batch(iter_plans(identifiers), timed_scrape(planned), payload['workers'])):
+        writer.write(result)
+        record_result(result)
+        successful += 1 if result['success'] else 0
+        if metrics_summary is not None:
+            metrics_summary.add(result)
         
-        # Save results to Excel file
-        try:
-            # Prepare data for Excel
-            excel_data = []
-            for result in results:
-                excel_data.append({
-                    'Identifier': result['identifier'],
-                    'URL': result['url'],
-                    'Page Number': result['page_number'] if result['page_number'] else 'N/A',
-                    'Status': 'Success' if result['success'] else 'Failed',
-                    'Error': result.get('error', '') if not result['success'] else ''
-                })
-            
-            # Create DataFrame and save to Excel
-            if pd is None:
-                raise ImportError("pandas is not available")
-            df = pd.DataFrame(excel_data)
-            with pd.ExcelWriter(RESULTS_FILE, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Results', index=False)
-                
-                # Auto-adjust column widths
-                from openpyxl.utils import get_column_letter
-                workbook = writer.book
-                worksheet = writer.sheets['Results']
-                for idx, col in enumerate(df.columns, 1):
-                    max_length = max(
-                        df[col].astype(str).map(len).max(),
-                        len(col)
-                    )
-                    column_letter = get_column_letter(idx)
-                    worksheet.column_dimensions[column_letter].width = min(max_length + 2, 50)
-        except Exception as e:
-            print(f"Error saving results to Excel: {e}")
-            # Fallback to JSON if Excel fails
-            json_file = RESULTS_FILE.replace('.xlsx', '.json')
-            try:
-                with open(json_file, 'w', encoding='utf-8') as f:
-                    json.dump(results, f, indent=2, ensure_ascii=False)
-                print(f"Saved to JSON instead: {json_file}")
-            except Exception as json_error:
-                print(f"Error saving to JSON: {json_error}")
+        # Send result update with updated progress
+        emit({
+            'type': 'result',
+            'result': result,
+            'current': index + 1,
+            'total': total,
+            'percent': int(((index + 1) / total) * 100) if total > 0 else 100
+        })
         
-        # Send final summary
-        summary_data = {
-            'type': 'complete',
-            'results': results,
-            'summary': {
-                'total': len(results),
-                'successful': sum(1 for r in results if r['success']),
-                'failed': sum(1 for r in results if not r['success'])
-            }
-        }
-        yield f"data: {json.dumps(summary_data)}\n\n"
+        # Announce the next identifier we're waiting on
+        if index + 1 < total:
+            emit(progress_event(index + 1, next(upcoming, None)))
+    
+    writer.close()
+    stats.save()
+    summary = {
+        'total': total,
+        'successful': successful,
+        'failed': total - successful
+    }
+    if metrics_summary is not None:
+        summary['metrics'] = metrics_summary.as_dict()
+    job_store.finish_job(job_id, summary)
+    emit({'type': 'complete', 'job_id': job_id, 'summary': summary})
+
+
+def parse_scrape_request(data):
+    """
+    Validate a scrape request body.
+    
+    Args:
+        data: The JSON request body, with "identifiers" or an "upload_id" from /api/upload
     
+    Returns:
+        Tuple of (job payload, None) or (None, error message)
+    """
+    if not data:
+        return None, 'No data provided'
+    
+    # A list stored by /api/upload is referenced by ID and read lazily when the job runs
+    upload_id = data.get('upload_id')
+    if upload_id:
+        upload = get_job_store().get_upload(upload_id)
+        if upload is None:
+            return None, 'Upload not found (it may have expired)'
+        source = {'upload_id': upload_id, 'total': upload['count']}
+    else:
+        identifiers = data.get('identifiers', [])
+        
+        if not identifiers:
+            return None, 'No identifiers provided'
+        
+        # Remove duplicates while preserving order
+        identifiers = list(unique(identifiers))
+        source = {'identifiers': identifiers, 'total': len(identifiers)}
+    
+    # Adaptive jobs let the shared controller pick the concurrency, up to MAX_WORKERS
+    adaptive = bool(data.get('adaptive', ADAPTIVE_RATE_DEFAULT))
+    
+    # Get delay from request (default to DEFAULT_DELAY_SECONDS)
+    try:
+        delay = float(data.get('delay', DEFAULT_DELAY_SECONDS))
+        if not math.isfinite(delay):
+            raise ValueError(delay)
+        delay = max(delay, MIN_DELAY_SECONDS)
+    except (TypeError, ValueError):
+        return None, 'Invalid delay (expected a number of seconds)'
+    try:
+        workers = max(1, min(int(data.get('workers', MAX_WORKERS if adaptive else DEFAULT_WORKERS)), MAX_WORKERS))
+    except (TypeError, ValueError):
+        return None, 'Invalid workers (expected an integer)'
+    
+    return {
+        **source,
+        'delay': delay,
+        'workers': workers,
+        'adaptive': adaptive,
+        # Optional persistent result cache ("cache": true, "refresh": true to rescrape)
+        'cache': bool(data.get('cache', False)),
+        'refresh': bool(data.get('refresh', False)),
+        'prefetch': bool(data.get('prefetch', PREFETCH_DEFAULT)),
+        'metrics': bool(data.get('metrics', METRICS_DEFAULT)),
+    }, None
+
+
+def submit_scrape_job(payload):
+    """Create a job for a validated payload and queue it; returns the job ID"""
+    job_store = get_job_store()
+    job_id = job_store.create_job(payload['total'], payload.get('metrics', False))
+    # The upload must outlive its TTL if the job waits in the queue that long
+    if payload.get('upload_id'):
+        job_store.pin_upload(payload['upload_id'], job_id)
+    get_job_queue().submit(job_id, payload)
+    return job_id
+
+
+def job_events(job_id, last_event_id=0):
+    """
+    Yield a job's events as (event ID, event) tuples, starting after
+    last_event_id and ending with its complete/error event. Yields None
+    while the job is quiet so callers can send keep-alives.
+    """
+    job_queue = get_job_queue()
+    while True:
+        events = job_queue.events_since(job_id, last_event_id, EVENT_KEEPALIVE_SECONDS)
+        if not events:
+            yield None
+            continue
+        for event_id, event in events:
+            last_event_id = event_id
+            yield event_id, event
+            if event.get('type') in FINAL_EVENT_TYPES:
+                return
+
+
+def event_stream_response(generator, job_id):
+    """Wrap an SSE generator in a streaming response"""
     return Response(
-        stream_with_context(generate()),
+        stream_with_context(generator),
         mimetype='text/event-stream',
         headers={
             'Cache-Control': 'no-cache',
-            'X-Accel-Buffering': 'no'
+            'X-Accel-Buffering': 'no',
+            'X-Job-Id': job_id
         }
     )
 
 
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue a scrape job; progress is streamed from /api/jobs/<job_id>/events"""
+    payload, error = parse_scrape_request(request.get_json())
+    if error:
+        return jsonify({'error': error}), 400
+    
+    job_id = submit_scrape_job(payload)
+    return jsonify({
+        'job_id': job_id,
+        'total': payload['total'],
+        'events_url': f'/api/jobs/{job_id}/events'
+    }), 202
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Return a job's status and, once complete, its summary"""
+    job = get_job_store().get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found (results may have expired)'}), 404
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events_endpoint(job_id):
+    """
+    Stream a job's progress as Server-Sent Events. Every event has an id, so a
+    reconnecting client (Last-Event-ID header, or ?last_event_id=) resumes
+    where it left off; without one the whole log is replayed.
+    """
+    if not is_valid_job_id(job_id) or not get_job_queue().has_job(job_id):
+        return jsonify({'error': 'Job not found (events may have expired)'}), 404
+    
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError:
+        last_event_id = 0
+    
+    def generate():
+        yield "retry: 3000\n\n"
+        for item in job_events(job_id, last_event_id):
+            if item is None:
+                yield ": keep-alive\n\n"
+                continue
+            event_id, event = item
+            yield f"id: {event_id}\ndata: {json.dumps(event)}\n\n"
+    
+    return event_stream_response(generate(), job_id)
+
+
+@app.route('/api/scrape', methods=['POST'])
+def scrape_endpoint():
+    """
+    API endpoint to scrape page numbers with progress updates (single
+    request). The scrape runs as a background job, so it continues even if
+    this connection closes. Results arrive as 'result' events; the final
+    event carries their count and the job's download URL rather than the
+    results themselves, so large batches aren't loaded into one frame.
+    """
+    payload, error = parse_scrape_request(request.get_json())
+    if error:
+        return jsonify({'error': error}), 400
+    
+    job_id = submit_scrape_job(payload)
+    
+    def generate():
+        """Generate progress updates and results"""
+        for item in job_events(job_id):
+            if item is None:
+                yield ": keep-alive\n\n"
+                continue
+            _, event = item
+            if event.get('type') == 'complete':
+                event = {**event, 'result_count': event['summary']['total'],
+                         'download_url': f'/api/download/{job_id}'}
+            yield f"data: {json.dumps(event)}\n\n"
+    
+    return event_stream_response(generate(), job_id)
+
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    """Handle file upload with identifiers"""
-    if 'file' not in request.files:
+    """
+    Store an identifier list (one per line, plain or gzip) for a later scrape.
+    
+    The list is sent as a multipart "file" field or as the raw request body,
+    streamed to disk with duplicates removed (?dedupe=exact or bloom), and
+    referenced by the returned upload_id in /api/jobs or /api/scrape.
+    """
+    if 'file' in request.files:
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        stream = file.stream
+    elif request.content_length:
+        stream = request.stream
+    else:
         return jsonify({'error': 'No file provided'}), 400
     
-    file = request.files['file']
+    mode = request.args.get('dedupe', DEDUPE_MODE)
+    if mode not in DEDUPE_MODES:
+        return jsonify({'error': f"Unsupported dedupe mode '{mode}' (use one of: {', '.join(DEDUPE_MODES)})"}), 400
     
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+    preview = []
     
-    if file:
-        try:
-            # Read file content
-            content = file.read().decode('utf-8')
-            identifiers = [line.strip() for line in content.split('\n') if line.strip()]
-            
-            # Remove duplicates
-            seen = set()
-            identifiers = [id for id in identifiers if id not in seen and not seen.add(id)]
-            
-            return jsonify({
-                'identifiers': identifiers,
-                'count': len(identifiers)
-            })
-        except Exception as e:
-            return jsonify({'error': f'Error reading file: {str(e)}'}), 400
-    
-    return jsonify({'error': 'Error processing file'}), 400
+    def collect_preview(identifiers):
+        for identifier in identifiers:
+            if len(preview) < UPLOAD_PREVIEW_SIZE:
+                preview.append(identifier)
+            yield identifier
+    
+    job_store = get_job_store()
+    try:
+        identifiers = unique(iter_identifiers(stream), create_seen_set(mode))
+        upload_id, count = job_store.save_upload(collect_preview(identifiers))
+    except Exception as e:
+        return jsonify({'error': f'Error reading file: {str(e)}'}), 400
+    
+    if count == 0:
+        job_store.delete_upload(upload_id)
+        return jsonify({'error': 'No identifiers found in file'}), 400
+    
+    return jsonify({
+        'upload_id': upload_id,
+        'count': count,
+        'preview': preview
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Expose scraper and archive.org metrics in the Prometheus text format"""
+    return Response(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
 
 
 @app.route('/api/download', methods=['GET'])
 def download_results():
-    """Download results as Excel file"""
-    if os.path.exists(RESULTS_FILE):
-        return send_file(RESULTS_FILE, as_attachment=True, download_name='results.xlsx', mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    else:
-        # Check if JSON fallback exists
-        json_file = RESULTS_FILE.replace('.xlsx', '.json')
-        if os.path.exists(json_file):
-            return send_file(json_file, as_attachment=True, download_name='results.json')
+    """Download the most recently finished job's results (kept for older clients)"""
+    job_id = get_job_store().latest_job()
+    if job_id is None:
         return jsonify({'error': 'No results file found'}), 404
+    return download_job_results(job_id)
+
+
+@app.route('/api/download/<job_id>', methods=['GET'])
+def download_job_results(job_id):
+    """Download one job's results; ?format= xlsx (default), csv, jsonl, json or parquet"""
+    fmt = request.args.get('format', 'xlsx').lower()
+    if fmt not in DOWNLOAD_FORMATS:
+        return jsonify({'error': f"Unsupported format '{fmt}' (use one of: {', '.join(DOWNLOAD_FORMATS)})"}), 400
+    
+    job_store = get_job_store()
+    if not is_valid_job_id(job_id) or job_store.get_job(job_id) is None:
+        return jsonify({'error': 'Job not found (results may have expired)'}), 404
+    
+    try:
+        path = job_store.export(job_id, fmt)
+    except ImportError as e:
+        if fmt != 'xlsx':
+            return jsonify({'error': f"Format '{fmt}' is not available: {e}"}), 501
+        # Fallback to JSON if Excel is unavailable
+        print(f"Error saving results to Excel: {e}")
+        fmt = 'json'
+        path = job_store.export(job_id, fmt)
+    
+    return send_file(path, as_attachment=True, download_name=f'results.{fmt}', mimetype=DOWNLOAD_FORMATS[fmt])
 
 
 # Vercel serverless function handler
@@ -0,0 +1,869 @@
+"""
+Asyncio Scraping Backend
+Runs the fallback chain of scrape_page_number (details HTML ->
+page_numbers.json -> scandata -> metadata) on a single event loop with
+aiohttp, so many identifiers can be in flight without a thread each.
+The chain itself is shared: this module runs scrape_page_numbers.item_steps
+and only supplies the aiohttp fetchers its steps ask for (ASYNC_FETCHERS).
+
+Requires the optional aiohttp package (pip install aiohttp).
+"""
+
+import asyncio
+import email.message
+import io
+import json
+import tempfile
+import time
+from collections import deque
+from typing import Any, Callable, Optional, List, Dict, Generator, Iterable, Iterator, AsyncIterator, Tuple
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+import http_client
+from batch import RateLimiter
+from http_cache import has_validators
+from rate_control import parse_retry_after
+from retry_policy import KIND_DETAILS, KIND_METADATA, KIND_PAGE_NUMBERS_JSON, KIND_SCANDATA
+from result_cache import ResultCache
+from strategy_stats import StrategyStats
+from instrumentation import ItemMetrics, parsing
+from item_context import HTML_PARSER, file_names
+from details_stream import DetailsScanner, DETAILS_CHUNK_SIZE
+from identifiers import RequestPlan, plan_identifier, iter_plans
+from scrape_page_numbers import (
+    construct_url,
+    LeafCountParser,
+    scandata_zip_leaf_count,
+    SCANDATA_CHUNK_SIZE,
+    ZIP_SPOOL_MAX_BYTES,
+    parse_page_numbers_json,
+    page_numbers_json_steps,
+    scandata_steps,
+    metadata_steps,
+    extraction_steps,
+    item_steps,
+    cached_result,
+    store_result,
+    build_result,
+    build_error_result,
+    describe_http_error,
+    FETCH_DETAILS,
+    FETCH_DETAILS_HTML,
+    FETCH_FILES,
+    FETCH_LEAF_COUNT,
+    FETCH_PAGE_NUMBERS_JSON,
+    METHOD_PAGE_NUMBERS_JSON,
+    METHOD_SCANDATA,
+    METHOD_METADATA,
+    METHOD_IMAGECOUNT,
+)
+
+DEFAULT_CONCURRENCY = 32  # Identifiers in flight on the event loop
+MAX_CONCURRENCY = 256  # Upper bound for --workers with the async backend
+
+_NOT_FETCHED = object()
+
+
+def _require_aiohttp():
+    if aiohttp is None:
+        raise ImportError("The async backend requires aiohttp (pip install aiohttp)")
+
+
+def create_session(concurrency: int = DEFAULT_CONCURRENCY) -> 'aiohttp.ClientSession':
+    """
+    Create a pooled aiohttp session sized for the given concurrency.
+
+    Args:
+        concurrency: Number of identifiers expected to be in flight
+
+    Returns:
+        A new aiohttp ClientSession (the caller must close it)
+    """
+    _require_aiohttp()
+    connector = aiohttp.TCPConnector(
+        limit=max(concurrency, http_client.DEFAULT_POOL_MAXSIZE),
+        limit_per_host=http_client.DEFAULT_POOL_MAXSIZE,
+        ttl_dns_cache=300
+    )
+    observer = http_client.get_response_observer()
+    return aiohttp.ClientSession(
+        connector=connector,
+        headers=http_client.DEFAULT_HEADERS,
+        timeout=aiohttp.ClientTimeout(total=http_client.DEFAULT_TIMEOUT),
+        trace_configs=[_observer_trace_config(observer)] if observer is not None else None
+    )
+
+
+def _observer_trace_config(observer) -> 'aiohttp.TraceConfig':
+    """Report every response and timeout/connection error to a response observer (see http_client.set_response_observer)"""
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context, params):
+        context.start = time.monotonic()
+
+    async def on_request_end(session, context, params):
+        observer.observe(params.response.status, time.monotonic() - context.start, params.response.headers)
+
+    async def on_request_exception(session, context, params):
+        if isinstance(params.exception, (asyncio.TimeoutError, aiohttp.ClientConnectionError)):
+            observer.observe_failure()
+
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
+
+async def _take_token(limiter: RateLimiter):
+    """Wait for a request token (try_acquire can block on a file lock, so it runs off the event loop)"""
+    loop = asyncio.get_running_loop()
+    while True:
+        wait = await loop.run_in_executor(None, limiter.try_acquire)
+        if wait <= 0:
+            return
+        await asyncio.sleep(wait)
+
+
+async def request(session: 'aiohttp.ClientSession', url: str, kind: Optional[str] = None,
+                  metrics: Optional[ItemMetrics] = None, headers: Optional[Dict[str, str]] = None,
+                  on_transient: Optional[Callable[[], None]] = None,
+                  limiter: Optional[RateLimiter] = None) -> 'aiohttp.ClientResponse':
+    """
+    GET a URL with the retry policy (see http_client.get_retry_policy): per-kind
+    connect/read timeouts, and jittered exponential backoff on timeouts,
+    connection errors and retryable status codes. Every attempt first takes
+    a token from the rate limiter, if one is given.
+
+    Args:
+        session: The shared aiohttp session
+        url: The URL to fetch
+        kind: Kind of request (retry_policy.KIND_*), for per-strategy timeouts
+        metrics: Optional instrumentation.ItemMetrics counting requests and network time
+        headers: Extra request headers (e.g. conditional request validators)
+        on_transient: Called when the request ends in a timeout, connection error
+            or retryable status (see AsyncItemContext.count_transient_failure)
+        limiter: Optional global rate limiter; every attempt takes one token
+
+    Returns:
+        The response (use it with `async with` so it is released)
+    """
+    policy = http_client.get_retry_policy()
+    connect_timeout, read_timeout = policy.timeout(kind)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+    start = time.perf_counter()
+    for attempt in range(policy.max_attempts):
+        last_attempt = attempt == policy.max_attempts - 1
+        if limiter is not None:
+            await _take_token(limiter)
+        if metrics is not None:
+            metrics.add_request()
+        recorder = http_client.get_request_recorder()
+        sent = time.perf_counter()
+        try:
+            response = await session.get(url, timeout=timeout, headers=headers)
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError):
+            if recorder is not None:
+                recorder(kind, None, time.perf_counter() - sent)
+            if last_attempt:
+                if metrics is not None:
+                    metrics.add_network(time.perf_counter() - start)
+                if on_transient is not None:
+                    on_transient()
+                raise
+            wait = policy.backoff(attempt)
+        else:
+            if recorder is not None:
+                recorder(kind, response.status, time.perf_counter() - sent)
+            if response.status not in policy.retry_statuses or last_attempt:
+                if metrics is not None:
+                    metrics.add_network(time.perf_counter() - start)
+                if on_transient is not None and response.status in policy.retry_statuses:
+                    on_transient()
+                return response
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            wait = max(policy.backoff(attempt), retry_after or 0)
+            response.release()
+        await asyncio.sleep(wait)
+
+
+async def read_body(response: 'aiohttp.ClientResponse', metrics: Optional[ItemMetrics] = None) -> bytes:
+    """Read a whole response body, counting its time and size when instrumented"""
+    if metrics is None:
+        return await response.read()
+    start = time.perf_counter()
+    body = await response.read()
+    metrics.add_network(time.perf_counter() - start, len(body))
+    return body
+
+
+def _conditional_request(url: str) -> Tuple[Optional[Dict], Optional[Dict[str, str]]]:
+    """
+    Look a URL up in the validator store, as http_client.get does.
+
+    Returns:
+        Tuple of (stored entry, If-None-Match/If-Modified-Since headers),
+        or (None, None) without a store or a usable entry
+    """
+    store = http_client.get_validator_store()
+    if store is None:
+        return None, None
+    entry = store.lookup(url)
+    if entry is None or (entry.get('has_body') and not store.has_body(url)):
+        return None, None  # Nothing stored, or the body was evicted; fetch unconditionally
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return entry, headers
+
+
+def _revalidated_body(url: str, entry: Dict, metrics: Optional[ItemMetrics] = None) -> bytes:
+    """Count a 304 Not Modified and return the stored body (empty if only validators were kept)"""
+    store = http_client.get_validator_store()
+    store.record_revalidated()
+    if metrics is not None:
+        metrics.revalidated += 1
+    return (store.read_body(url) if entry.get('has_body') else None) or b''
+
+
+def _save_validators(url: str, response: 'aiohttp.ClientResponse', body: Optional[bytes] = None,
+                     parsed: Any = None, has_parsed: bool = False):
+    """Store a 200 response's validators with its body or parsed value, if a store is configured"""
+    store = http_client.get_validator_store()
+    if store is None or response.status != 200 or not has_validators(response.headers):
+        return
+    if has_parsed:
+        store.save_parsed(url, response.headers, parsed)
+    else:
+        store.save(url, response.headers, body=body)
+
+
+def _stored_text(body: bytes, entry: Dict) -> str:
+    """Decode a stored body with the charset of its stored Content-Type (UTF-8 if absent)"""
+    message = email.message.Message()
+    for name, value in entry.get('headers', {}).items():
+        if name.lower() == 'content-type':
+            message['Content-Type'] = value
+    try:
+        return body.decode(message.get_content_charset() or 'utf-8', errors='replace')
+    except LookupError:
+        return body.decode('utf-8', errors='replace')
+
+
+async def fetch(session: 'aiohttp.ClientSession', url: str, kind: Optional[str] = None,
+                metrics: Optional[ItemMetrics] = None,
+                on_transient: Optional[Callable[[], None]] = None,
+                limiter: Optional[RateLimiter] = None) -> Tuple[int, bytes]:
+    """
+    GET a URL and read the whole body.
+
+    With a validator store (http_client.set_validator_store) the request is
+    conditional: a 304 is answered with the stored body as a 200, and 200
+    responses carrying validators are stored, as in http_client.get.
+
+    Args:
+        session: The shared aiohttp session
+        url: The URL to fetch
+        kind: Kind of request (retry_policy.KIND_*), for per-strategy timeouts
+        metrics: Optional instrumentation.ItemMetrics to update
+        on_transient: Called on a transient failure (see request)
+        limiter: Optional global rate limiter (see request)
+
+    Returns:
+        Tuple of (status code, body bytes)
+    """
+    entry, headers = _conditional_request(url)
+    async with await request(session, url, kind, metrics, headers, on_transient, limiter) as response:
+        if response.status == 304 and entry is not None:
+            return 200, _revalidated_body(url, entry, metrics)
+        body = await read_body(response, metrics)
+        _save_validators(url, response, body=body)
+        return response.status, body
+
+
+async def fetch_parsed(session: 'aiohttp.ClientSession', url: str, parse: Callable[[bytes], Any],
+                       kind: Optional[str] = None, metrics: Optional[ItemMetrics] = None,
+                       on_transient: Optional[Callable[[], None]] = None,
+                       limiter: Optional[RateLimiter] = None) -> Any:
+    """
+    GET a URL and parse its body, keeping only the parsed value in the
+    validator store (the async counterpart of http_client.parse_cached).
+    After a 304 the stored value is reused without downloading or parsing.
+
+    Args:
+        session: The shared aiohttp session
+        url: The URL to fetch
+        parse: Function computing a JSON-serializable value from the body
+        kind: Kind of request (retry_policy.KIND_*), for per-strategy timeouts
+        metrics: Optional instrumentation.ItemMetrics to update
+        on_transient: Called on a transient failure (see request)
+        limiter: Optional global rate limiter (see request)
+
+    Returns:
+        The parsed value, or None if the response was not a 200
+    """
+    entry, headers = _conditional_request(url)
+    async with await request(session, url, kind, metrics, headers, on_transient, limiter) as response:
+        if response.status == 304 and entry is not None:
+            body = _revalidated_body(url, entry, metrics)
+            if 'parsed' in entry:
+                return entry['parsed']
+            with parsing(metrics):
+                return parse(body)
+        if response.status != 200:
+            return None
+        body = await read_body(response, metrics)
+        with parsing(metrics):
+            value = parse(body)
+        _save_validators(url, response, parsed=value, has_parsed=True)
+        return value
+
+
+def _leaf_count_from_body(body: bytes, is_zip: bool) -> Optional[int]:
+    """Extract the leafCount from a whole scandata body"""
+    if is_zip:
+        return scandata_zip_leaf_count(io.BytesIO(body))
+    parser = LeafCountParser()
+    parser.feed(body)
+    return parser.leaf_count
+
+
+async def fetch_leaf_count(session: 'aiohttp.ClientSession', url: str, is_zip: bool,
+                           metrics: Optional[ItemMetrics] = None,
+                           on_transient: Optional[Callable[[], None]] = None,
+                           limiter: Optional[RateLimiter] = None) -> Optional[int]:
+    """
+    Stream a scandata file and extract its leafCount.
+    XML is parsed as it downloads and the connection is released as soon as
+    leafCount is found; ZIPs are spooled (bounded memory) and their member streamed.
+    With a validator store only the leaf count is kept, and reused after a 304.
+
+    Args:
+        session: The shared aiohttp session
+        url: The scandata file URL
+        is_zip: Whether the file is a scandata ZIP
+        metrics: Optional instrumentation.ItemMetrics to update
+        on_transient: Called on a transient failure (see request)
+        limiter: Optional global rate limiter (see request)
+
+    Returns:
+        The leaf count if found, None otherwise
+    """
+    entry, headers = _conditional_request(url)
+    async with await request(session, url, KIND_SCANDATA, metrics, headers, on_transient, limiter) as response:
+        if response.status == 304 and entry is not None:
+            body = _revalidated_body(url, entry, metrics)
+            if 'parsed' in entry:
+                return entry['parsed']
+            with parsing(metrics):
+                return _leaf_count_from_body(body, is_zip)
+        if response.status != 200:
+            return None
+        leaf_count = await _stream_leaf_count(response, is_zip, metrics)
+        _save_validators(url, response, parsed=leaf_count, has_parsed=True)
+        return leaf_count
+
+
+async def _stream_leaf_count(response: 'aiohttp.ClientResponse', is_zip: bool,
+                             metrics: Optional[ItemMetrics] = None) -> Optional[int]:
+    """Read a 200 scandata response until its leafCount is found"""
+    start = time.perf_counter()
+    parse_before = metrics.parse_seconds if metrics is not None else 0.0
+    received = 0
+    try:
+        if is_zip:
+            with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_BYTES) as spool:
+                async for chunk in response.content.iter_chunked(SCANDATA_CHUNK_SIZE):
+                    received += len(chunk)
+                    spool.write(chunk)
+                spool.seek(0)
+                with parsing(metrics):
+                    return scandata_zip_leaf_count(spool)
+        parser = LeafCountParser()
+        async for chunk in response.content.iter_chunked(SCANDATA_CHUNK_SIZE):
+            received += len(chunk)
+            with parsing(metrics):
+                found = parser.feed(chunk)
+            if found:
+                break
+        return parser.leaf_count
+    finally:
+        if metrics is not None:
+            # Parsing happens while streaming; the rest of the time is network time
+            parsed = metrics.parse_seconds - parse_before
+            metrics.add_network(max(0.0, time.perf_counter() - start - parsed), received)
+
+
+class AsyncItemContext:
+    """
+    Async counterpart of ItemContext: fetches the details page and metadata
+    JSON at most once per identifier and shares them across strategies, and
+    counts transient failures (timeouts, 429/5xx) so a "not found" outcome
+    can be reported as retryable. With a rate limiter every request takes
+    one of its tokens.
+    """
+
+    def __init__(self, identifier: str, session: 'aiohttp.ClientSession', metrics: Optional[ItemMetrics] = None,
+                 plan: Optional[RequestPlan] = None, limiter: Optional[RateLimiter] = None):
+        self.identifier = identifier
+        self.session = session
+        self.metrics = metrics  # Optional instrumentation.ItemMetrics
+        self.limiter = limiter  # Optional batch.RateLimiter shared by the batch
+        self.plan = plan or plan_identifier(identifier)
+        self.details_url = self.plan.details_url
+        self.metadata_url = self.plan.metadata_url
+        self.details_html = None  # Set by fetch_details
+        self.details_page_count = None  # Set by fetch_details when the streaming scan finds the page counter
+        self.transient_failures = 0
+        self._soup = _NOT_FETCHED
+        self._metadata = _NOT_FETCHED
+        self._metadata_lock = asyncio.Lock()
+
+    def count_transient_failure(self):
+        """Count a timeout, connection error or retryable status (the on_transient callback of request)"""
+        self.transient_failures += 1
+
+    async def fetch_details(self) -> str:
+        """
+        Fetch the details page HTML.
+        HTTP and network errors propagate so the caller can report them.
+
+        When details streaming is on (http_client.get_details_streaming), the
+        body is scanned as it arrives and the response is released as soon
+        as the page counter has been seen (details_page_count is set and the
+        HTML stops there). With a validator store the page is fetched whole
+        and revalidated like fetch().
+        """
+        entry, headers = _conditional_request(self.details_url)
+        async with await request(self.session, self.details_url, KIND_DETAILS, self.metrics, headers,
+                                 self.count_transient_failure, self.limiter) as response:
+            if response.status == 304 and entry is not None:
+                body = _revalidated_body(self.details_url, entry, self.metrics)
+                with parsing(self.metrics):
+                    self.details_html = _stored_text(body, entry)
+                return self.details_html
+            response.raise_for_status()
+            if http_client.get_details_streaming():
+                self.details_html = await self._scan_details(response)
+            else:
+                body = await read_body(response, self.metrics)
+                _save_validators(self.details_url, response, body=body)
+                with parsing(self.metrics):
+                    self.details_html = await response.text()
+        return self.details_html
+
+    async def _scan_details(self, response: 'aiohttp.ClientResponse') -> str:
+        """Read the details page until the page counter shows up (see details_stream)"""
+        scanner = DetailsScanner(response.charset)
+        start = time.perf_counter()
+        parse_before = self.metrics.parse_seconds if self.metrics is not None else 0.0
+        received = 0
+        try:
+            async for chunk in response.content.iter_chunked(DETAILS_CHUNK_SIZE):
+                received += len(chunk)
+                with parsing(self.metrics):
+                    self.details_page_count = scanner.feed(chunk)
+                if self.details_page_count is not None:
+                    return scanner.text
+            with parsing(self.metrics):
+                scanner.feed(b'', final=True)
+            return scanner.text
+        finally:
+            if self.metrics is not None:
+                parsed = self.metrics.parse_seconds - parse_before
+                self.metrics.add_network(max(0.0, time.perf_counter() - start - parsed), received)
+
+    def soup(self):
+        """Return a parsed BeautifulSoup tree of the details page (built once)"""
+        if self._soup is _NOT_FETCHED:
+            if self.details_html is None:
+                self._soup = None
+            else:
+                from bs4 import BeautifulSoup
+                with parsing(self.metrics):
+                    self._soup = BeautifulSoup(self.details_html, HTML_PARSER)
+        return self._soup
+
+    async def metadata(self) -> Optional[Dict]:
+        """Return the parsed metadata API JSON, fetching it if needed"""
+        async with self._metadata_lock:
+            if self._metadata is _NOT_FETCHED:
+                self._metadata = None
+                try:
+                    status, body = await fetch(self.session, self.metadata_url, KIND_METADATA, self.metrics,
+                                               self.count_transient_failure, self.limiter)
+                    if status == 200:
+                        with parsing(self.metrics):
+                            self._metadata = json.loads(body)
+                except Exception:
+                    pass
+        return self._metadata
+
+    async def files(self) -> List[Dict]:
+        """Return the file list from the metadata API (empty if unavailable)"""
+        metadata = await self.metadata()
+        if not metadata:
+            return []
+        return metadata.get('files', [])
+
+    def known_file_names(self):
+        """Return the item's file names if the metadata was already fetched (see ItemContext.known_file_names)"""
+        if self._metadata is _NOT_FETCHED:
+            return None
+        return file_names(self._metadata)
+
+
+async def _read_details(context: AsyncItemContext) -> Tuple[Optional[int], str]:
+    """Fetch the details page (FETCH_DETAILS), raising aiohttp's ClientResponseError if it isn't OK"""
+    html_content = await context.fetch_details()
+    return context.details_page_count, html_content
+
+
+async def _details_html(context: AsyncItemContext) -> Optional[str]:
+    """Return the details page HTML, fetching it if needed (None if it can't be fetched)"""
+    if context.details_html is None:
+        try:
+            await context.fetch_details()
+        except Exception:
+            return None
+    return context.details_html
+
+
+async def _fetch_leaf_count(context: AsyncItemContext, scandata_url: str, is_zip: bool) -> Optional[int]:
+    """Stream a scandata file and extract its leafCount (None unless it is a 200)"""
+    return await fetch_leaf_count(context.session, scandata_url, is_zip, context.metrics,
+                                  context.count_transient_failure, context.limiter)
+
+
+async def _race_page_numbers_json(context: AsyncItemContext, json_urls: List[str]) -> Optional[int]:
+    """Fetch page_numbers.json candidates concurrently; the first success in priority order wins"""
+    async def fetch_candidate(json_url: str) -> Optional[int]:
+        try:
+            return await fetch_parsed(context.session, json_url, lambda body: parse_page_numbers_json(body.decode('utf-8')),
+                                      KIND_PAGE_NUMBERS_JSON, context.metrics, context.count_transient_failure,
+                                      context.limiter)
+        except Exception:
+            return None
+
+    # The remaining requests are cancelled once the race is decided
+    tasks = [asyncio.ensure_future(fetch_candidate(json_url)) for json_url in json_urls]
+    try:
+        for candidate in tasks:
+            page_count = await candidate
+            if page_count:
+                return page_count
+    finally:
+        for candidate in tasks:
+            candidate.cancel()
+
+    return None
+
+
+# aiohttp fetchers performing the steps' FETCH_* requests on an AsyncItemContext
+ASYNC_FETCHERS = {
+    FETCH_DETAILS: _read_details,
+    FETCH_DETAILS_HTML: _details_html,
+    FETCH_FILES: AsyncItemContext.files,
+    FETCH_LEAF_COUNT: _fetch_leaf_count,
+    FETCH_PAGE_NUMBERS_JSON: _race_page_numbers_json,
+}
+
+
+async def run_steps(steps: Generator[Tuple, Any, Any], context: AsyncItemContext) -> Any:
+    """
+    Run strategy steps on the event loop, performing each fetch they yield
+    with ASYNC_FETCHERS (the counterpart of scrape_page_numbers.run_steps).
+
+    Args:
+        steps: Steps generator (e.g. item_steps or a FALLBACK_STEPS entry)
+        context: The identifier's AsyncItemContext
+
+    Returns:
+        The value the steps return
+    """
+    value, error = None, None
+    while True:
+        try:
+            fetch = steps.send(value) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            value, error = await ASYNC_FETCHERS[fetch[0]](context, *fetch[1:]), None
+        except Exception as e:
+            value, error = None, e
+
+
+async def async_get_page_number_from_json(identifier: str, context: AsyncItemContext) -> Optional[int]:
+    """
+    Async version of get_page_number_from_json (the same page_numbers_json_steps).
+
+    Args:
+        identifier: The identifier ID
+        context: Shared async item context
+
+    Returns:
+        The total page number if found, None otherwise
+    """
+    return await run_steps(page_numbers_json_steps(identifier, context), context)
+
+
+async def async_get_page_number_from_scandata(identifier: str, context: AsyncItemContext) -> Optional[int]:
+    """
+    Async version of get_page_number_from_scandata (the same scandata_steps).
+
+    Args:
+        identifier: The identifier ID
+        context: Shared async item context
+
+    Returns:
+        The total page number if found, None otherwise
+    """
+    return await run_steps(scandata_steps(identifier, context), context)
+
+
+async def async_get_page_number_from_metadata(identifier: str, context: AsyncItemContext) -> Optional[int]:
+    """
+    Async version of get_page_number_from_metadata (the same metadata_steps).
+
+    Args:
+        identifier: The identifier ID
+        context: Shared async item context
+
+    Returns:
+        The total page number if found, None otherwise
+    """
+    return await run_steps(metadata_steps(identifier, context), context)
+
+
+async def async_extract_page_number(html_content: str, identifier: str,
+                                    context: AsyncItemContext) -> Optional[int]:
+    """
+    Async version of extract_page_number, running the same fallback chain.
+
+    Args:
+        html_content: The HTML content of the details page
+        identifier: The identifier ID
+        context: Shared async item context
+
+    Returns:
+        The total page number if found, None otherwise
+    """
+    page_count, _ = await async_extract_page_number_with_method(html_content, identifier, context)
+    return page_count
+
+
+# Async fallback methods by name
+ASYNC_FALLBACK_STRATEGIES = {
+    METHOD_PAGE_NUMBERS_JSON: async_get_page_number_from_json,
+    METHOD_SCANDATA: async_get_page_number_from_scandata,
+    METHOD_METADATA: async_get_page_number_from_metadata,
+}
+
+
+async def async_extract_page_number_with_method(html_content: str, identifier: str,
+                                                context: AsyncItemContext,
+                                                stats: Optional[StrategyStats] = None) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Async version of extract_page_number_with_method (the same extraction_steps;
+    a page count found by the streaming details scan is used without parsing the HTML).
+
+    Returns:
+        Tuple of (page number, method name), or (None, None) if not found
+    """
+    return await run_steps(extraction_steps(html_content, identifier, context, stats, context.details_page_count),
+                           context)
+
+
+async def async_scrape_page_number(identifier: str, session: 'aiohttp.ClientSession',
+                                   cache: Optional[ResultCache] = None, refresh: bool = False,
+                                   limiter: Optional[RateLimiter] = None,
+                                   stats: Optional[StrategyStats] = None,
+                                   prefetched: Optional[Dict[str, int]] = None,
+                                   instrument: bool = False,
+                                   plan: Optional[RequestPlan] = None) -> Dict[str, any]:
+    """
+    Async version of scrape_page_number.
+
+    Args:
+        identifier: The identifier ID to scrape
+        session: The shared aiohttp session
+        cache: Optional persistent result cache to read from and write to
+        refresh: Ignore cached entries (fresh results are still written to the cache)
+        limiter: Global rate limiter: every request to archive.org takes one of its
+            tokens, and the identifier holds one of its concurrency slots while scraped
+        stats: Optional strategy statistics shared by the batch (orders the fallback methods)
+        prefetched: Page counts resolved by the bulk search prefetch (not scraped individually)
+        instrument: Add per-identifier request, byte and timing counters as result['metrics']
+        plan: The identifier's request plan, when the batch was planned up front
+
+    Returns:
+        A dictionary with identifier, url, page_number, method, and success status
+    """
+    cached = cached_result(identifier, cache, refresh, instrument)
+    if cached is not None:
+        return cached
+
+    metrics = ItemMetrics() if instrument else None
+    if prefetched is not None and identifier in prefetched:
+        result = build_result(identifier, construct_url(identifier), prefetched[identifier], METHOD_IMAGECOUNT)
+    elif limiter is None:
+        result = await _async_scrape_page_number_uncached(identifier, session, stats, metrics, plan)
+    else:
+        while True:
+            wait = limiter.try_acquire_slot()
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        try:
+            result = await _async_scrape_page_number_uncached(identifier, session, stats, metrics, plan, limiter)
+        finally:
+            limiter.release()
+    return store_result(result, cache, metrics)
+
+
+async def _async_scrape_page_number_uncached(identifier: str, session: 'aiohttp.ClientSession',
+                                             stats: Optional[StrategyStats] = None,
+                                             metrics: Optional[ItemMetrics] = None,
+                                             plan: Optional[RequestPlan] = None,
+                                             limiter: Optional[RateLimiter] = None) -> Dict[str, any]:
+    """Run one identifier's item_steps on the event loop within its deadline, reporting errors as error results"""
+    url = construct_url(identifier)
+    policy = http_client.get_retry_policy()
+    context = AsyncItemContext(identifier, session, metrics, plan, limiter)
+
+    try:
+        return await asyncio.wait_for(run_steps(item_steps(identifier, context, stats), context), policy.deadline or None)
+
+    except aiohttp.ClientResponseError as e:
+        return build_error_result(identifier, url, describe_http_error(e.status, f"{e.status} Client Error: {e.message} for url: {url}"),
+                                  retryable=e.status in policy.retry_statuses)
+    except aiohttp.ServerTimeoutError:
+        return build_error_result(identifier, url, f"Request timed out for url: {url}", retryable=True)
+    except asyncio.TimeoutError:
+        return build_error_result(identifier, url, f"Deadline of {policy.deadline}s exceeded for url: {url}", retryable=True)
+    except aiohttp.ClientConnectionError as e:
+        return build_error_result(identifier, url, str(e), retryable=True)
+    except Exception as e:
+        return build_error_result(identifier, url, str(e))
+
+
+async def async_scrape_batch(identifiers: Iterable[str], concurrency: int = DEFAULT_CONCURRENCY,
+                             limiter: Optional[RateLimiter] = None,
+                             session: Optional['aiohttp.ClientSession'] = None,
+                             cache: Optional[ResultCache] = None, refresh: bool = False,
+                             stats: Optional[StrategyStats] = None,
+                             prefetched: Optional[Dict[str, int]] = None,
+                             instrument: bool = False) -> AsyncIterator[Dict]:
+    """
+    Scrape identifiers on the event loop and yield results in input order.
+
+    Args:
+        identifiers: Identifiers to scrape
+        concurrency: Maximum identifiers in flight at once
+        limiter: Global rate limiter (None for no limit)
+        session: aiohttp session to use (one is created and closed if omitted)
+        cache: Optional persistent result cache
+        refresh: Ignore cached entries (fresh results are still written to the cache)
+        stats: Optional strategy statistics shared by the batch
+        prefetched: Page counts resolved by the bulk search prefetch
+        instrument: Add per-identifier counters to each result as result['metrics']
+
+    Yields:
+        Result dictionaries, in the same order as the identifiers
+    """
+    _require_aiohttp()
+    concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+    own_session = session is None
+    if own_session:
+        session = create_session(concurrency)
+
+    async def task(plan: RequestPlan) -> Dict:
+        return await async_scrape_page_number(plan.identifier, session, cache, refresh, limiter, stats, prefetched,
+                                              instrument, plan)
+
+    # The batch is planned once, as it is fed to the event loop, and each plan drives its item's requests
+    pending = deque()
+    try:
+        for plan in iter_plans(identifiers):
+            pending.append(asyncio.ensure_future(task(plan)))
+            if len(pending) >= concurrency:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_session:
+            await session.close()
+
+
+def scrape_batch(identifiers: Iterable[str], concurrency: int = DEFAULT_CONCURRENCY,
+                 limiter: Optional[RateLimiter] = None,
+                 cache: Optional[ResultCache] = None, refresh: bool = False,
+                 stats: Optional[StrategyStats] = None,
+                 prefetched: Optional[Dict[str, int]] = None,
+                 instrument: bool = False) -> Iterator[Dict]:
+    """
+    Synchronous wrapper around async_scrape_batch for the CLI.
+    Runs a private event loop and yields each result as soon as it is ready.
+
+    Args:
+        identifiers: Identifiers to scrape
+        concurrency: Maximum identifiers in flight at once
+        limiter: Global rate limiter (None for no limit)
+        cache: Optional persistent result cache
+        refresh: Ignore cached entries (fresh results are still written to the cache)
+        stats: Optional strategy statistics shared by the batch
+        prefetched: Page counts resolved by the bulk search prefetch
+        instrument: Add per-identifier counters to each result as result['metrics']
+
+    Yields:
+        Result dictionaries, in the same order as the identifiers
+    """
+    loop = asyncio.new_event_loop()
+    results = async_scrape_batch(identifiers, concurrency, limiter, cache=cache, refresh=refresh, stats=stats,
+                                 prefetched=prefetched, instrument=instrument)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(results.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(results.aclose())
+        loop.close()
+
+
+def scrape_page_number(identifier: str, cache: Optional[ResultCache] = None, refresh: bool = False,
+                       limiter: Optional[RateLimiter] = None,
+                       stats: Optional[StrategyStats] = None,
+                       prefetched: Optional[Dict[str, int]] = None,
+                       instrument: bool = False,
+                       plan: Optional[RequestPlan] = None) -> Dict[str, any]:
+    """
+    Synchronous wrapper: scrape one identifier with the async backend.
+    Takes the same arguments as scrape_page_numbers.scrape_page_number.
+
+    Args:
+        identifier: The identifier ID to scrape
+        cache: Optional persistent result cache to read from and write to
+        refresh: Ignore cached entries (fresh results are still written to the cache)
+        limiter: Global rate limiter (see async_scrape_page_number)
+        stats: Optional strategy statistics (orders the fallback methods)
+        prefetched: Page counts resolved by the bulk search prefetch (not scraped individually)
+        instrument: Add per-identifier request, byte and timing counters as result['metrics']
+        plan: The identifier's request plan, if it was planned up front
+
+    Returns:
+        A dictionary with identifier, url, page_number, method, and success status
+    """
+    async def run():
+        async with create_session(1) as session:
+            return await async_scrape_page_number(identifier, session, cache, refresh, limiter, stats, prefetched,
+                                                  instrument, plan)
+    return asyncio.run(run())
@@ -0,0 +1,141 @@
+"""
+Concurrent Batch Engine
+Scrapes many identifiers with a pool of worker threads that share one global
+token-bucket rate limiter (one token per HTTP request), and yields results
+back in input order.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+DEFAULT_WORKERS = 4  # Default number of identifiers scraped concurrently
+MAX_WORKERS = 32  # Upper bound to stay polite to archive.org
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by every worker.
+
+    Tokens refill at `rate` per second up to `burst`; every HTTP request
+    (including retries) takes one token before it is sent (see
+    http_client.get), so the rate is global across workers. Identifiers
+    take a concurrency slot with acquire_slot() and free it with release();
+    this base class has no concurrency limit.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_delay(cls, delay: float, burst: int = 1) -> 'RateLimiter':
+        """
+        Build a limiter that allows one request every `delay` seconds.
+
+        Args:
+            delay: Seconds between requests (already validated against the minimum)
+            burst: Number of requests that may be sent back-to-back
+        """
+        return cls(1.0 / delay, burst)
+
+    def try_acquire(self) -> float:
+        """
+        Consume a token if one is available, without blocking.
+
+        Returns:
+            0 if a token was taken, otherwise the seconds to wait before retrying
+        """
+        with self._lock:
+            return self._take_token(time.monotonic())
+
+    def _take_token(self, now: float) -> float:
+        """Refill the bucket and take a token (call with the lock held)"""
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is available, then consume it"""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def try_acquire_slot(self) -> float:
+        """
+        Take a concurrency slot for one identifier, without blocking.
+
+        Returns:
+            0 if a slot was taken, otherwise the seconds to wait before retrying
+        """
+        return 0
+
+    def acquire_slot(self):
+        """Block until a concurrency slot is free, then take it"""
+        while True:
+            wait = self.try_acquire_slot()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def release(self):
+        """Free the slot taken by acquire_slot() (no-op here)"""
+
+
+def scrape_batch(identifiers: Iterable[str], scrape: Callable[[str], Dict],
+                 workers: int = DEFAULT_WORKERS,
+                 limiter: Optional[RateLimiter] = None) -> Iterator[Dict]:
+    """
+    Scrape identifiers concurrently and yield their results in input order.
+
+    Only a bounded window of identifiers is in flight at once, so very large
+    inputs are not all queued up front.
+
+    Args:
+        identifiers: Identifiers to scrape (or their identifiers.RequestPlans)
+        scrape: Function that scrapes one identifier (or plan) and returns its result dict
+        workers: Number of worker threads
+        limiter: Global rate limiter whose concurrency slot each identifier holds
+            while it is scraped (None for no limit); the scrape function itself
+            must pass the limiter on to its requests (see http_client.get)
+
+    Yields:
+        Result dictionaries, in the same order as the identifiers
+    """
+    workers = max(1, min(workers, MAX_WORKERS))
+
+    def task(identifier: str) -> Dict:
+        if limiter is None:
+            return scrape(identifier)
+        limiter.acquire_slot()
+        try:
+            return scrape(identifier)
+        finally:
+            limiter.release()
+
+    window = workers * 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scraper') as executor:
+        try:
+            for identifier in identifiers:
+                pending.append(executor.submit(task, identifier))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # If the consumer stops early (e.g. the client disconnected), drop queued work
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,125 @@
+"""
+Cold-Start Import Benchmark
+Measures how long a fresh interpreter takes to import api/index.py and build
+its `handler`, the work every Vercel cold start pays before serving `/`.
+
+Each run uses a new subprocess so nothing is cached in sys.modules. The
+script also checks that heavy dependencies (requests, bs4, openpyxl, ...) are
+not imported at start-up, since they should only load on the code paths that
+use them.
+
+Usage:
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --runs 20 --max-ms 400
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_RUNS = 10
+DEFAULT_TARGET = 'api.index'
+
+# Modules that must stay out of a cold start
+LAZY_MODULES = ['pandas', 'openpyxl', 'bs4', 'requests', 'lxml', 'pyarrow', 'aiohttp']
+
+# Runs in the child interpreter: time the import and report loaded modules
+CHILD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+module = __import__({target!r}, fromlist=['handler'])
+elapsed = time.perf_counter() - start
+assert getattr(module, 'handler', None) is not None, 'handler not exported'
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def run_once(target: str) -> dict:
+    """
+    Import the target in a fresh interpreter.
+
+    Args:
+        target: Module to import (must export `handler`)
+
+    Returns:
+        Dict with the import time in seconds and the lazy modules that were loaded
+    """
+    script = CHILD_SCRIPT.format(target=target, lazy=LAZY_MODULES)
+    output = subprocess.run(
+        [sys.executable, '-c', script],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(target: str, limit: int = 10) -> list:
+    """
+    Return the modules with the largest cumulative import time (python -X importtime).
+
+    Args:
+        target: Module to import
+        limit: Number of entries to return
+
+    Returns:
+        List of (cumulative microseconds, module name) tuples
+    """
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {target}'],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True
+    ).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        entries.append((int(cumulative), name.strip()))
+    entries.sort(reverse=True)
+    return entries[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cold-start import time of the Vercel handler')
+    parser.add_argument('--runs', '-n', type=int, default=DEFAULT_RUNS, help=f'Number of fresh imports (default: {DEFAULT_RUNS})')
+    parser.add_argument('--target', default=DEFAULT_TARGET, help=f'Module to import (default: {DEFAULT_TARGET})')
+    parser.add_argument('--max-ms', type=float, help='Exit with an error if the median import time exceeds this')
+    parser.add_argument('--json', '-j', action='store_true', help='Print the measurements as JSON')
+    args = parser.parse_args()
+
+    runs = [run_once(args.target) for _ in range(max(1, args.runs))]
+    times_ms = sorted(run['seconds'] * 1000 for run in runs)
+    loaded = sorted({name for run in runs for name in run['loaded']})
+    summary = {
+        'target': args.target,
+        'runs': len(times_ms),
+        'median_ms': round(statistics.median(times_ms), 1),
+        'min_ms': round(times_ms[0], 1),
+        'max_ms': round(times_ms[-1], 1),
+        'eagerly_loaded': loaded,
+    }
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"Import of {args.target} ({summary['runs']} runs): "
+              f"median {summary['median_ms']} ms, min {summary['min_ms']} ms, max {summary['max_ms']} ms")
+        print("\nSlowest imports (cumulative):")
+        for cumulative, name in slowest_imports(args.target):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if loaded:
+        print(f"\nError: heavy modules imported at start-up: {', '.join(loaded)}", file=sys.stderr)
+        failed = True
+    if args.max_ms is not None and summary['median_ms'] > args.max_ms:
+        print(f"\nError: median import time {summary['median_ms']} ms exceeds {args.max_ms} ms", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
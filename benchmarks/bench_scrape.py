@@ -0,0 +1,337 @@
+"""
+Scraper Throughput Benchmark
+Runs the scraper against the stub archive.org server (stub_server.py) and
+reports, per scenario:
+
+    items/s          Identifiers finished per second of wall time
+    p50/p99 latency  Time per identifier inside scrape_page_number
+    requests/item    HTTP requests the stub served per identifier
+    KB/item          Response bytes the stub sent per identifier
+    peak RSS         Peak resident memory of the scraping process
+
+With --revalidate, every scenario runs twice over a shared HTTP validator
+cache (--http-cache / SCRAPER_HTTP_CACHE_DIR). The second pass answers
+unchanged responses from the cache after a 304 from the stub, and reports
+how many 304s it got and how many identifiers came out differently from the
+first pass. The benchmark exits with status 1 if a second pass got no 304
+responses or any of its identifiers differ (or, on the synthetic corpus, if
+no identifier was resolved from page_numbers.json or scandata, whose parsed
+values are what a 304 reuses).
+
+Scenarios:
+    cli-threads  scrape_page_numbers.py with the thread pool backend
+    cli-async    scrape_page_numbers.py with the asyncio backend (needs aiohttp)
+    api-scrape   POST /api/scrape on the Flask app, consuming the SSE stream
+
+Each scenario runs in a fresh subprocess (so peak RSS is its own); the stub
+server runs in this process. Without --corpus, a synthetic corpus is
+generated (see corpus.py). The rate limit is lifted to --delay, since the
+stub is local.
+
+Usage:
+    python benchmarks/bench_scrape.py
+    python benchmarks/bench_scrape.py --items 2000 --latency 0.05 --error-rate 0.02
+    python benchmarks/bench_scrape.py --corpus corpus --scenario cli-threads --cli-args="--prefetch"
+    python benchmarks/bench_scrape.py --items 200 --revalidate
+"""
+
+import argparse
+import collections
+import json
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import Corpus, generate_corpus  # noqa: E402
+from stub_server import StubServer  # noqa: E402
+
+SCENARIOS = ('cli-threads', 'cli-async', 'api-scrape')
+DEFAULT_SCENARIOS = ('cli-threads', 'api-scrape')
+DEFAULT_ITEMS = 500
+DEFAULT_WORKERS = 8
+DEFAULT_DELAY = 0.001  # Seconds between identifiers; the stub is local, so barely limit
+# Methods whose parsed value is reused after a 304 (http_client.parse_cached); a
+# --revalidate pass over the synthetic corpus must resolve items with each of them
+REVALIDATED_METHODS = ('page_numbers_json', 'scandata')
+
+
+def percentile(values, fraction: float) -> float:
+    """Return the value at a fraction (0-1) of the sorted values (nearest rank)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    """Return this process's peak resident set size in MB (None where unsupported)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def timed(function, latencies):
+    """Wrap scrape_page_number so every call's duration is recorded"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return wrapper
+
+
+def timed_async(function, latencies):
+    """Async version of timed()"""
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return wrapper
+
+
+def run_child(args):
+    """Run one scenario in this (child) process and print its measurements as JSON"""
+    sys.path.insert(0, REPO_DIR)
+    latencies = []
+    successful = 0
+    results = {}  # identifier -> [page_number, method]
+    with open(args.ids_file, 'r', encoding='utf-8') as f:
+        identifiers = [line.strip() for line in f if line.strip()]
+
+    start = time.perf_counter()
+    if args.child in ('cli-threads', 'cli-async'):
+        import contextlib
+        import scrape_page_numbers
+
+        scrape_page_numbers.MIN_DELAY_SECONDS = args.delay
+        scrape_page_numbers.scrape_page_number = timed(scrape_page_numbers.scrape_page_number, latencies)
+        if args.child == 'cli-async':
+            import async_scraper
+            async_scraper.async_scrape_page_number = timed_async(async_scraper.async_scrape_page_number, latencies)
+        output = os.path.join(args.work_dir, 'results.jsonl')
+        sys.argv = ['scrape_page_numbers.py', '--file', args.ids_file, '--base-url', args.base_url,
+                    '--delay', str(args.delay), '--workers', str(args.workers), '--output', output,
+                    '--backend', 'async' if args.child == 'cli-async' else 'threads'] + shlex.split(args.cli_args)
+        if args.http_cache:
+            sys.argv += ['--http-cache', args.http_cache]
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            scrape_page_numbers.main()
+        with open(output, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    result = json.loads(line)
+                    results[result['identifier']] = [result.get('page_number'), result.get('method')]
+                    successful += 1 if result.get('success') else 0
+    else:
+        os.environ['SCRAPER_JOBS_DIR'] = os.path.join(args.work_dir, 'jobs')
+        if args.http_cache:
+            os.environ['SCRAPER_HTTP_CACHE_DIR'] = args.http_cache
+        import app as web_app
+
+        web_app.MIN_DELAY_SECONDS = args.delay
+        web_app.scrape_page_number = timed(web_app.scrape_page_number, latencies)
+        client = web_app.app.test_client()
+        request_body = {'identifiers': identifiers, 'delay': args.delay, 'workers': args.workers,
+                        **json.loads(args.api_options or '{}')}
+        response = client.post('/api/scrape', json=request_body, buffered=False)
+        for chunk in response.response:
+            for line in (chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk).splitlines():
+                if line.startswith('data: '):
+                    event = json.loads(line[len('data: '):])
+                    if event.get('type') == 'result':
+                        result = event['result']
+                        results[result['identifier']] = [result.get('page_number'), result.get('method')]
+                        successful += 1 if result.get('success') else 0
+        response.close()
+    elapsed = time.perf_counter() - start
+
+    import http_client
+    store = http_client.get_validator_store()
+
+    print(json.dumps({
+        'items': len(identifiers),
+        'successful': successful,
+        'seconds': elapsed,
+        'latencies': latencies,
+        'peak_rss_mb': peak_rss_mb(),
+        'results': results,
+        'revalidated': store.revalidated if store is not None else 0,
+    }))
+
+
+def run_scenario(scenario: str, stub: StubServer, ids_file: str, args, http_cache: str = None,
+                 label: str = None) -> dict:
+    """
+    Run one scenario in a subprocess against the stub and summarize it.
+
+    Args:
+        http_cache: Validator cache directory for the run (None for no revalidation)
+        label: Name reported for the run (default: the scenario)
+
+    Returns:
+        Dict of the measurements reported by this benchmark (plus the
+        per-identifier results, under 'results')
+    """
+    stub.reset_stats()
+    with tempfile.TemporaryDirectory(prefix='bench_scrape_') as work_dir:
+        command = [sys.executable, os.path.abspath(__file__), '--child', scenario,
+                   '--base-url', stub.base_url, '--ids-file', ids_file, '--work-dir', work_dir,
+                   '--workers', str(args.workers), '--delay', str(args.delay),
+                   f'--cli-args={args.cli_args}', f'--api-options={args.api_options}']
+        if http_cache:
+            command += ['--http-cache', http_cache]
+        env = dict(os.environ, ARCHIVE_ORG_BASE_URL=stub.base_url)
+        completed = subprocess.run(command, cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{scenario} failed:\n{completed.stderr}")
+    child = json.loads(completed.stdout.strip().splitlines()[-1])
+    served = stub.stats()
+    items = max(1, child['items'])
+    latencies_ms = [seconds * 1000 for seconds in child['latencies']]
+    return {
+        'scenario': label or scenario,
+        'items': child['items'],
+        'successful': child['successful'],
+        'seconds': round(child['seconds'], 2),
+        'items_per_second': round(child['items'] / child['seconds'], 1) if child['seconds'] else None,
+        'p50_ms': round(percentile(latencies_ms, 0.50), 1),
+        'p99_ms': round(percentile(latencies_ms, 0.99), 1),
+        'mean_ms': round(statistics.mean(latencies_ms), 1) if latencies_ms else 0.0,
+        'requests_per_item': round(served['requests'] / items, 2),
+        'requests_by_kind': served['by_kind'],
+        'kb_per_item': round(served['bytes_sent'] / items / 1024, 1),
+        'injected_errors': served['injected'],
+        'not_modified': served['not_modified'],
+        'revalidated': child['revalidated'],
+        'peak_rss_mb': child['peak_rss_mb'],
+        'results': child['results'],
+    }
+
+
+def run_revalidation(scenario: str, stub: StubServer, ids_file: str, args) -> list:
+    """
+    Run a scenario twice over one validator cache: a first pass that fills
+    it, and a second pass that revalidates against it.
+
+    Returns:
+        The two runs' measurements; the second has 'mismatched', the
+        identifiers whose page number or method differ from the first pass
+    """
+    with tempfile.TemporaryDirectory(prefix='bench_http_cache_') as http_cache:
+        first = run_scenario(scenario, stub, ids_file, args, http_cache)
+        second = run_scenario(scenario, stub, ids_file, args, http_cache, f'{scenario}+304')
+    second['mismatched'] = sorted(identifier for identifier, result in first['results'].items()
+                                  if second['results'].get(identifier) != result)
+    second['methods'] = dict(collections.Counter(method for _, method in second['results'].values() if method))
+    return [first, second]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the scraper against a local stub of archive.org')
+    parser.add_argument('--scenario', '-s', action='append', choices=SCENARIOS,
+                        help=f'Scenario to run (repeatable; default: {", ".join(DEFAULT_SCENARIOS)})')
+    parser.add_argument('--corpus', '-c', help='Recorded corpus directory (default: generate a synthetic one)')
+    parser.add_argument('--items', '-n', type=int, default=DEFAULT_ITEMS, help=f'Synthetic corpus size (default: {DEFAULT_ITEMS})')
+    parser.add_argument('--workers', '-w', type=int, default=DEFAULT_WORKERS, help=f'Concurrent identifiers (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--delay', type=float, default=DEFAULT_DELAY, help=f'Seconds between requests (default: {DEFAULT_DELAY})')
+    parser.add_argument('--latency', type=float, default=0.0, help='Stub latency per response in seconds (default: 0)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random stub latency in seconds (default: 0)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of responses that are injected errors (default: 0)')
+    parser.add_argument('--error-status', type=int, default=503, help='Status of injected errors (default: 503)')
+    parser.add_argument('--reset-rate', type=float, default=0.0, help='Share of connections dropped (default: 0)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the corpus and error injection (default: 0)')
+    parser.add_argument('--cli-args', default='', help='Extra scrape_page_numbers.py arguments for the CLI scenarios, e.g. --cli-args="--prefetch"')
+    parser.add_argument('--api-options', default='', help='Extra JSON fields for the /api/scrape request, e.g. \'{"prefetch": true}\'')
+    parser.add_argument('--revalidate', action='store_true',
+                        help='Run each scenario a second time against the validator cache of the first, so unchanged responses are revalidated with 304s')
+    parser.add_argument('--json', '-j', action='store_true', help='Print the measurements as JSON')
+    parser.add_argument('--child', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    parser.add_argument('--ids-file', help=argparse.SUPPRESS)
+    parser.add_argument('--work-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--http-cache', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    with tempfile.TemporaryDirectory(prefix='bench_corpus_') as temp_dir:
+        if args.corpus:
+            corpus = Corpus(args.corpus)
+        else:
+            corpus = generate_corpus(os.path.join(temp_dir, 'corpus'), args.items, seed=args.seed)
+        if not corpus.identifiers:
+            print(f"Error: corpus {args.corpus} has no identifiers", file=sys.stderr)
+            sys.exit(1)
+        ids_file = os.path.join(temp_dir, 'ids.txt')
+        with open(ids_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(corpus.identifiers) + '\n')
+
+        stub = StubServer(corpus, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                          error_status=args.error_status, reset_rate=args.reset_rate, seed=args.seed)
+        stub.start()
+        try:
+            results = []
+            for scenario in (args.scenario or DEFAULT_SCENARIOS):
+                if args.revalidate:
+                    results.extend(run_revalidation(scenario, stub, ids_file, args))
+                else:
+                    results.append(run_scenario(scenario, stub, ids_file, args))
+        finally:
+            stub.stop()
+    for result in results:
+        del result['results']
+
+    # A revalidation pass must reuse responses and give the same results as the first pass
+    # (and the synthetic corpus has items for every method that reuses parsed values)
+    revalidation_failed = any(
+        not result['revalidated'] or result['mismatched']
+        or (not args.corpus and not all(result['methods'].get(method) for method in REVALIDATED_METHODS))
+        for result in results if 'mismatched' in result
+    )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        sys.exit(1 if revalidation_failed else 0)
+
+    print(f"{len(corpus.identifiers)} identifiers, {args.workers} workers, stub latency {args.latency}s"
+          f" (+{args.jitter}s), error rate {args.error_rate}, reset rate {args.reset_rate}\n")
+    header = f"{'scenario':<16} {'items/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'req/item':>9} {'KB/item':>8} {'RSS MB':>7} {'ok':>6}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        print(f"{result['scenario']:<16} {result['items_per_second']:>8} {result['p50_ms']:>8} {result['p99_ms']:>8} "
+              f"{result['requests_per_item']:>9} {result['kb_per_item']:>8} {result['peak_rss_mb']:>7} "
+              f"{result['successful']:>6}")
+    for result in results:
+        if 'mismatched' in result:
+            print(f"\n{result['scenario']}: {result['not_modified']} response(s) revalidated with 304, "
+                  f"{len(result['mismatched'])} identifier(s) differing from the first pass")
+            print("  Resolved by method: " + ', '.join(f"{method} {count}" for method, count in sorted(result['methods'].items())))
+            for identifier in result['mismatched'][:10]:
+                print(f"  {identifier}")
+    if revalidation_failed:
+        print("\nRevalidation check failed: a second pass got no 304 responses, differs from the first "
+              f"or resolved nothing with one of: {', '.join(REVALIDATED_METHODS)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+Response Corpus for Offline Replay
+A directory of recorded (or generated) archive.org responses: details HTML,
+metadata JSON, page_numbers.json and scandata XML/ZIP. stub_server.py serves
+it in place of archive.org, so scraper changes can be checked and benchmarked
+without network access.
+
+Layout:
+    index.json      {"version": 1, "identifiers": [...], "entries": {path: entry},
+                     "imagecounts": {identifier: n}}
+    bodies/<sha1>   Response bodies, named by the SHA-1 of the request path
+
+Each entry holds the status, the headers worth replaying (Content-Type, ETag,
+Last-Modified, Retry-After) and the body file. "imagecounts" answers
+advancedsearch queries for any batch of identifiers, so the bulk prefetch can
+be replayed however the identifiers are grouped.
+
+Usage (generate a synthetic corpus):
+    python benchmarks/corpus.py --output corpus --items 1000
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+import zipfile
+from typing import Dict, Optional
+
+CORPUS_VERSION = 1
+REPLAYED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Retry-After')
+
+# Share of synthetic items per extraction method (the remainder don't exist: 404)
+DEFAULT_MIX = {
+    'html': 0.5,
+    'page_numbers_json': 0.15,
+    'scandata_xml': 0.15,
+    'scandata_zip': 0.1,
+    'page_files': 0.05,
+}
+DEFAULT_HTML_KB = 150  # Size of a synthetic details page; real ones are 100-300KB
+
+
+class Corpus:
+    """Recorded responses keyed by request path (including the query string)"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.identifiers = []  # Identifiers to scrape when replaying, in order
+        self.entries = {}
+        self.imagecounts = {}
+        self._lock = threading.Lock()
+        index_path = os.path.join(directory, 'index.json')
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != CORPUS_VERSION:
+                raise ValueError(f"Unsupported corpus version in {index_path}: {data.get('version')}")
+            self.identifiers = data.get('identifiers', [])
+            self.entries = data.get('entries', {})
+            self.imagecounts = data.get('imagecounts', {})
+        self._known = set(self.identifiers)
+
+    def lookup(self, path: str) -> Optional[Dict]:
+        """Return the entry recorded for a path, or None"""
+        return self.entries.get(path)
+
+    def read_body(self, entry: Dict) -> bytes:
+        """Return the body of an entry"""
+        with open(os.path.join(self.directory, entry['body']), 'rb') as f:
+            return f.read()
+
+    def add(self, path: str, status: int, headers: Dict[str, str], body: bytes):
+        """
+        Record a response (replacing any earlier one for the path).
+
+        Args:
+            path: Request path including the query string, e.g. "/details/abc"
+            status: HTTP status code
+            headers: Response headers (only REPLAYED_HEADERS are kept)
+            body: Response body
+        """
+        name = os.path.join('bodies', hashlib.sha1(path.encode('utf-8')).hexdigest())
+        os.makedirs(os.path.join(self.directory, 'bodies'), exist_ok=True)
+        with open(os.path.join(self.directory, name), 'wb') as f:
+            f.write(body)
+        kept = {key: value for key, value in headers.items() if key in REPLAYED_HEADERS}
+        with self._lock:
+            self.entries[path] = {'status': status, 'headers': kept, 'body': name}
+
+    def add_imagecounts(self, counts: Dict[str, int]):
+        """Record imagecount values for advancedsearch replay"""
+        with self._lock:
+            self.imagecounts.update(counts)
+
+    def add_identifier(self, identifier: str):
+        """Record an identifier as part of the corpus (e.g. when its details page is requested)"""
+        with self._lock:
+            if identifier not in self._known:
+                self._known.add(identifier)
+                self.identifiers.append(identifier)
+
+    def save(self):
+        """Write index.json"""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            data = {'version': CORPUS_VERSION, 'identifiers': self.identifiers, 'entries': self.entries,
+                    'imagecounts': self.imagecounts}
+        path = os.path.join(self.directory, 'index.json')
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(f"{path}.tmp", path)
+
+
+def _details_html(identifier: str, page_count: Optional[int], size_kb: int, json_link: bool) -> bytes:
+    """Build a details page of about size_kb, with the page count near the end when given"""
+    filler_line = '<div class="item-details-metadata"><dl><dt>Publisher</dt><dd>Example Press</dd></dl></div>\n'
+    filler = filler_line * max(1, (size_kb * 1024) // len(filler_line))
+    reader = f'<span class="BRcurrentpage">(1/{page_count})</span>' if page_count else ''
+    link = f'<a href="/download/{identifier}/{identifier}_page_numbers.json">Page numbers</a>' if json_link else ''
+    return (f'<html><head><title>{identifier}</title></head><body>\n{filler}'
+            f'<div id="BookReader">{reader}</div>{link}\n</body></html>').encode('utf-8')
+
+
+def _scandata_xml(page_count: int) -> bytes:
+    pages = ''.join(f'<page leafNum="{i}"><pageType>Normal</pageType></page>' for i in range(page_count))
+    return (f'<book><bookData><leafCount>{page_count}</leafCount></bookData>'
+            f'<pageData>{pages}</pageData></book>').encode('utf-8')
+
+
+def generate_corpus(directory: str, items: int, mix: Optional[Dict[str, float]] = None,
+                    html_kb: int = DEFAULT_HTML_KB, seed: int = 0) -> Corpus:
+    """
+    Generate a synthetic corpus whose items exercise every extraction method.
+
+    Args:
+        directory: Output directory
+        items: Number of identifiers
+        mix: Share of items per method (see DEFAULT_MIX); the rest return 404
+        html_kb: Approximate details page size in KB
+        seed: Random seed, so runs are comparable
+
+    Returns:
+        The saved Corpus
+    """
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    corpus = Corpus(directory)
+    json_headers = {'Content-Type': 'application/json'}
+    html_headers = {'Content-Type': 'text/html; charset=UTF-8'}
+    xml_headers = {'Content-Type': 'application/xml'}
+
+    for n in range(items):
+        # Mix the identifier shapes seen in practice
+        identifier = rng.choice([f'0431{n:04d}.{1000 + n}', f'3908800{n:07d}', f'examplebook{n:05d}smit'])
+        page_count = rng.randint(20, 900)
+        draw = rng.random()
+        method = None
+        for name, share in mix.items():
+            if draw < share:
+                method = name
+                break
+            draw -= share
+
+        corpus.add_identifier(identifier)
+        if method is None:
+            continue  # Missing item: every request 404s
+        corpus.add_imagecounts({identifier: page_count})
+        files = [{'name': f'{identifier}.pdf', 'format': 'Text PDF'}]
+        details = _details_html(identifier, page_count if method == 'html' else None, html_kb,
+                                json_link=method == 'page_numbers_json')
+        corpus.add(f'/details/{identifier}', 200, html_headers, details)
+
+        if method == 'page_numbers_json':
+            pages = {'pages': [{'leafNum': i, 'pageNumber': str(i)} for i in range(1, page_count + 1)]}
+            corpus.add(f'/download/{identifier}/{identifier}_page_numbers.json', 200, json_headers,
+                       json.dumps(pages).encode('utf-8'))
+        elif method == 'scandata_xml':
+            files.append({'name': f'{identifier}_scandata.xml', 'format': 'Scandata'})
+            corpus.add(f'/download/{identifier}/{identifier}_scandata.xml', 200, xml_headers, _scandata_xml(page_count))
+        elif method == 'scandata_zip':
+            files.append({'name': 'scandata.zip', 'format': 'Scandata'})
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr(f'{identifier}_scandata.xml', _scandata_xml(page_count))
+            corpus.add(f'/download/{identifier}/scandata.zip', 200, {'Content-Type': 'application/zip'},
+                       buffer.getvalue())
+        elif method == 'page_files':
+            files.extend({'name': f'{identifier}_page_{i:04d}.jpg', 'format': 'JPEG'} for i in range(1, page_count + 1))
+        corpus.add(f'/metadata/{identifier}', 200, json_headers,
+                   json.dumps({'metadata': {'identifier': identifier}, 'files': files}).encode('utf-8'))
+
+    corpus.save()
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic archive.org response corpus')
+    parser.add_argument('--output', '-o', required=True, help='Corpus directory to create')
+    parser.add_argument('--items', '-n', type=int, default=1000, help='Number of identifiers (default: 1000)')
+    parser.add_argument('--html-kb', type=int, default=DEFAULT_HTML_KB, help=f'Details page size in KB (default: {DEFAULT_HTML_KB})')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.output, args.items, html_kb=args.html_kb, seed=args.seed)
+    print(f"Wrote {len(corpus.entries)} responses for {len(corpus.identifiers)} identifiers to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
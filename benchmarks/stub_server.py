@@ -0,0 +1,327 @@
+"""
+Stub archive.org Server
+Serves a response corpus (see corpus.py) over HTTP in place of archive.org,
+with configurable latency and injected errors. Point the scraper at it with
+--base-url (or ARCHIVE_ORG_BASE_URL).
+
+Responses carry an ETag (the recorded one, or a digest of the body) and
+conditional requests whose If-None-Match / If-Modified-Since validator
+matches are answered with 304 Not Modified, so --http-cache revalidation
+can be exercised offline.
+
+In record mode, requests missing from the corpus are forwarded to the real
+archive.org and the responses are added to the corpus, so one run against
+the live site captures everything later runs need offline.
+
+Usage:
+    # Record: scrape through the stub once, with network access
+    python benchmarks/stub_server.py --corpus corpus --port 8000 --record
+    python scrape_page_numbers.py --file ids.txt --base-url http://127.0.0.1:8000
+
+    # Replay with 50ms (+ up to 20ms) latency, 2% 503s and 1% dropped connections
+    python benchmarks/stub_server.py --corpus corpus --port 8000 --latency 0.05 --jitter 0.02 \\
+        --error-rate 0.02 --reset-rate 0.01
+"""
+
+import argparse
+import collections
+import hashlib
+import json
+import random
+import socket
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Optional
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from corpus import Corpus
+
+DEFAULT_UPSTREAM = 'https://archive.org'
+RECORD_SAVE_INTERVAL = 50  # Save the corpus index every N recorded responses
+USER_AGENT = 'Mozilla/5.0 (compatible; archive-page-scraper corpus recorder)'
+
+
+def request_kind(path: str) -> str:
+    """Classify a request path: details, metadata, download, search or other"""
+    for prefix, kind in (('/details/', 'details'), ('/metadata/', 'metadata'),
+                         ('/download/', 'download'), ('/advancedsearch.php', 'search')):
+        if path.startswith(prefix):
+            return kind
+    return 'other'
+
+
+def search_identifiers(query: str) -> list:
+    """Return the identifiers in an advancedsearch query built by prefetch.search_url"""
+    values = parse_qs(query).get('q', [''])[0]
+    if not values.startswith('identifier:(') or not values.endswith(')'):
+        return []
+    return [term.strip().strip('"') for term in values[len('identifier:('):-1].split(' OR ')]
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that doesn't print clients closing connections early (e.g. cancelled candidates)"""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubServer:
+    """
+    Threaded HTTP server replaying a Corpus.
+
+    Args:
+        corpus: The corpus to serve
+        latency: Seconds to wait before every response
+        jitter: Up to this many extra seconds, chosen at random per request
+        error_rate: Share of requests answered with error_status
+        error_status: Status code for injected errors (e.g. 429, 503)
+        retry_after: Retry-After seconds sent with injected errors (None to omit)
+        reset_rate: Share of requests whose connection is dropped without a response
+        record: Forward requests missing from the corpus to upstream and record them
+        upstream: Base URL to record from
+        seed: Random seed for jitter and error injection
+    """
+
+    def __init__(self, corpus: Corpus, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, retry_after: Optional[int] = None,
+                 reset_rate: float = 0.0, record: bool = False, upstream: str = DEFAULT_UPSTREAM,
+                 seed: Optional[int] = None, host: str = '127.0.0.1', port: int = 0):
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.reset_rate = reset_rate
+        self.record = record
+        self.upstream = upstream.rstrip('/')
+        self.requests = collections.Counter()  # Requests by kind
+        self.injected = collections.Counter()  # Injected errors by type
+        self.bytes_sent = 0
+        self.not_modified = 0  # Conditional requests answered with 304
+        self._recorded = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._upstream_session = None
+        self._server = _QuietHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        """Base URL to pass to the scraper (--base-url)"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        """Serve in a background thread; returns the base URL"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-server', daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        """Serve in the current thread until interrupted"""
+        self._server.serve_forever()
+
+    def stop(self):
+        """Stop serving (and save the corpus in record mode)"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self.record:
+            self.corpus.save()
+
+    def stats(self) -> Dict:
+        """Return request counts by kind, injected errors, 304 responses and bytes sent"""
+        with self._lock:
+            return {
+                'requests': sum(self.requests.values()),
+                'by_kind': dict(self.requests),
+                'injected': dict(self.injected),
+                'not_modified': self.not_modified,
+                'bytes_sent': self.bytes_sent,
+            }
+
+    def reset_stats(self):
+        """Zero the counters (e.g. between benchmark runs)"""
+        with self._lock:
+            self.requests.clear()
+            self.injected.clear()
+            self.not_modified = 0
+            self.bytes_sent = 0
+
+    def _draw(self):
+        """Return (delay, injected error type or None) for one request"""
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            roll = self._random.random()
+        if roll < self.reset_rate:
+            return delay, 'reset'
+        if roll < self.reset_rate + self.error_rate:
+            return delay, 'status'
+        return delay, None
+
+    def _fetch_upstream(self, path: str):
+        """Fetch a path from upstream and add the response to the corpus"""
+        import requests
+
+        if self._upstream_session is None:
+            self._upstream_session = requests.Session()
+            self._upstream_session.headers['User-Agent'] = USER_AGENT
+        response = self._upstream_session.get(self.upstream + path, timeout=60)
+        body = response.content
+        if response.headers.get('Content-Type', '').startswith('text/html'):
+            # Keep links to downloads on the stub when the corpus is replayed
+            body = body.replace(f'{self.upstream}/download/'.encode(), b'/download/')
+        self.corpus.add(path, response.status_code, dict(response.headers), body)
+
+        parts = urlsplit(path)
+        if request_kind(parts.path) == 'search' and response.ok:
+            counts = {}
+            for doc in response.json().get('response', {}).get('docs', []):
+                if doc.get('identifier') and doc.get('imagecount'):
+                    counts[doc['identifier']] = doc['imagecount']
+            self.corpus.add_imagecounts(counts)
+        with self._lock:
+            self._recorded += 1
+            save = self._recorded % RECORD_SAVE_INTERVAL == 0
+        if save:
+            self.corpus.save()
+
+    @staticmethod
+    def _validated_headers(entry: Dict, body: bytes) -> Dict[str, str]:
+        """Return an entry's headers, with an ETag derived from the body when a 200 has none"""
+        headers = dict(entry.get('headers', {}))
+        if entry['status'] == 200 and not any(key.lower() == 'etag' for key in headers):
+            headers['ETag'] = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        return headers
+
+    @staticmethod
+    def _not_modified(request_headers, headers: Dict[str, str]) -> bool:
+        """Return True if a conditional request's validator matches the response's"""
+        etag = next((value for key, value in headers.items() if key.lower() == 'etag'), None)
+        if_none_match = request_headers.get('If-None-Match')
+        if if_none_match is not None:
+            # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return etag is not None and ('*' in tags or etag in tags or f'W/{etag}' in tags)
+        last_modified = next((value for key, value in headers.items() if key.lower() == 'last-modified'), None)
+        if_modified_since = request_headers.get('If-Modified-Since')
+        return last_modified is not None and if_modified_since == last_modified
+
+    def _search_response(self, query: str) -> bytes:
+        """Answer an advancedsearch query from the corpus imagecounts"""
+        docs = [{'identifier': identifier, 'imagecount': self.corpus.imagecounts[identifier]}
+                for identifier in search_identifiers(query) if identifier in self.corpus.imagecounts]
+        return json.dumps({'responseHeader': {'status': 0}, 'response': {'numFound': len(docs), 'start': 0, 'docs': docs}}).encode()
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like archive.org
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                kind = request_kind(parts.path)
+                with stub._lock:
+                    stub.requests[kind] += 1
+                if stub.record:
+                    # Remember which identifiers were scraped, in order, for replaying the run
+                    if kind == 'details':
+                        stub.corpus.add_identifier(unquote(parts.path[len('/details/'):]))
+                    elif kind == 'search':
+                        for identifier in search_identifiers(parts.query):
+                            stub.corpus.add_identifier(identifier)
+
+                delay, injected = stub._draw()
+                if delay:
+                    time.sleep(delay)
+                if injected == 'reset':
+                    with stub._lock:
+                        stub.injected['reset'] += 1
+                    self.close_connection = True
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+                if injected == 'status':
+                    with stub._lock:
+                        stub.injected[str(stub.error_status)] += 1
+                    headers = {'Retry-After': str(stub.retry_after)} if stub.retry_after is not None else {}
+                    self._send(stub.error_status, b'Injected error', headers)
+                    return
+
+                entry = stub.corpus.lookup(self.path)
+                if entry is None and stub.record:
+                    try:
+                        stub._fetch_upstream(self.path)
+                        entry = stub.corpus.lookup(self.path)
+                    except Exception as e:
+                        self._send(502, f'Recording failed: {e}'.encode(), {})
+                        return
+                if entry is not None:
+                    body = stub.corpus.read_body(entry)
+                    headers = stub._validated_headers(entry, body)
+                    if entry['status'] == 200 and stub._not_modified(self.headers, headers):
+                        with stub._lock:
+                            stub.not_modified += 1
+                        self._send(304, b'', {key: value for key, value in headers.items()
+                                              if key.lower() in ('etag', 'last-modified')})
+                        return
+                    self._send(entry['status'], body, headers)
+                elif kind == 'search':
+                    self._send(200, stub._search_response(parts.query), {'Content-Type': 'application/json'})
+                else:
+                    self._send(404, b'Not found', {'Content-Type': 'text/plain'})
+
+            def _send(self, status: int, body: bytes, headers: Dict[str, str]):
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with stub._lock:
+                    stub.bytes_sent += len(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a recorded archive.org corpus with injected latency and errors')
+    parser.add_argument('--corpus', '-c', required=True, help='Corpus directory (created in record mode)')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', '-p', type=int, default=8000, help='Port to listen on (default: 8000)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before every response (default: 0)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds per response (default: 0)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with --error-status (default: 0)')
+    parser.add_argument('--error-status', type=int, default=503, help='Status code of injected errors (default: 503)')
+    parser.add_argument('--retry-after', type=int, help='Retry-After seconds sent with injected errors')
+    parser.add_argument('--reset-rate', type=float, default=0.0, help='Share of connections dropped without a response (default: 0)')
+    parser.add_argument('--record', action='store_true', help='Fetch requests missing from the corpus from --upstream and record them')
+    parser.add_argument('--upstream', default=DEFAULT_UPSTREAM, help=f'Site to record from (default: {DEFAULT_UPSTREAM})')
+    parser.add_argument('--seed', type=int, help='Random seed for jitter and error injection')
+    args = parser.parse_args()
+
+    stub = StubServer(Corpus(args.corpus), latency=args.latency, jitter=args.jitter,
+                      error_rate=args.error_rate, error_status=args.error_status, retry_after=args.retry_after,
+                      reset_rate=args.reset_rate, record=args.record, upstream=args.upstream, seed=args.seed,
+                      host=args.host, port=args.port)
+    mode = f"recording from {args.upstream}" if args.record else "replaying"
+    print(f"Stub archive.org at {stub.base_url} ({mode} {args.corpus}, {len(stub.corpus.entries)} responses)")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.stop()
+        print(json.dumps(stub.stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
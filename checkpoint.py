@@ -0,0 +1,69 @@
+"""
+Checkpoint Files for Resumable Batch Runs
+Appends each result to a JSONL file as soon as it is available, so a crashed
+or interrupted run can resume without rescraping finished identifiers.
+"""
+
+import json
+import os
+import threading
+from typing import Dict
+
+
+def load_checkpoint(path: str) -> Dict[str, Dict]:
+    """
+    Load the results recorded in a checkpoint file.
+
+    A truncated last line (e.g. from a crash mid-write) is ignored.
+
+    Args:
+        path: Path to the JSONL checkpoint file
+
+    Returns:
+        Dictionary mapping identifier to its recorded result
+    """
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(result, dict) and 'identifier' in result:
+                results[result['identifier']] = result
+    return results
+
+
+class CheckpointWriter:
+    """
+    Append-only JSONL writer; each result is flushed as soon as it is written.
+    Safe to share between worker threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+        # Start on a fresh line if a previous run died mid-write
+        if self._file.tell() > 0:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self._file.write('\n')
+
+    def write(self, result: Dict):
+        """Record one result"""
+        line = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        """Close the checkpoint file"""
+        with self._lock:
+            self._file.close()
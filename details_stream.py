@@ -0,0 +1,123 @@
+"""
+Streaming Details Page Scan
+Reads a details page as it downloads and stops as soon as the BookReader's
+own page counter (e.g. <span class="BRcurrentpage">(1/268)</span>) has been
+seen, so the rest of the page is neither downloaded nor decoded. Pages
+without it are read in full and go through the usual extraction methods.
+"""
+
+import codecs
+import re
+import time
+from typing import Optional, Tuple
+
+from instrumentation import parsing
+
+DETAILS_CHUNK_SIZE = 16 * 1024  # Bytes read per chunk of a streamed details page
+SCAN_OVERLAP = 512  # Characters rescanned from the previous chunk, so a match split between chunks is found
+DRAIN_MAX_BYTES = 64 * 1024  # After a match, a body with at most this much left is read to the end so its connection is reused
+
+# The page counter inside a BRcurrentpage element: "(1/268)" or "(1 of 268)"
+CONFIDENT_PAGE_PATTERN = re.compile(
+    r'class\s*=\s*["\'][^"\'>]*\bBRcurrentpage\b[^"\'>]*["\'][^>]*>\s*\((\d+)(?:/|\s+of\s+)(\d+)\)',
+    re.IGNORECASE
+)
+
+
+class DetailsScanner:
+    """
+    Incremental decoder and scanner for a details page.
+
+    Feed it the body in chunks; feed() returns the page count once the
+    page counter has been seen. The text decoded so far is kept in .text.
+
+    Args:
+        encoding: Charset from the response headers (UTF-8 when unknown)
+    """
+
+    def __init__(self, encoding: Optional[str] = None):
+        try:
+            decoder = codecs.getincrementaldecoder(encoding or 'utf-8')
+        except LookupError:
+            decoder = codecs.getincrementaldecoder('utf-8')
+        self._decoder = decoder(errors='replace')
+        self._parts = []
+        self._tail = ''
+        self.page_count = None
+
+    def feed(self, chunk: bytes, final: bool = False) -> Optional[int]:
+        """
+        Decode and scan the next chunk of the body.
+
+        Args:
+            chunk: The next bytes of the body
+            final: This is the end of the body
+
+        Returns:
+            The page count once the page counter has been found, None until then
+        """
+        text = self._decoder.decode(chunk, final)
+        self._parts.append(text)
+        window = self._tail + text
+        for match in CONFIDENT_PAGE_PATTERN.finditer(window):
+            total = int(match.group(2))
+            # Same sanity check as the full-page extraction: a one-page "book" is not a count
+            if total > 1:
+                self.page_count = total
+                return total
+        self._tail = window[-SCAN_OVERLAP:]
+        return None
+
+    @property
+    def text(self) -> str:
+        """The HTML decoded so far"""
+        if len(self._parts) > 1:
+            self._parts = [''.join(self._parts)]
+        return self._parts[0] if self._parts else ''
+
+
+def _drainable(response) -> bool:
+    """Return True if what's left of the body is small enough to read for the connection's sake"""
+    try:
+        left = int(response.headers.get('Content-Length')) - response.raw.tell()
+    except (TypeError, ValueError, AttributeError):
+        return False
+    return left <= DRAIN_MAX_BYTES
+
+
+def scan_response(response, metrics=None) -> Tuple[Optional[int], str]:
+    """
+    Read a streamed details page response (requests, stream=True), stopping
+    at the page counter. After a match the connection is closed, unless
+    only a little of the body is left, in which case it is read (unscanned)
+    so the pooled connection can be reused.
+
+    Args:
+        response: A 200 response fetched with stream=True
+        metrics: Optional instrumentation.ItemMetrics (decoding and scanning
+            count as parse time, waiting for chunks as network time)
+
+    Returns:
+        Tuple of (page count or None, HTML read: the whole page when no count was found)
+    """
+    scanner = DetailsScanner(response.encoding)
+    start = time.perf_counter()
+    parse_before = metrics.parse_seconds if metrics is not None else 0.0
+    try:
+        chunks = response.iter_content(DETAILS_CHUNK_SIZE)
+        for chunk in chunks:
+            with parsing(metrics):
+                page_count = scanner.feed(chunk)
+            if page_count is not None:
+                if _drainable(response):
+                    for _ in chunks:
+                        pass
+                return page_count, scanner.text
+        with parsing(metrics):
+            scanner.feed(b'', final=True)
+        return None, scanner.text
+    finally:
+        response.close()
+        if metrics is not None:
+            parsed = metrics.parse_seconds - parse_before
+            metrics.add_network(max(0.0, time.perf_counter() - start - parsed))
@@ -0,0 +1,163 @@
+"""
+Conditional-Request Cache for Archive.org Fetches
+Stores response validators (ETag / Last-Modified), bodies and parsed values on
+disk so repeat fetches can be revalidated with If-None-Match /
+If-Modified-Since and a 304 reuses the stored copy.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional, Dict, Any
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # Size bound for stored bodies (512MB)
+EVICTION_INTERVAL = 200  # Check the size bound every N writes
+
+
+def has_validators(headers) -> bool:
+    """Return True if a response carries an ETag or Last-Modified header"""
+    return bool(headers.get('ETag') or headers.get('Last-Modified'))
+
+
+class ValidatorStore:
+    """
+    On-disk store of validators, bodies and parsed values keyed by URL.
+
+    Each URL gets a small JSON metadata file and, when the body was kept, a
+    separate body file. Writes are atomic (write to temp + rename), so the
+    store is safe to share between threads and processes. Oldest entries are
+    evicted once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.revalidated = 0  # Number of 304 responses served from the store
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.body'
+
+    def _write_atomic(self, path: str, data: bytes):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the stored entry for a URL.
+
+        Returns:
+            Dict with etag, last_modified, headers and optionally parsed, or None
+        """
+        meta_path, _ = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def has_body(self, url: str) -> bool:
+        """Return True if a body file is stored for a URL"""
+        _, body_path = self._paths(url)
+        return os.path.exists(body_path)
+
+    def read_body(self, url: str) -> Optional[bytes]:
+        """Return the stored body for a URL, or None if only validators were kept"""
+        _, body_path = self._paths(url)
+        try:
+            with open(body_path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def save(self, url: str, headers, body: Optional[bytes] = None, parsed: Any = None, has_parsed: bool = False):
+        """
+        Store validators for a URL, with its body and/or parsed value.
+
+        Args:
+            url: The requested URL
+            headers: Response headers (must contain ETag or Last-Modified)
+            body: Raw body to keep (None keeps only validators and parsed value)
+            parsed: JSON-serializable value derived from the body
+            has_parsed: Whether `parsed` should be stored
+        """
+        meta_path, body_path = self._paths(url)
+        entry = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'headers': {k: v for k, v in headers.items()
+                        if k.lower() in ('content-type', 'etag', 'last-modified')},
+            'has_body': body is not None,
+            'stored_at': time.time(),
+        }
+        if has_parsed:
+            entry['parsed'] = parsed
+        if body is not None:
+            self._write_atomic(body_path, body)
+        else:
+            try:
+                os.remove(body_path)
+            except OSError:
+                pass
+        self._write_atomic(meta_path, json.dumps(entry).encode('utf-8'))
+        self._after_write()
+
+    def save_parsed(self, url: str, headers, parsed: Any):
+        """
+        Attach a parsed value to a URL's entry, keeping the stored body if the
+        validators still match.
+        """
+        entry = self.lookup(url)
+        same_version = (entry is not None and entry.get('etag') == headers.get('ETag')
+                        and entry.get('last_modified') == headers.get('Last-Modified'))
+        if same_version and entry.get('has_body'):
+            entry['parsed'] = parsed
+            meta_path, _ = self._paths(url)
+            self._write_atomic(meta_path, json.dumps(entry).encode('utf-8'))
+        else:
+            self.save(url, headers, parsed=parsed, has_parsed=True)
+
+    def record_revalidated(self):
+        """Count one 304 response served from the store (safe to call from any thread)"""
+        with self._lock:
+            self.revalidated += 1
+
+    def _after_write(self):
+        with self._lock:
+            self._writes += 1
+            check_size = self._writes % EVICTION_INTERVAL == 0
+        if check_size:
+            self.evict()
+
+    def evict(self):
+        """Delete the oldest entries until the store fits within max_bytes"""
+        files = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(('.json', '.body')):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,451 @@
+"""
+Shared HTTP Client for Archive.org Requests
+Keeps one pooled, keep-alive session per process so every fetch reuses
+TCP/TLS connections instead of opening a new one per request.
+
+requests is imported on first use, so importing this module (e.g. on a
+serverless cold start) stays cheap.
+"""
+
+import io
+import os
+import threading
+import time
+from typing import Optional, Dict, Callable, Any, TYPE_CHECKING
+
+from http_cache import has_validators
+from retry_policy import RetryPolicy, DeadlineExceeded, clamp_timeout
+from rate_control import parse_retry_after
+
+if TYPE_CHECKING:
+    import requests
+
+# User agent sent with every request to avoid blocking
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+DEFAULT_HEADERS = {'User-Agent': USER_AGENT}
+
+# Base URL for every archive.org request; point it at a local stub server to test offline
+DEFAULT_ARCHIVE_ORG_BASE_URL = 'https://archive.org'
+ARCHIVE_ORG_BASE_URL = (os.getenv('ARCHIVE_ORG_BASE_URL') or DEFAULT_ARCHIVE_ORG_BASE_URL).rstrip('/')
+
+DEFAULT_TIMEOUT = 10  # Seconds to wait for archive.org to respond (see RetryPolicy for per-request timeouts)
+
+# Connection pool configuration (overridable through the environment)
+# archive.org redirects downloads to many data nodes (ia8xxxxx.us.archive.org),
+# so keep pools for a generous number of hosts.
+DEFAULT_POOL_CONNECTIONS = int(os.getenv('SCRAPER_POOL_CONNECTIONS', 32))  # Number of hosts to keep pools for
+DEFAULT_POOL_MAXSIZE = int(os.getenv('SCRAPER_POOL_MAXSIZE', 16))  # Keep-alive connections per host
+
+_session = None
+_session_lock = threading.Lock()
+_validator_store = None  # Optional http_cache.ValidatorStore for conditional requests
+_response_observer = None  # Optional rate_control.AdaptiveRateLimiter fed by every response
+_request_recorder = None  # Optional callable(kind, status, seconds) told about every request sent
+_retry_policy = RetryPolicy()  # Timeouts and retries used by every get()
+_details_streaming = os.getenv('SCRAPER_STREAM_DETAILS', '1').lower() not in ('0', 'false', 'no')
+_config = {
+    'pool_connections': DEFAULT_POOL_CONNECTIONS,
+    'pool_maxsize': DEFAULT_POOL_MAXSIZE,
+    'host_pool_sizes': {},
+    'headers': dict(DEFAULT_HEADERS),
+}
+
+
+def configure(pool_connections: Optional[int] = None, pool_maxsize: Optional[int] = None,
+              host_pool_sizes: Optional[Dict[str, int]] = None, headers: Optional[Dict[str, str]] = None):
+    """
+    Configure the shared HTTP session. Any existing session is closed and
+    rebuilt lazily with the new settings on the next request.
+
+    Args:
+        pool_connections: Number of per-host connection pools to keep
+        pool_maxsize: Default number of keep-alive connections per host
+        host_pool_sizes: Per-host overrides, e.g. {"https://archive.org/": 32}
+        headers: Extra headers sent with every request
+    """
+    global _session
+    with _session_lock:
+        if pool_connections is not None:
+            _config['pool_connections'] = pool_connections
+        if pool_maxsize is not None:
+            _config['pool_maxsize'] = pool_maxsize
+        if host_pool_sizes is not None:
+            _config['host_pool_sizes'] = dict(host_pool_sizes)
+        if headers is not None:
+            _config['headers'] = {**DEFAULT_HEADERS, **headers}
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def archive_url(path: str) -> str:
+    """
+    Build an archive.org URL from a path such as "details/{identifier}".
+
+    Args:
+        path: Path on archive.org (a leading slash is optional)
+
+    Returns:
+        The full URL under ARCHIVE_ORG_BASE_URL
+    """
+    return f"{ARCHIVE_ORG_BASE_URL}/{path.lstrip('/')}"
+
+
+def set_archive_base_url(base_url: Optional[str]):
+    """
+    Send archive.org requests to another base URL (e.g. a local stub server).
+
+    Args:
+        base_url: Base URL such as "http://127.0.0.1:8000", or None for archive.org
+    """
+    global ARCHIVE_ORG_BASE_URL
+    ARCHIVE_ORG_BASE_URL = (base_url or DEFAULT_ARCHIVE_ORG_BASE_URL).rstrip('/')
+
+
+def _build_session() -> 'requests.Session':
+    """Create a session with pooled adapters for http, https and any per-host overrides"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.headers.update(_config['headers'])
+
+    adapter = HTTPAdapter(
+        pool_connections=_config['pool_connections'],
+        pool_maxsize=_config['pool_maxsize']
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    # requests picks the longest matching prefix, so host-specific adapters win
+    for prefix, maxsize in _config['host_pool_sizes'].items():
+        session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=maxsize))
+
+    return session
+
+
+def get_session() -> 'requests.Session':
+    """
+    Return the process-wide shared session, creating it on first use.
+    The underlying urllib3 pools are thread-safe, so the session is shared
+    by every worker thread.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def set_validator_store(store):
+    """
+    Enable (or with None, disable) conditional-request revalidation.
+
+    Args:
+        store: An http_cache.ValidatorStore shared by all fetches
+    """
+    global _validator_store
+    _validator_store = store
+
+
+def get_validator_store():
+    """Return the configured validator store, or None if revalidation is off"""
+    return _validator_store
+
+
+def set_response_observer(observer):
+    """
+    Report every response (status and latency) and every timeout or
+    connection error to an observer, or with None stop reporting.
+
+    Args:
+        observer: Object with observe(status_code, latency, headers) and
+            observe_failure(), e.g. a rate_control.AdaptiveRateLimiter
+    """
+    global _response_observer
+    _response_observer = observer
+
+
+def get_response_observer():
+    """Return the configured response observer, or None"""
+    return _response_observer
+
+
+def set_request_recorder(recorder: Optional[Callable[[Optional[str], Optional[int], float], None]]):
+    """
+    Report every request sent (each retry included) to a recorder, e.g. for
+    latency metrics, or with None stop reporting.
+
+    Args:
+        recorder: Function called with (kind, status code or None after a
+            timeout/connection error, seconds until the response headers arrived)
+    """
+    global _request_recorder
+    _request_recorder = recorder
+
+
+def get_request_recorder():
+    """Return the configured request recorder, or None"""
+    return _request_recorder
+
+
+def set_details_streaming(enabled: bool):
+    """
+    Stream details pages and stop reading at the page counter (see
+    details_stream), or with False always download them in full.
+
+    Args:
+        enabled: Whether details pages are streamed
+    """
+    global _details_streaming
+    _details_streaming = enabled
+
+
+def get_details_streaming() -> bool:
+    """
+    Return True if details pages should be streamed: enabled, and no
+    validator store is configured (revalidation needs the whole stored page).
+    """
+    return _details_streaming and _validator_store is None
+
+
+def set_retry_policy(policy: RetryPolicy):
+    """
+    Replace the timeout/retry policy used by every fetch.
+
+    Args:
+        policy: A retry_policy.RetryPolicy
+    """
+    global _retry_policy
+    _retry_policy = policy
+
+
+def get_retry_policy() -> RetryPolicy:
+    """Return the current timeout/retry policy"""
+    return _retry_policy
+
+
+def _send_with_retries(url: str, timeout, kind: Optional[str], deadline: Optional[float],
+                       metrics=None, limiter=None, **kwargs) -> 'requests.Response':
+    """
+    GET with the retry policy: timeouts, connection errors and retryable
+    status codes are retried with jittered exponential backoff (at least
+    Retry-After when given) until attempts run out or the deadline is near.
+    When the next wait would reach past the deadline, the last response (or
+    error) is returned (or raised) right away rather than slept on.
+    Every attempt first takes a token from the rate limiter, if one is given.
+    """
+    import requests
+
+    policy = _retry_policy
+    base_timeout = timeout if timeout is not None else policy.timeout(kind)
+    if not isinstance(base_timeout, tuple):
+        base_timeout = (base_timeout, base_timeout)
+
+    for attempt in range(policy.max_attempts):
+        last_attempt = attempt == policy.max_attempts - 1
+        if limiter is not None:
+            _take_token(limiter, deadline)
+        if metrics is not None:
+            metrics.add_request()
+        try:
+            response = _send(url, clamp_timeout(base_timeout, deadline), kind, **kwargs)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            wait = policy.backoff(attempt)
+            # Don't sleep past the deadline; give up with this error instead
+            if last_attempt or _past_deadline(wait, deadline):
+                raise
+        else:
+            if response.status_code not in policy.retry_statuses or last_attempt:
+                return response
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            wait = max(policy.backoff(attempt), retry_after or 0)
+            # Don't sleep past the deadline; give up with this response instead
+            if _past_deadline(wait, deadline):
+                return response
+            response.close()
+
+        time.sleep(wait)
+
+
+def _take_token(limiter, deadline: Optional[float] = None):
+    """
+    Block until the rate limiter grants a request token.
+
+    Args:
+        limiter: A batch.RateLimiter (or anything with its try_acquire())
+        deadline: Monotonic time by which the identifier must finish
+
+    Raises:
+        retry_policy.DeadlineExceeded: If the token would only come after the deadline
+    """
+    while True:
+        wait = limiter.try_acquire()
+        if wait <= 0:
+            return
+        if _past_deadline(wait, deadline):
+            raise DeadlineExceeded("Deadline exceeded while waiting for the rate limiter")
+        time.sleep(wait)
+
+
+def _past_deadline(wait: float, deadline: Optional[float]) -> bool:
+    """Return True if waiting this long would reach the deadline"""
+    return deadline is not None and time.monotonic() + wait >= deadline
+
+
+def _send(url: str, timeout, kind: Optional[str] = None, **kwargs) -> 'requests.Response':
+    """GET through the shared session, reporting the outcome to the response observer and request recorder"""
+    observer = _response_observer
+    recorder = _request_recorder
+    if observer is None and recorder is None:
+        return get_session().get(url, timeout=timeout, **kwargs)
+
+    import requests
+
+    start = time.perf_counter()
+    try:
+        response = get_session().get(url, timeout=timeout, **kwargs)
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+        if observer is not None:
+            observer.observe_failure()
+        if recorder is not None:
+            recorder(kind, None, time.perf_counter() - start)
+        raise
+    if observer is not None:
+        observer.observe(response.status_code, response.elapsed.total_seconds(), response.headers)
+    if recorder is not None:
+        recorder(kind, response.status_code, time.perf_counter() - start)
+    return response
+
+
+def _response_from_store(url: str, entry: Dict, not_modified: 'requests.Response') -> 'requests.Response':
+    """Build a 200 response from a stored entry after a 304 Not Modified"""
+    import requests
+    from urllib3 import HTTPResponse
+
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.request = not_modified.request
+    response.headers.update(entry.get('headers', {}))
+    response.headers.update(not_modified.headers)
+    body = (_validator_store.read_body(url) if entry.get('has_body') else None) or b''
+    response._content = body
+    response._content_consumed = True
+    # Callers close responses (often in a finally or a with block), and
+    # Response.close() closes .raw, so the stored body gets a raw of its own
+    response.raw = HTTPResponse(body=io.BytesIO(body), preload_content=False)
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.requested_url = url
+    response.from_cache = True
+    response.validator_entry = entry
+    return response
+
+
+def get(url: str, timeout=None, kind: Optional[str] = None, deadline: Optional[float] = None,
+        metrics=None, limiter=None, **kwargs) -> 'requests.Response':
+    """
+    Perform a GET request through the shared pooled session, retrying
+    transient failures according to the retry policy.
+
+    When a validator store is configured, stored ETag/Last-Modified values are
+    sent as If-None-Match/If-Modified-Since and a 304 is answered from the
+    store (response.from_cache is True). Non-streamed 200 responses that carry
+    validators are stored; streamed ones only keep what parse_cached records.
+
+    Args:
+        url: The URL to fetch
+        timeout: Timeout in seconds or (connect, read); defaults to the policy's timeout for `kind`
+        kind: Kind of request (retry_policy.KIND_*), for per-strategy timeouts
+        deadline: Monotonic time by which the identifier must finish (from RetryPolicy.start_deadline)
+        metrics: Optional instrumentation.ItemMetrics counting requests, bytes and network time
+        limiter: Optional batch.RateLimiter; every attempt (retries included) takes one token
+        **kwargs: Passed through to requests.Session.get
+
+    Returns:
+        The requests Response object
+
+    Raises:
+        retry_policy.DeadlineExceeded: If the deadline passes before a response arrives
+    """
+    if metrics is None:
+        return _get(url, timeout, kind, deadline, None, limiter, **kwargs)
+
+    start = time.perf_counter()
+    response = None
+    try:
+        response = _get(url, timeout, kind, deadline, metrics, limiter, **kwargs)
+        return response
+    finally:
+        if response is None:
+            metrics.add_network(time.perf_counter() - start)
+        else:
+            metrics.add_response(response, time.perf_counter() - start)
+
+
+def _get(url: str, timeout, kind: Optional[str], deadline: Optional[float], metrics, limiter,
+         **kwargs) -> 'requests.Response':
+    """get() without the instrumentation timing"""
+    store = _validator_store
+    if store is None:
+        return _send_with_retries(url, timeout, kind, deadline, metrics, limiter, **kwargs)
+
+    entry = store.lookup(url)
+    if entry is not None and entry.get('has_body') and not store.has_body(url):
+        entry = None  # Body was evicted; fetch unconditionally
+    headers = dict(kwargs.pop('headers', None) or {})
+    if entry is not None:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    response = _send_with_retries(url, timeout, kind, deadline, metrics, limiter, headers=headers, **kwargs)
+    if response.status_code == 304 and entry is not None:
+        response.close()
+        store.record_revalidated()
+        return _response_from_store(url, entry, response)
+
+    response.requested_url = url
+    response.from_cache = False
+    if response.status_code == 200 and not kwargs.get('stream'):
+        if has_validators(response.headers):
+            store.save(url, response.headers, body=response.content)
+    return response
+
+
+def parse_cached(response: 'requests.Response', parse: Callable[['requests.Response'], Any]) -> Any:
+    """
+    Parse a response, reusing the stored parsed value after a 304 revalidation.
+
+    Use this for responses whose parsed value is all the caller needs (e.g. a
+    scandata leaf count), so unchanged content is neither downloaded nor
+    re-parsed. The value must be JSON-serializable.
+
+    Args:
+        response: A 200 response returned by get()
+        parse: Function computing the value from the response
+
+    Returns:
+        The parsed value
+    """
+    entry = getattr(response, 'validator_entry', None)
+    if entry is not None and 'parsed' in entry:
+        return entry['parsed']
+
+    value = parse(response)
+    store = _validator_store
+    if store is not None and response.status_code == 200:
+        if has_validators(response.headers):
+            store.save_parsed(getattr(response, 'requested_url', response.url), response.headers, value)
+    return value
+
+
+def close():
+    """Close the shared session and release its pooled connections"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
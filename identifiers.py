@@ -0,0 +1,216 @@
+"""
+Identifier Classification and Request Planning
+Classifies identifiers into families with precompiled patterns and works out,
+in one pass per identifier, every URL the scraper may request for it: the
+details page, the metadata API, the page_numbers.json variants derived from
+the identifier and {identifier}_scandata.xml.
+
+Plans are plain data, so a batch can be planned (and its requests counted or
+deduplicated) before anything is fetched, and candidates that cannot exist
+are skipped: derived file names are only tried when the identifier is one
+archive.org could have issued, and not at all once the item's file list is
+known and doesn't contain them.
+"""
+
+import re
+from typing import Collection, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import http_client
+
+# Families, from the most specific pattern to the least
+FAMILY_INSTITUTIONAL = 'institutional'  # "04315104.1697.emory.edu"
+FAMILY_DOTTED = 'dotted'  # "04315104.1697"
+FAMILY_NUMERIC = 'numeric'  # "39088000610261" (barcodes)
+FAMILY_NAMED = 'named'  # "1841Minutes", "historyofengland00smit"
+FAMILY_INVALID = 'invalid'  # Not a possible archive.org identifier (spaces, slashes, over 100 characters)
+
+# Dot-separated parts dropped from institutional identifiers to get their file name stem
+INSTITUTION_PARTS = frozenset(('emory', 'edu'))
+
+VALID_IDENTIFIER_PATTERN = re.compile(r'[A-Za-z0-9._-]{1,100}')
+INSTITUTIONAL_PATTERN = re.compile(r'(?:^|\.)(?:emory|edu)(?:\.|$)')
+NUMERIC_PATTERN = re.compile(r'\d+')
+LETTERS_PATTERN = re.compile(r'[a-z]+')
+SEPARATOR_PATTERN = re.compile(r'[.-]')
+
+PAGE_NUMBERS_JSON_SUFFIX = '_page_numbers.json'
+SCANDATA_SUFFIX = '_scandata.xml'
+
+
+def classify_identifier(identifier: str) -> str:
+    """
+    Return the family of an identifier (one of the FAMILY_* constants).
+
+    e.g. "04315104.1697.emory.edu" -> FAMILY_INSTITUTIONAL,
+    "39088000610261" -> FAMILY_NUMERIC, "bad id" -> FAMILY_INVALID
+
+    Args:
+        identifier: The identifier ID
+
+    Returns:
+        The family name
+    """
+    if not VALID_IDENTIFIER_PATTERN.fullmatch(identifier):
+        return FAMILY_INVALID
+    if '.' in identifier:
+        return FAMILY_INSTITUTIONAL if INSTITUTIONAL_PATTERN.search(identifier) else FAMILY_DOTTED
+    if NUMERIC_PATTERN.fullmatch(identifier):
+        return FAMILY_NUMERIC
+    return FAMILY_NAMED
+
+
+def identifier_shape(identifier: str) -> str:
+    """
+    Return the shape of an identifier, a finer grouping than its family:
+    runs of digits are replaced by '9' and runs of letters by 'a'.
+
+    e.g. "04315104.1697" -> "9.9", "historyofengland00smit" -> "a9a"
+
+    Args:
+        identifier: The identifier ID
+
+    Returns:
+        The shape
+    """
+    return LETTERS_PATTERN.sub('a', NUMERIC_PATTERN.sub('9', identifier.strip().lower()))
+
+
+def page_numbers_json_names(identifier: str, family: Optional[str] = None) -> List[str]:
+    """
+    Return the page_numbers.json file names derived from an identifier, in priority order.
+
+    Args:
+        identifier: The identifier ID
+        family: Its family, when already classified
+
+    Returns:
+        Distinct file names (none for FAMILY_INVALID)
+    """
+    family = family or classify_identifier(identifier)
+    if family == FAMILY_INVALID:
+        return []
+    # "{identifier_underscores}_page_numbers.json", e.g. "04315104_1697_page_numbers.json"
+    names = [SEPARATOR_PATTERN.sub('_', identifier) + PAGE_NUMBERS_JSON_SUFFIX]
+    if family in (FAMILY_DOTTED, FAMILY_INSTITUTIONAL):
+        # Dots only, with any institution suffix dropped: "04315104.1697.emory.edu" -> "04315104_1697"
+        base_parts = [part for part in identifier.split('.') if part not in INSTITUTION_PARTS]
+        if base_parts:
+            names.append('_'.join(base_parts) + PAGE_NUMBERS_JSON_SUFFIX)
+    return list(dict.fromkeys(names))
+
+
+class RequestPlan:
+    """
+    Every URL the scraper may request for one identifier.
+
+    Derived download candidates are kept as (file name, URL) pairs, so they
+    can be filtered against the item's file list once it is known.
+    """
+
+    def __init__(self, identifier: str, family: str, details_url: str, metadata_url: str,
+                 page_numbers_json: List[Tuple[str, str]], scandata: Optional[Tuple[str, str]]):
+        self.identifier = identifier
+        self.family = family
+        self.details_url = details_url
+        self.metadata_url = metadata_url
+        self.page_numbers_json = page_numbers_json
+        self.scandata = scandata
+
+    def page_numbers_json_urls(self, files: Optional[Collection[str]] = None) -> List[str]:
+        """
+        Return the derived page_numbers.json URLs worth requesting.
+
+        Args:
+            files: Names of the item's files, if known (candidates not among them are skipped)
+
+        Returns:
+            URLs in priority order
+        """
+        return [url for name, url in self.page_numbers_json if files is None or name in files]
+
+    def scandata_url(self, files: Optional[Collection[str]] = None) -> Optional[str]:
+        """
+        Return the {identifier}_scandata.xml URL, or None if it can't exist.
+
+        Args:
+            files: Names of the item's files, if known
+        """
+        if self.scandata is None or (files is not None and self.scandata[0] not in files):
+            return None
+        return self.scandata[1]
+
+    def urls(self) -> List[str]:
+        """Return every candidate URL, in the order the fallback chain would first try them"""
+        urls = [self.details_url] + self.page_numbers_json_urls()
+        if self.scandata is not None:
+            urls.append(self.scandata[1])
+        urls.append(self.metadata_url)
+        return urls
+
+    def as_dict(self) -> Dict:
+        """Return the plan as a JSON-serializable dictionary"""
+        return {
+            'identifier': self.identifier,
+            'family': self.family,
+            'details_url': self.details_url,
+            'metadata_url': self.metadata_url,
+            'page_numbers_json_urls': self.page_numbers_json_urls(),
+            'scandata_url': self.scandata_url(),
+        }
+
+
+def _plan(identifier: str, base_url: str) -> RequestPlan:
+    family = classify_identifier(identifier)
+    download = f"{base_url}/download/{identifier}/"
+    scandata_name = identifier + SCANDATA_SUFFIX
+    return RequestPlan(
+        identifier,
+        family,
+        f"{base_url}/details/{identifier}",
+        f"{base_url}/metadata/{identifier}",
+        [(name, download + name) for name in page_numbers_json_names(identifier, family)],
+        (scandata_name, download + scandata_name) if family != FAMILY_INVALID else None,
+    )
+
+
+def plan_identifier(identifier: str) -> RequestPlan:
+    """
+    Plan the requests for one identifier.
+
+    Args:
+        identifier: The identifier ID
+
+    Returns:
+        Its RequestPlan
+    """
+    return _plan(identifier, http_client.archive_url('').rstrip('/'))
+
+
+def iter_plans(identifiers: Iterable[str]) -> Iterator[RequestPlan]:
+    """
+    Plan the requests for a stream of identifiers lazily, so a batch is
+    planned as it is fed to the workers rather than held in memory all at
+    once (the caller removes duplicates).
+
+    Args:
+        identifiers: Identifier IDs
+
+    Yields:
+        RequestPlans in input order
+    """
+    base_url = http_client.archive_url('').rstrip('/')
+    for identifier in identifiers:
+        yield _plan(identifier, base_url)
+
+
+def plan_batch(identifiers: Iterable[str]) -> List[RequestPlan]:
+    """
+    Plan the requests for a batch of identifiers in one pass (duplicates are planned once).
+
+    Args:
+        identifiers: Identifier IDs
+
+    Returns:
+        RequestPlans in input order
+    """
+    return list(iter_plans(dict.fromkeys(identifiers)))
@@ -0,0 +1,214 @@
+"""
+Streaming Identifier Ingestion
+Reads identifier lists lazily (plain text or gzip, one identifier per line)
+and removes duplicates without keeping every identifier string in memory, so
+lists with millions of identifiers can be uploaded and scraped.
+
+Duplicates are tracked either exactly (64-bit digests, a fraction of the
+memory of the strings themselves) or with a Bloom filter for very large lists
+(fixed memory per identifier, at the cost of occasionally dropping a unique
+identifier as a false positive).
+"""
+
+import codecs
+import gzip
+import hashlib
+import io
+import math
+from typing import BinaryIO, Iterable, Iterator, Union
+
+GZIP_MAGIC = b'\x1f\x8b'
+READ_CHUNK_SIZE = 64 * 1024  # Bytes read per chunk from an upload stream
+
+DEDUPE_EXACT = 'exact'
+DEDUPE_BLOOM = 'bloom'
+DEDUPE_MODES = (DEDUPE_EXACT, DEDUPE_BLOOM)
+
+DEFAULT_BLOOM_CAPACITY = 1_000_000  # Identifiers per filter layer before it grows
+DEFAULT_BLOOM_ERROR_RATE = 1e-7  # Chance a unique identifier is dropped as a duplicate
+
+
+def _decompressed(stream: BinaryIO) -> BinaryIO:
+    """Wrap a binary stream so gzip input is decompressed on the fly"""
+    if not hasattr(stream, 'peek'):
+        stream = io.BufferedReader(_ChunkReader(stream), READ_CHUNK_SIZE)
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+class _ChunkReader(io.RawIOBase):
+    """Adapt a read()-only stream (e.g. a WSGI input) so it can be buffered and peeked"""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def iter_identifiers(source: Union[str, BinaryIO]) -> Iterator[str]:
+    """
+    Yield identifiers from a file, one per line, reading it lazily.
+
+    Gzip input is detected from its header and decompressed on the fly; a
+    UTF-8 byte order mark is skipped and blank lines are ignored.
+
+    Args:
+        source: File path or binary stream (e.g. an uploaded file)
+
+    Yields:
+        Identifier strings, stripped of surrounding whitespace
+    """
+    file = open(source, 'rb') if isinstance(source, str) else None
+    stream = _decompressed(file or source)
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    pending = ''
+    try:
+        while True:
+            chunk = stream.read(READ_CHUNK_SIZE)
+            text = pending + decoder.decode(chunk or b'', final=not chunk)
+            lines = text.split('\n')
+            pending = lines.pop() if chunk else ''
+            for line in lines:
+                identifier = line.strip()
+                if identifier:
+                    yield identifier
+            if not chunk:
+                break
+    finally:
+        if file is not None:
+            file.close()
+
+
+def _digest(identifier: str, size: int) -> bytes:
+    return hashlib.blake2b(identifier.encode('utf-8'), digest_size=size).digest()
+
+
+class DigestSet:
+    """
+    Exact-in-practice set of identifiers, storing a 64-bit digest per
+    identifier instead of the string (collisions are astronomically unlikely:
+    about one in 10^6 for ten million identifiers).
+    """
+
+    def __init__(self):
+        self._digests = set()
+
+    def __len__(self):
+        return len(self._digests)
+
+    def add(self, identifier: str) -> bool:
+        """Add an identifier; returns False if it was already present"""
+        key = int.from_bytes(_digest(identifier, 8), 'little')
+        if key in self._digests:
+            return False
+        self._digests.add(key)
+        return True
+
+
+class BloomFilter:
+    """
+    Scalable Bloom filter: when a layer reaches its capacity, a layer twice
+    as large with half the error rate is added, so the overall false
+    positive rate stays below twice error_rate however many identifiers
+    arrive. A false positive makes unique() drop a unique identifier.
+
+    Args:
+        capacity: Identifiers the first layer holds
+        error_rate: Target false positive rate
+    """
+
+    def __init__(self, capacity: int = DEFAULT_BLOOM_CAPACITY, error_rate: float = DEFAULT_BLOOM_ERROR_RATE):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self._layers = []  # [bits, bit count, hash count, capacity, items]
+        self._count = 0
+        self._add_layer(self.capacity, error_rate / 2)
+
+    def __len__(self):
+        return self._count
+
+    def _add_layer(self, capacity: int, error_rate: float):
+        size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        hashes = max(1, int(round(size / capacity * math.log(2))))
+        self._layers.append([bytearray((size + 7) // 8), size, hashes, capacity, 0])
+
+    @property
+    def size_bytes(self) -> int:
+        """Memory used by the filter's bit arrays"""
+        return sum(len(layer[0]) for layer in self._layers)
+
+    def add(self, identifier: str) -> bool:
+        """Add an identifier; returns False if it was (probably) already present"""
+        digest = _digest(identifier, 16)  # Two 64-bit halves for double hashing
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for bits, size, hashes, _, _ in self._layers:
+            for i in range(hashes):
+                position = (first + i * second) % size
+                if not bits[position >> 3] & (1 << (position & 7)):
+                    break
+            else:
+                return False
+
+        layer = self._layers[-1]
+        if layer[4] >= layer[3]:
+            self._add_layer(layer[3] * 2, self.error_rate / 2 ** (len(self._layers) + 1))
+            layer = self._layers[-1]
+        bits, size, hashes = layer[0], layer[1], layer[2]
+        for i in range(hashes):
+            position = (first + i * second) % size
+            bits[position >> 3] |= 1 << (position & 7)
+        layer[4] += 1
+        self._count += 1
+        return True
+
+
+def create_seen_set(mode: str = DEDUPE_EXACT, capacity: int = DEFAULT_BLOOM_CAPACITY,
+                    error_rate: float = DEFAULT_BLOOM_ERROR_RATE):
+    """
+    Create the structure unique() tracks identifiers with.
+
+    Args:
+        mode: DEDUPE_EXACT (DigestSet) or DEDUPE_BLOOM (BloomFilter)
+        capacity: Expected number of identifiers (Bloom filter sizing)
+        error_rate: Bloom filter false positive rate
+
+    Returns:
+        An object with add(identifier) -> bool
+    """
+    if mode == DEDUPE_BLOOM:
+        return BloomFilter(capacity, error_rate)
+    if mode == DEDUPE_EXACT:
+        return DigestSet()
+    raise ValueError(f"Unknown dedupe mode: {mode!r} (use one of: {', '.join(DEDUPE_MODES)})")
+
+
+def unique(identifiers: Iterable[str], seen=None) -> Iterator[str]:
+    """
+    Yield identifiers in order, skipping duplicates.
+
+    Args:
+        identifiers: Identifiers, possibly with duplicates
+        seen: Structure from create_seen_set; a plain set when omitted (the
+            cheapest choice when the caller keeps the identifiers in memory anyway)
+
+    Yields:
+        Each identifier the first time it appears
+    """
+    if seen is None:
+        seen = set()
+        for identifier in identifiers:
+            if identifier not in seen:
+                seen.add(identifier)
+                yield identifier
+        return
+    for identifier in identifiers:
+        if seen.add(identifier):
+            yield identifier
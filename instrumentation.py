@@ -0,0 +1,193 @@
+"""
+Per-Identifier Instrumentation
+Optional counters recorded while one identifier is scraped: HTTP requests
+(including retries), bytes received, time spent waiting on the network vs.
+parsing, conditional-request revalidations and the methods tried. Enabled
+with --metrics (CLI) or "metrics": true (web jobs); the numbers are added to
+each result as result['metrics'].
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Cache outcomes recorded in result['metrics']['cache']
+CACHE_HIT = 'hit'
+CACHE_MISS = 'miss'
+
+
+def response_bytes(response) -> int:
+    """
+    Return the body bytes received for a response: bytes read off the wire
+    for responses from the network (compressed size, and only what was read
+    of a streamed body), or the stored body size for revalidated responses.
+    """
+    if not getattr(response, 'from_cache', False):
+        received = _raw_bytes(getattr(response, 'raw', None))
+        if received is not None:
+            return received
+    return len(getattr(response, '_content', None) or b'')
+
+
+def _raw_bytes(raw) -> Optional[int]:
+    """Return the bytes read so far from a urllib3 response, or None if unknown"""
+    if raw is not None and hasattr(raw, 'tell'):
+        try:
+            return raw.tell()
+        except Exception:
+            pass
+    return None
+
+
+class ItemMetrics:
+    """
+    Thread-safe counters for one identifier (page_numbers.json candidates
+    are fetched from several threads at once).
+
+    Network time is the time spent inside HTTP requests, summed over
+    requests (concurrent candidates overlap, so it can exceed the total).
+    Parse time covers HTML/JSON/XML parsing; for streamed bodies (scandata,
+    page_numbers.json) it includes reading the body as it is parsed. The
+    async backend counts bytes after decompression.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.revalidated = 0
+        self.network_seconds = 0.0
+        self.parse_seconds = 0.0
+        self.methods_tried: List[str] = []
+        self._bytes = 0
+        self._streams = []  # Raw streams of streamed responses, whose bytes are counted once read
+        self._lock = threading.Lock()
+        self._local = threading.local()  # Parse nesting depth, so nested blocks aren't counted twice
+        self._start = time.perf_counter()
+
+    def add_request(self):
+        """Count one HTTP request sent (each retry counts)"""
+        with self._lock:
+            self.requests += 1
+
+    def add_response(self, response, seconds: float):
+        """
+        Record a response returned by http_client.get. The response is not
+        kept: a body already read is counted now, and a streamed one keeps
+        only its raw stream, whose position is read when the item finishes.
+
+        Args:
+            response: The response
+            seconds: Time spent in the request, including retries
+        """
+        raw = getattr(response, 'raw', None)
+        streamed = (not getattr(response, '_content_consumed', True) and not getattr(response, 'from_cache', False)
+                    and _raw_bytes(raw) is not None)
+        received = 0 if streamed else response_bytes(response)
+        with self._lock:
+            self.network_seconds += seconds
+            self._bytes += received
+            if streamed:
+                self._streams.append(raw)
+            if getattr(response, 'from_cache', False):
+                self.revalidated += 1
+
+    def add_network(self, seconds: float, received: int = 0):
+        """Record network time and bytes measured elsewhere (e.g. by the async backend)"""
+        with self._lock:
+            self.network_seconds += seconds
+            self._bytes += received
+
+    @contextmanager
+    def parsing(self):
+        """Time a block of parsing work (blocks nested inside it are not counted again)"""
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.parse_seconds += elapsed
+
+    def as_dict(self, cache: Optional[str] = None) -> Dict:
+        """
+        Return the counters as stored in result['metrics'].
+
+        Args:
+            cache: Result cache outcome (CACHE_HIT, CACHE_MISS) or None without a cache
+
+        Returns:
+            Dict with requests, bytes, network_ms, parse_ms, total_ms,
+            revalidated, methods_tried and cache
+        """
+        with self._lock:
+            received = self._bytes + sum(_raw_bytes(raw) or 0 for raw in self._streams)
+            return {
+                'requests': self.requests,
+                'bytes': received,
+                'network_ms': round(self.network_seconds * 1000, 1),
+                'parse_ms': round(self.parse_seconds * 1000, 1),
+                'total_ms': round((time.perf_counter() - self._start) * 1000, 1),
+                'revalidated': self.revalidated,
+                'methods_tried': list(self.methods_tried),
+                'cache': cache,
+            }
+
+
+def empty_metrics(cache: Optional[str] = None) -> Dict:
+    """Return metrics for a result that needed no requests (cache hit or bulk prefetch)"""
+    metrics = ItemMetrics().as_dict(cache)
+    metrics['total_ms'] = 0.0
+    return metrics
+
+
+@contextmanager
+def parsing(metrics: Optional[ItemMetrics]):
+    """Time a block of parsing work when metrics are being recorded (no-op otherwise)"""
+    if metrics is None:
+        yield
+    else:
+        with metrics.parsing():
+            yield
+
+
+class MetricsSummary:
+    """Totals of result['metrics'] over a run, overall and per method that found the page count"""
+
+    def __init__(self):
+        self.items = 0
+        self.totals = {'requests': 0, 'bytes': 0, 'network_ms': 0.0, 'parse_ms': 0.0, 'total_ms': 0.0}
+        self.cache_hits = 0
+        self.by_method: Dict[str, Dict] = {}
+
+    def add(self, result: Dict):
+        """Add one result's metrics (results without metrics are ignored)"""
+        metrics = result.get('metrics')
+        if not metrics:
+            return
+        self.items += 1
+        if metrics.get('cache') == CACHE_HIT:
+            self.cache_hits += 1
+        method = self.by_method.setdefault(result.get('method') or 'not found',
+                                           {'items': 0, 'requests': 0, 'bytes': 0, 'total_ms': 0.0})
+        method['items'] += 1
+        for key in self.totals:
+            self.totals[key] += metrics.get(key, 0)
+            if key in method:
+                method[key] += metrics.get(key, 0)
+
+    def as_dict(self) -> Dict:
+        """
+        Return the summary.
+
+        Returns:
+            Dict with items, cache_hits, the totals and per-method totals
+        """
+        totals = {key: round(value, 1) if isinstance(value, float) else value for key, value in self.totals.items()}
+        by_method = {method: {key: round(value, 1) if isinstance(value, float) else value
+                              for key, value in counts.items()}
+                     for method, counts in self.by_method.items()}
+        return {'items': self.items, 'cache_hits': self.cache_hits, **totals, 'by_method': by_method}
@@ -0,0 +1,210 @@
+"""
+Per-Identifier Item Context
+Lazily fetches and parses the details page, metadata JSON and file list for
+one identifier, so every extraction strategy shares a single download of each.
+"""
+
+import importlib.util
+import json
+from typing import Optional, List, Dict, Callable, Any, Set, Tuple
+
+import http_client
+from details_stream import scan_response
+from identifiers import RequestPlan, plan_identifier
+from instrumentation import parsing
+from retry_policy import KIND_DETAILS, KIND_METADATA, RETRYABLE_STATUS_CODES, DeadlineExceeded
+
+_NOT_FETCHED = object()  # Sentinel so failed fetches are remembered as None
+
+# Use the much faster lxml parser when it is installed
+HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+
+class ItemContext:
+    """
+    Shared, lazily-populated state for scraping a single identifier.
+
+    Each resource is fetched at most once; failures are cached as None so
+    later strategies don't retry them. All fetches share the identifier's
+    deadline, and transient failures (timeouts, 429/5xx) are counted so a
+    "not found" outcome can be reported as retryable. With an
+    instrumentation.ItemMetrics, every fetch and parse is measured, and
+    with a rate limiter every request takes one of its tokens.
+    The candidate URLs come from an identifiers.RequestPlan.
+    """
+
+    def __init__(self, identifier: str, deadline: Optional[float] = None, metrics=None,
+                 plan: Optional[RequestPlan] = None, limiter=None):
+        self.identifier = identifier
+        self.plan = plan or plan_identifier(identifier)
+        self.details_url = self.plan.details_url
+        self.metadata_url = self.plan.metadata_url
+        self.deadline = deadline  # Monotonic time by which all fetches must finish
+        self.transient_failures = 0
+        self.metrics = metrics  # Optional instrumentation.ItemMetrics
+        self.limiter = limiter  # Optional batch.RateLimiter shared by the batch
+        self._details_response = _NOT_FETCHED
+        self._details_streamed = False
+        self._details_html = _NOT_FETCHED
+        self._soup = _NOT_FETCHED
+        self._metadata = _NOT_FETCHED
+
+    def get(self, url: str, kind: Optional[str] = None, **kwargs):
+        """
+        GET a URL under this identifier's deadline and rate limiter, counting transient failures.
+
+        Args:
+            url: The URL to fetch
+            kind: Kind of request (retry_policy.KIND_*), for per-strategy timeouts
+            **kwargs: Passed through to http_client.get
+
+        Returns:
+            The requests Response object
+        """
+        import requests
+
+        try:
+            response = http_client.get(url, kind=kind, deadline=self.deadline, metrics=self.metrics,
+                                       limiter=self.limiter, **kwargs)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, DeadlineExceeded):
+            self.transient_failures += 1
+            raise
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            self.transient_failures += 1
+        return response
+
+    def parse_cached(self, response, parse: Callable[[Any], Any]) -> Any:
+        """
+        http_client.parse_cached, timed as parse work when instrumented.
+
+        Args:
+            response: A 200 response returned by get()
+            parse: Function computing the value from the response
+
+        Returns:
+            The parsed value
+        """
+        with parsing(self.metrics):
+            return http_client.parse_cached(response, parse)
+
+    def details_response(self):
+        """
+        Fetch the details page response (once).
+        Network errors propagate so the caller can report them.
+
+        Returns:
+            The requests Response for the details page
+        """
+        if self._details_response is _NOT_FETCHED:
+            self._details_streamed = http_client.get_details_streaming()
+            self._details_response = self.get(self.details_url, kind=KIND_DETAILS, stream=self._details_streamed)
+        return self._details_response
+
+    def read_details(self) -> Tuple[Optional[int], str]:
+        """
+        Read the body of the details page (call once the response is known to be OK).
+
+        A streamed page is scanned as it downloads and reading stops at the
+        BookReader page counter (details_stream.scan_response); otherwise the
+        whole body is decoded. Read errors propagate.
+
+        Returns:
+            Tuple of (page count found by the scan, or None; the HTML read,
+            which stops at the page counter when one was found)
+        """
+        response = self.details_response()
+        if self._details_streamed:
+            page_count, html_content = scan_response(response, self.metrics)
+        else:
+            with parsing(self.metrics):
+                page_count, html_content = None, response.text
+        self._details_html = html_content
+        return page_count, html_content
+
+    def set_details_html(self, html_content: str):
+        """Seed the context with details HTML that was fetched elsewhere"""
+        self._details_html = html_content
+
+    def details_html(self) -> Optional[str]:
+        """
+        Return the details page HTML, fetching it if needed.
+
+        Returns:
+            The HTML text, or None if the page could not be fetched
+        """
+        if self._details_html is _NOT_FETCHED:
+            try:
+                response = self.details_response()
+                self._details_html = response.text if response.ok else None
+            except Exception:
+                self._details_html = None
+        return self._details_html
+
+    def soup(self):
+        """
+        Return a parsed BeautifulSoup tree of the details page (built once).
+
+        Returns:
+            The BeautifulSoup object, or None if the HTML is unavailable
+        """
+        if self._soup is _NOT_FETCHED:
+            html_content = self.details_html()
+            if html_content is None:
+                self._soup = None
+            else:
+                from bs4 import BeautifulSoup
+                with parsing(self.metrics):
+                    self._soup = BeautifulSoup(html_content, HTML_PARSER)
+        return self._soup
+
+    def metadata(self) -> Optional[Dict]:
+        """
+        Return the parsed metadata API JSON, fetching it if needed.
+
+        Returns:
+            The metadata dictionary, or None if unavailable
+        """
+        if self._metadata is _NOT_FETCHED:
+            self._metadata = None
+            try:
+                response = self.get(self.metadata_url, kind=KIND_METADATA)
+                if response.status_code == 200:
+                    with parsing(self.metrics):
+                        self._metadata = json.loads(response.text)
+            except Exception:
+                pass
+        return self._metadata
+
+    def files(self) -> List[Dict]:
+        """
+        Return the file list from the metadata API.
+
+        Returns:
+            List of file dictionaries (empty if metadata is unavailable)
+        """
+        metadata = self.metadata()
+        if not metadata:
+            return []
+        return metadata.get('files', [])
+
+    def known_file_names(self) -> Optional[Set[str]]:
+        """
+        Return the names of the item's files if the metadata has already been
+        fetched (this never fetches it), so impossible candidates can be skipped.
+
+        Returns:
+            Set of file names, or None if the file list is unknown
+        """
+        if self._metadata is _NOT_FETCHED:
+            return None
+        return file_names(self._metadata)
+
+
+def file_names(metadata: Optional[Dict]) -> Optional[Set[str]]:
+    """
+    Return the file names listed in parsed metadata, or None if it lists none
+    (an item without a file list may still have files, so nothing can be ruled out).
+    """
+    names = {f.get('name') for f in (metadata or {}).get('files', [])}
+    names.discard(None)
+    return names or None
@@ -0,0 +1,379 @@
+"""
+Background Job Queue for Web Scrapes
+Runs submitted scrape jobs on a pool of background worker threads and keeps an
+event log per job, so progress can be streamed (and re-streamed after a
+disconnect) independently of the HTTP request that submitted the job.
+
+Two interchangeable backends:
+    LocalJobQueue   In-memory queue and event log (one process)
+    SQLiteJobQueue  Queue and event log in a SQLite file, shared by every
+                    process on the host (e.g. several gunicorn workers)
+
+A SQLite job is claimed under a lease that its worker pool keeps renewing
+while the job runs. If the worker's process dies, the lease expires. The job
+is then queued again for any pool to claim, or failed after MAX_JOB_CLAIMS
+claims, so it doesn't stay "running" forever.
+"""
+
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_JOB_WORKERS = int(os.getenv('SCRAPER_JOB_WORKERS', 2))  # Jobs run concurrently per process
+JOB_RETENTION_SECONDS = 6 * 3600  # Event logs of finished jobs are kept this long
+POLL_INTERVAL_SECONDS = 0.25  # SQLite backend: how often to check for new jobs/events
+JOB_LEASE_SECONDS = int(os.getenv('SCRAPER_JOB_LEASE_SECONDS', 60))  # SQLite backend: a claim not renewed for this long has expired
+LEASE_RENEW_SECONDS = JOB_LEASE_SECONDS / 3  # How often a worker renews its running job's lease
+MAX_JOB_CLAIMS = 3  # A job whose claim expired this many times is failed instead of requeued
+MAX_LOCAL_EVENTS = int(os.getenv('SCRAPER_JOB_MAX_EVENTS', 10000))  # Local backend: newest events kept per job
+
+# Event types that end a job's event stream
+FINAL_EVENT_TYPES = ('complete', 'error')
+
+
+class _EventLog:
+    """The newest events of one job; event IDs keep counting up as older events are dropped"""
+
+    def __init__(self, max_events: int):
+        self.events = deque(maxlen=max_events)
+        self.last_id = 0
+
+    def append(self, event: Dict) -> int:
+        self.events.append(event)
+        self.last_id += 1
+        return self.last_id
+
+    def since(self, last_event_id: int) -> List[Tuple[int, Dict]]:
+        """Return the kept events after last_event_id (a reader that fell behind skips the dropped ones)"""
+        first_id = self.last_id - len(self.events) + 1
+        start = max(last_event_id + 1, first_id)
+        return list(enumerate(itertools.islice(self.events, start - first_id, None), start))
+
+
+class LocalJobQueue:
+    """
+    In-process job queue and event log; jobs and events are lost on restart.
+
+    Only the newest max_events events of each job are kept (results are in
+    the job store), and logs of jobs finished JOB_RETENTION_SECONDS ago are
+    dropped whenever the queue is used, including by idle workers polling it.
+    """
+
+    def __init__(self, max_events: int = MAX_LOCAL_EVENTS):
+        self.max_events = max(1, max_events)
+        self._pending = deque()
+        self._events = {}  # job_id -> _EventLog
+        self._finished_at = {}
+        self._condition = threading.Condition()
+
+    def submit(self, job_id: str, payload: Dict):
+        """Queue a job for the worker pool"""
+        with self._condition:
+            self._drop_expired()
+            self._events[job_id] = _EventLog(self.max_events)
+            self._pending.append((job_id, payload))
+            self._condition.notify_all()
+
+    def claim(self, timeout: float) -> Optional[Tuple[str, Dict]]:
+        """Take the oldest queued job, waiting up to timeout seconds for one"""
+        with self._condition:
+            self._drop_expired()
+            if not self._pending:
+                self._condition.wait(timeout)
+            if not self._pending:
+                return None
+            return self._pending.popleft()
+
+    def renew(self, job_id: str):
+        """Renew a running job's claim (nothing to do: jobs live and die with this process)"""
+
+    def has_job(self, job_id: str) -> bool:
+        """Return True if the queue knows this job (queued, running or recently finished)"""
+        with self._condition:
+            return job_id in self._events
+
+    def add_event(self, job_id: str, event: Dict) -> int:
+        """Append an event to a job's log and return its event ID"""
+        with self._condition:
+            self._drop_expired()
+            log = self._events.get(job_id)
+            if log is None:
+                log = self._events[job_id] = _EventLog(self.max_events)
+            event_id = log.append(event)
+            if event.get('type') in FINAL_EVENT_TYPES:
+                self._finished_at[job_id] = time.time()
+            self._condition.notify_all()
+            return event_id
+
+    def events_since(self, job_id: str, last_event_id: int, timeout: float) -> List[Tuple[int, Dict]]:
+        """
+        Return the events after last_event_id, waiting up to timeout seconds
+        if there are none yet.
+
+        Returns:
+            List of (event ID, event) tuples (empty on timeout)
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._drop_expired()
+            while True:
+                log = self._events.get(job_id)
+                if log is not None and log.last_id > last_event_id:
+                    return log.since(last_event_id)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._condition.wait(remaining)
+
+    def _drop_expired(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id, finished_at in list(self._finished_at.items()):
+            if finished_at < cutoff:
+                del self._finished_at[job_id]
+                self._events.pop(job_id, None)
+
+
+class SQLiteJobQueue:
+    """
+    Job queue and event log stored in SQLite. Every process on the host that
+    opens the same file shares the queue: any worker pool may claim a job and
+    any process can stream its events.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' job_id TEXT PRIMARY KEY,'
+                ' payload TEXT NOT NULL,'
+                ' status TEXT NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' finished_at REAL,'
+                ' lease_until REAL,'
+                ' claims INTEGER NOT NULL DEFAULT 0)'
+            )
+            # Queue files created before leases existed
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+            if 'lease_until' not in columns:
+                self._conn.execute('ALTER TABLE jobs ADD COLUMN lease_until REAL')
+            if 'claims' not in columns:
+                self._conn.execute('ALTER TABLE jobs ADD COLUMN claims INTEGER NOT NULL DEFAULT 0')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS events ('
+                ' job_id TEXT NOT NULL,'
+                ' event_id INTEGER NOT NULL,'
+                ' event TEXT NOT NULL,'
+                ' PRIMARY KEY (job_id, event_id))'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)')
+
+    def submit(self, job_id: str, payload: Dict):
+        """Queue a job for the worker pools"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Drop event logs of jobs that finished long ago
+                expired = 'SELECT job_id FROM jobs WHERE finished_at < ?'
+                self._conn.execute(f'DELETE FROM events WHERE job_id IN ({expired})', (now - JOB_RETENTION_SECONDS,))
+                self._conn.execute('DELETE FROM jobs WHERE finished_at < ?', (now - JOB_RETENTION_SECONDS,))
+                self._conn.execute(
+                    "INSERT INTO jobs (job_id, payload, status, created_at) VALUES (?, ?, 'queued', ?)",
+                    (job_id, json.dumps(payload), now)
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def _insert_event(self, job_id: str, event: Dict) -> int:
+        """Append an event inside the current transaction (call with the lock held)"""
+        event_id = self._conn.execute(
+            'SELECT COALESCE(MAX(event_id), 0) + 1 FROM events WHERE job_id = ?', (job_id,)
+        ).fetchone()[0]
+        self._conn.execute(
+            'INSERT INTO events (job_id, event_id, event) VALUES (?, ?, ?)',
+            (job_id, event_id, json.dumps(event, ensure_ascii=False))
+        )
+        if event.get('type') in FINAL_EVENT_TYPES:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'finished', finished_at = ?, lease_until = NULL WHERE job_id = ?",
+                (time.time(), job_id)
+            )
+        return event_id
+
+    def _requeue_expired(self, now: float):
+        """Requeue (or fail) running jobs whose lease expired (call with the lock held, in a transaction)"""
+        expired = self._conn.execute(
+            "SELECT job_id, claims FROM jobs WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ?)",
+            (now,)
+        ).fetchall()
+        for job_id, claims in expired:
+            if claims >= MAX_JOB_CLAIMS:
+                print(f"Job {job_id} failed: its worker stopped {claims} time(s)")
+                self._insert_event(job_id, {'type': 'error', 'job_id': job_id,
+                                            'error': f'Job abandoned: its worker stopped {claims} time(s)'})
+            else:
+                print(f"Requeued job {job_id}: its worker stopped renewing its lease")
+                self._conn.execute("UPDATE jobs SET status = 'queued', lease_until = NULL WHERE job_id = ?", (job_id,))
+
+    def _try_claim(self) -> Optional[Tuple[str, Dict]]:
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                self._requeue_expired(now)
+                row = self._conn.execute(
+                    "SELECT job_id, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', lease_until = ?, claims = claims + 1 WHERE job_id = ?",
+                        (now + JOB_LEASE_SECONDS, row[0])
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return (row[0], json.loads(row[1])) if row is not None else None
+
+    def claim(self, timeout: float) -> Optional[Tuple[str, Dict]]:
+        """Take the oldest queued job, polling for up to timeout seconds"""
+        deadline = time.monotonic() + timeout
+        while True:
+            claimed = self._try_claim()
+            if claimed is not None or time.monotonic() >= deadline:
+                return claimed
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+    def renew(self, job_id: str):
+        """Extend a running job's lease, so other pools don't take it for abandoned"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE job_id = ? AND status = 'running'",
+                (time.time() + JOB_LEASE_SECONDS, job_id)
+            )
+
+    def has_job(self, job_id: str) -> bool:
+        """Return True if the queue knows this job (queued, running or recently finished)"""
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM jobs WHERE job_id = ?', (job_id,)).fetchone() is not None
+
+    def add_event(self, job_id: str, event: Dict) -> int:
+        """Append an event to a job's log and return its event ID"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                event_id = self._insert_event(job_id, event)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return event_id
+
+    def events_since(self, job_id: str, last_event_id: int, timeout: float) -> List[Tuple[int, Dict]]:
+        """
+        Return the events after last_event_id, polling for up to timeout
+        seconds if there are none yet.
+
+        Returns:
+            List of (event ID, event) tuples (empty on timeout)
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    'SELECT event_id, event FROM events WHERE job_id = ? AND event_id > ? ORDER BY event_id',
+                    (job_id, last_event_id)
+                ).fetchall()
+            if rows or time.monotonic() >= deadline:
+                return [(event_id, json.loads(event)) for event_id, event in rows]
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+
+def create_job_queue(backend: str = 'local', path: Optional[str] = None):
+    """
+    Create a job queue backend.
+
+    Args:
+        backend: 'local' (in-process) or 'sqlite' (shared by processes on the host)
+        path: SQLite file for the 'sqlite' backend
+
+    Returns:
+        A LocalJobQueue or SQLiteJobQueue
+    """
+    if backend == 'sqlite':
+        return SQLiteJobQueue(path)
+    if backend == 'local':
+        return LocalJobQueue()
+    raise ValueError(f"Unknown job queue backend: {backend}")
+
+
+class JobWorkerPool:
+    """
+    Background threads that claim jobs from a queue and run them.
+
+    run_job(job_id, payload, emit) does the work and reports progress by
+    calling emit(event); it should emit a 'complete' event when done. If it
+    raises, on_failure(job_id, error) is called so the job's own record can
+    be marked as failed, then an 'error' event is recorded for the job. While
+    a job runs, its claim on the queue is renewed every LEASE_RENEW_SECONDS.
+    """
+
+    def __init__(self, queue, run_job: Callable[[str, Dict, Callable[[Dict], int]], None],
+                 workers: int = DEFAULT_JOB_WORKERS, on_failure: Optional[Callable[[str, str], None]] = None):
+        self.queue = queue
+        self.run_job = run_job
+        self.on_failure = on_failure
+        self.workers = max(1, workers)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads (only the first call has an effect)"""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'scrape-job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            claimed = self.queue.claim(timeout=1.0)
+            if claimed is None:
+                continue
+            job_id, payload = claimed
+            emit = lambda event, job_id=job_id: self.queue.add_event(job_id, event)
+            done = threading.Event()
+            threading.Thread(target=self._renew_lease, args=(job_id, done), name=f'scrape-job-lease-{job_id}',
+                             daemon=True).start()
+            try:
+                self.run_job(job_id, payload, emit)
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                if self.on_failure is not None:
+                    try:
+                        self.on_failure(job_id, str(e))
+                    except Exception as failure:
+                        print(f"Warning: Could not record the failure of job {job_id}: {failure}")
+                emit({'type': 'error', 'job_id': job_id, 'error': str(e)})
+            finally:
+                done.set()
+
+    def _renew_lease(self, job_id: str, done: threading.Event):
+        while not done.wait(LEASE_RENEW_SECONDS):
+            try:
+                self.queue.renew(job_id)
+            except sqlite3.Error as e:
+                print(f"Warning: Could not renew the lease of job {job_id}: {e}")
@@ -0,0 +1,349 @@
+"""
+Per-Job Result Store
+Gives every web scrape its own job ID and result files in a size-bounded temp
+directory, so concurrent runs (and several gunicorn workers on one host) don't
+overwrite each other's results.
+
+Each job directory holds:
+    job.json       Job metadata (status, total, summary)
+    results.jsonl  Results, appended as they arrive (the canonical copy)
+    results.<ext>  Download artifacts, converted from results.jsonl on demand
+
+Uploaded identifier lists are kept next to the jobs (uploads/<upload_id>.txt.gz)
+so a scrape can reference a large list by ID instead of carrying it in its body.
+A job pins the upload it reads (uploads/<upload_id>.pin-<job_id>) from when it
+is queued until it finishes, so the upload TTL can't expire it in between.
+"""
+
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Optional, Dict, Iterable, Iterator, List, Tuple
+
+from ingest import iter_identifiers
+from result_writers import JsonlResultWriter, open_result_writer
+
+DEFAULT_MAX_BYTES = int(os.getenv('SCRAPER_JOB_STORE_MAX_BYTES', 256 * 1024 * 1024))  # Size bound for all jobs (256MB)
+STALE_JOB_SECONDS = 6 * 3600  # Running jobs untouched for this long may be evicted
+UPLOAD_TTL_SECONDS = int(os.getenv('SCRAPER_UPLOAD_TTL_SECONDS', 24 * 3600))  # Uploaded lists are kept this long
+UPLOADS_DIR_NAME = 'uploads'
+PIN_MAX_SECONDS = 7 * 24 * 3600  # Pins left behind by jobs that never finished stop protecting uploads after this
+
+STATUS_RUNNING = 'running'
+STATUS_COMPLETE = 'complete'
+STATUS_FAILED = 'failed'
+
+# Download formats and their content types
+DOWNLOAD_FORMATS = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'json': 'application/json',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def is_valid_job_id(job_id: str) -> bool:
+    """Return True if job_id looks like an ID from create_job (also guards against path traversal)"""
+    return bool(JOB_ID_PATTERN.match(job_id or ''))
+
+
+def is_valid_upload_id(upload_id: str) -> bool:
+    """Return True if upload_id looks like an ID from save_upload"""
+    return bool(JOB_ID_PATTERN.match(upload_id or ''))
+
+
+class JobStore:
+    """
+    Directory of per-job result files, shared by all threads and processes on
+    a host. Once the total size exceeds max_bytes, the oldest finished (or
+    stale) jobs are deleted; uploads expire after UPLOAD_TTL_SECONDS.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.uploads_dir = os.path.join(directory, UPLOADS_DIR_NAME)
+        os.makedirs(self.uploads_dir, exist_ok=True)
+
+    def _job_dir(self, job_id: str) -> str:
+        if not is_valid_job_id(job_id):
+            raise ValueError(f"Invalid job ID: {job_id!r}")
+        return os.path.join(self.directory, job_id)
+
+    def _write_meta(self, job_id: str, meta: Dict):
+        path = os.path.join(self._job_dir(job_id), 'job.json')
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def create_job(self, total: int = 0, metrics: bool = False) -> str:
+        """
+        Create a new job directory.
+
+        Args:
+            total: Number of identifiers in the job
+            metrics: The job records per-identifier instrumentation (exports get its columns)
+
+        Returns:
+            The new job ID
+        """
+        job_id = uuid.uuid4().hex
+        os.makedirs(self._job_dir(job_id))
+        self._write_meta(job_id, {
+            'job_id': job_id,
+            'status': STATUS_RUNNING,
+            'total': total,
+            'metrics': metrics,
+            'created_at': time.time(),
+        })
+        return job_id
+
+    def _upload_path(self, upload_id: str) -> str:
+        if not is_valid_upload_id(upload_id):
+            raise ValueError(f"Invalid upload ID: {upload_id!r}")
+        return os.path.join(self.uploads_dir, f'{upload_id}.txt.gz')
+
+    def save_upload(self, identifiers: Iterable[str]) -> Tuple[str, int]:
+        """
+        Store an identifier list, consuming it lazily (it is never held in memory).
+
+        Args:
+            identifiers: Identifiers to store, already deduplicated
+
+        Returns:
+            Tuple of (upload ID, number of identifiers stored)
+        """
+        upload_id = uuid.uuid4().hex
+        path = self._upload_path(upload_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        count = 0
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=1) as f:
+                for identifier in identifiers:
+                    f.write(identifier + '\n')
+                    count += 1
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with open(f'{path}.json', 'w', encoding='utf-8') as f:
+            json.dump({'upload_id': upload_id, 'count': count, 'created_at': time.time()}, f)
+        self.evict_uploads(keep=upload_id)
+        return upload_id, count
+
+    def get_upload(self, upload_id: str) -> Optional[Dict]:
+        """Return an upload's metadata (upload_id, count), or None if it doesn't exist (or expired)"""
+        if not is_valid_upload_id(upload_id) or not os.path.exists(self._upload_path(upload_id)):
+            return None
+        try:
+            with open(f'{self._upload_path(upload_id)}.json', 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def iter_upload(self, upload_id: str) -> Iterator[str]:
+        """Yield an upload's identifiers in order, reading the file lazily"""
+        return iter_identifiers(self._upload_path(upload_id))
+
+    def delete_upload(self, upload_id: str):
+        """Delete an upload and its metadata"""
+        path = self._upload_path(upload_id)
+        for name in (path, f'{path}.json'):
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+
+    def _pin_path(self, upload_id: str, job_id: str) -> str:
+        if not is_valid_upload_id(upload_id) or not is_valid_job_id(job_id):
+            raise ValueError(f"Invalid upload or job ID: {upload_id!r}, {job_id!r}")
+        return os.path.join(self.uploads_dir, f'{upload_id}.pin-{job_id}')
+
+    def pin_upload(self, upload_id: str, job_id: str):
+        """Keep an upload from expiring while a job that reads it is queued or running"""
+        with open(self._pin_path(upload_id, job_id), 'w', encoding='utf-8'):
+            pass
+
+    def unpin_upload(self, upload_id: str, job_id: str):
+        """Release a job's pin on an upload (it expires with the TTL again)"""
+        try:
+            os.remove(self._pin_path(upload_id, job_id))
+        except OSError:
+            pass
+
+    def evict_uploads(self, keep: Optional[str] = None):
+        """
+        Delete uploads older than UPLOAD_TTL_SECONDS, unless a job pins them.
+
+        Args:
+            keep: An upload ID that must not be deleted
+        """
+        now = time.time()
+        try:
+            names = os.listdir(self.uploads_dir)
+        except OSError:
+            return
+        pinned = set()
+        for name in names:
+            if '.pin-' not in name:
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.uploads_dir, name)) >= now - PIN_MAX_SECONDS:
+                    pinned.add(name.split('.', 1)[0])
+            except OSError:
+                pass
+        for name in names:
+            upload_id = name.split('.', 1)[0]
+            if upload_id == keep or upload_id in pinned or not is_valid_upload_id(upload_id):
+                continue
+            cutoff = now - (PIN_MAX_SECONDS if '.pin-' in name else UPLOAD_TTL_SECONDS)
+            try:
+                if os.path.getmtime(os.path.join(self.uploads_dir, name)) < cutoff:
+                    os.remove(os.path.join(self.uploads_dir, name))
+            except OSError:
+                pass
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Return a job's metadata, or None if it doesn't exist (or was evicted)"""
+        if not is_valid_job_id(job_id):
+            return None
+        try:
+            with open(os.path.join(self._job_dir(job_id), 'job.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def result_writer(self, job_id: str) -> JsonlResultWriter:
+        """Open the writer that records a job's results as they arrive"""
+        return JsonlResultWriter(os.path.join(self._job_dir(job_id), 'results.jsonl'))
+
+    def finish_job(self, job_id: str, summary: Dict):
+        """
+        Mark a job as complete, then evict old jobs if the store is too big.
+
+        Args:
+            job_id: The job ID
+            summary: Summary counts shown to the user
+        """
+        meta = self.get_job(job_id) or {'job_id': job_id, 'created_at': time.time()}
+        meta.update({'status': STATUS_COMPLETE, 'summary': summary, 'finished_at': time.time()})
+        self._write_meta(job_id, meta)
+        self.evict(keep=job_id)
+
+    def fail_job(self, job_id: str, error: str):
+        """
+        Mark a job as failed (the results recorded before the failure are kept).
+
+        Args:
+            job_id: The job ID
+            error: Error message shown to the user
+        """
+        meta = self.get_job(job_id) or {'job_id': job_id, 'created_at': time.time()}
+        meta.update({'status': STATUS_FAILED, 'error': error, 'finished_at': time.time()})
+        self._write_meta(job_id, meta)
+
+    def latest_job(self) -> Optional[str]:
+        """Return the ID of the most recently finished job, if any"""
+        latest = None
+        for job_id in self._job_ids():
+            meta = self.get_job(job_id)
+            if meta and meta.get('status') == STATUS_COMPLETE:
+                if latest is None or meta.get('finished_at', 0) > latest[0]:
+                    latest = (meta.get('finished_at', 0), job_id)
+        return latest[1] if latest else None
+
+    def export(self, job_id: str, fmt: str) -> str:
+        """
+        Return the path of a job's results in the given format, converting
+        results.jsonl the first time a format is requested.
+
+        Args:
+            job_id: The job ID
+            fmt: One of DOWNLOAD_FORMATS
+
+        Returns:
+            Path to the artifact file
+
+        Raises:
+            ValueError: Unknown format
+            ImportError: The format's library (openpyxl, pyarrow) is missing
+        """
+        if fmt not in DOWNLOAD_FORMATS:
+            raise ValueError(f"Unsupported format: {fmt}")
+        job_dir = self._job_dir(job_id)
+        source = os.path.join(job_dir, 'results.jsonl')
+        if fmt == 'jsonl':
+            return source
+        path = os.path.join(job_dir, f'results.{fmt}')
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source):
+            return path
+
+        # Convert into a temp file, then rename, so concurrent downloads never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            metrics = bool((self.get_job(job_id) or {}).get('metrics'))
+            with open_result_writer(tmp_path, fmt, metrics) as writer:
+                with open(source, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            writer.write(json.loads(line))
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path
+
+    def _job_ids(self) -> List[str]:
+        try:
+            return [name for name in os.listdir(self.directory) if is_valid_job_id(name)]
+        except OSError:
+            return []
+
+    def _dir_usage(self, path: str):
+        """Return (total size, latest modification time) of a job directory's files"""
+        total = 0
+        latest = 0.0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                total += stat.st_size
+                latest = max(latest, stat.st_mtime)
+        return total, latest
+
+    def evict(self, keep: Optional[str] = None):
+        """
+        Delete the oldest jobs until the store fits within max_bytes.
+        Running jobs are only deleted once they are stale.
+
+        Args:
+            keep: A job ID that must not be deleted (e.g. the one just finished)
+        """
+        now = time.time()
+        jobs = []
+        total = 0
+        for job_id in self._job_ids():
+            job_dir = os.path.join(self.directory, job_id)
+            size, mtime = self._dir_usage(job_dir)
+            total += size
+            meta = self.get_job(job_id) or {}
+            running = meta.get('status') == STATUS_RUNNING and now - mtime < STALE_JOB_SECONDS
+            if job_id != keep and not running:
+                jobs.append((meta.get('finished_at') or mtime, size, job_dir))
+        jobs.sort()
+        for _, size, job_dir in jobs:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(job_dir, ignore_errors=True)
+            total -= size
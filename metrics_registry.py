@@ -0,0 +1,203 @@
+"""
+Minimal Prometheus Metrics Registry
+Counters, gauges and histograms with labels, rendered in the Prometheus text
+exposition format (version 0.0.4) for the web app's /metrics endpoint.
+
+Updates take one lock and a dict lookup, so they are cheap enough to leave on
+under load. Values live in this process only; with several web processes,
+each exposes its own.
+"""
+
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if value is None:
+        return 'NaN'
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        if math.isnan(value):
+            return 'NaN'
+        return repr(value)
+    return str(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """
+    Base class: a named metric with fixed label names.
+
+    A callback, when given, is called at render time and returns the value
+    (no labels) or a dict mapping label value tuples to values; use it to
+    expose numbers that are already tracked elsewhere.
+    """
+
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 callback: Optional[Callable] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[Tuple[str, Tuple, float]]:
+        """Return (suffix, label values, value) tuples to render"""
+        if self.callback is not None:
+            value = self.callback()
+            if value is None:
+                return []
+            if isinstance(value, dict):
+                return [('', key if isinstance(key, tuple) else (key,), v) for key, v in value.items() if v is not None]
+            return [('', (), value)]
+        with self._lock:
+            return [('', key, value) for key, value in self._values.items()]
+
+    def render(self) -> str:
+        """Render the HELP/TYPE header and the samples"""
+        lines = [f'# HELP {self.name} {_escape(self.documentation)}', f'# TYPE {self.name} {self.type_name}']
+        for suffix, key, value in self._samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(self._label_names(suffix), key)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+    def _label_names(self, suffix: str) -> Tuple[str, ...]:
+        return self.labelnames
+
+
+class Counter(_Metric):
+    """A value that only goes up"""
+
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        """Add to the counter for the given label values"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that can go up and down"""
+
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels):
+        """Set the gauge for the given label values"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        """Add to the gauge"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        """Subtract from the gauge"""
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, with their sum and count"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        """Record one observation for the given label values"""
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][index] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def _samples(self) -> List[Tuple[str, Tuple, float]]:
+        samples = []
+        with self._lock:
+            states = [(key, dict(state, buckets=list(state['buckets']))) for key, state in self._values.items()]
+        for key, state in states:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['buckets']):
+                cumulative += count
+                samples.append(('_bucket', key + (_format_value(float(bound)),), cumulative))
+            samples.append(('_bucket', key + ('+Inf',), state['count']))
+            samples.append(('_sum', key, state['sum']))
+            samples.append(('_count', key, state['count']))
+        return samples
+
+    def _label_names(self, suffix: str) -> Tuple[str, ...]:
+        return self.labelnames + ('le',) if suffix == '_bucket' else self.labelnames
+
+
+class Registry:
+    """A set of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                callback: Optional[Callable] = None) -> Counter:
+        """Create and register a Counter"""
+        return self._register(Counter(name, documentation, labelnames, callback))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+              callback: Optional[Callable] = None) -> Gauge:
+        """Create and register a Gauge"""
+        return self._register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """Create and register a Histogram"""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text format.
+
+        Returns:
+            The exposition text (serve it with CONTENT_TYPE)
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
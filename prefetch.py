@@ -0,0 +1,137 @@
+"""
+Bulk Page Count Prefetch
+Resolves page counts for many identifiers per request through archive.org's
+advancedsearch API (the `imagecount` field), before the per-identifier
+fallback chain runs. Identifiers resolved here skip the details page,
+page_numbers.json, scandata and metadata fetches entirely; only the rest are
+scraped one by one.
+"""
+
+import json
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlencode
+
+import http_client
+from retry_policy import KIND_SEARCH
+
+DEFAULT_PREFETCH_BATCH_SIZE = 100  # Identifiers per search request
+MAX_PREFETCH_BATCH_SIZE = 500  # Keeps the query string within archive.org's URL limits
+SEARCH_FIELD = 'imagecount'  # Number of page images in the item
+
+# Identifiers that can be quoted safely in a search query; others are left to the fallback chain
+SEARCHABLE_IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+
+def search_url(identifiers: List[str]) -> str:
+    """
+    Build the advancedsearch URL that returns imagecount for a batch of identifiers.
+
+    Args:
+        identifiers: Identifiers to look up (all must match SEARCHABLE_IDENTIFIER_PATTERN)
+
+    Returns:
+        The search URL
+    """
+    query = 'identifier:(' + ' OR '.join(f'"{identifier}"' for identifier in identifiers) + ')'
+    params = [
+        ('q', query),
+        ('fl[]', 'identifier'),
+        ('fl[]', SEARCH_FIELD),
+        ('rows', len(identifiers)),
+        ('page', 1),
+        ('output', 'json'),
+    ]
+    return http_client.archive_url('advancedsearch.php') + '?' + urlencode(params)
+
+
+def _page_count(value) -> Optional[int]:
+    """Return a positive page count from a search field value (number, string or list)"""
+    if isinstance(value, list):
+        value = value[0] if value else None
+    try:
+        count = int(value)
+    except (TypeError, ValueError):
+        return None
+    return count if count > 0 else None
+
+
+def parse_search_response(text: str) -> Dict[str, int]:
+    """
+    Extract page counts from an advancedsearch JSON response.
+
+    Args:
+        text: The response body
+
+    Returns:
+        Dictionary mapping identifier to page count (items without one are left out)
+    """
+    counts = {}
+    docs = json.loads(text).get('response', {}).get('docs', [])
+    for doc in docs:
+        identifier = doc.get('identifier')
+        count = _page_count(doc.get(SEARCH_FIELD))
+        if identifier and count:
+            counts[identifier] = count
+    return counts
+
+
+def _batches(identifiers: Iterable[str], batch_size: int) -> Iterator[List[str]]:
+    batch = []
+    for identifier in identifiers:
+        if SEARCHABLE_IDENTIFIER_PATTERN.match(identifier):
+            batch.append(identifier)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+class PrefetchStats:
+    """Counters for one prefetch run"""
+
+    def __init__(self):
+        self.requests = 0
+        self.failed_requests = 0
+        self.identifiers = 0
+        self.resolved = 0
+
+
+def prefetch_page_counts(identifiers: Iterable[str], batch_size: int = DEFAULT_PREFETCH_BATCH_SIZE,
+                         limiter=None, stats: Optional[PrefetchStats] = None) -> Dict[str, int]:
+    """
+    Look up page counts for many identifiers with a few bulk search requests.
+
+    A failed search request is not fatal: its identifiers are simply left
+    unresolved and go through the per-identifier fallback chain.
+
+    Args:
+        identifiers: Identifiers to look up
+        batch_size: Identifiers per search request (at most MAX_PREFETCH_BATCH_SIZE)
+        limiter: Global rate limiter; each search request (and retry) takes one token
+        stats: Optional PrefetchStats to update
+
+    Returns:
+        Dictionary mapping identifier to page count, for the identifiers resolved
+    """
+    batch_size = max(1, min(batch_size, MAX_PREFETCH_BATCH_SIZE))
+    stats = stats or PrefetchStats()
+    counts = {}
+    for batch in _batches(identifiers, batch_size):
+        wanted = set(batch)
+        stats.identifiers += len(batch)
+        try:
+            stats.requests += 1
+            response = http_client.get(search_url(batch), kind=KIND_SEARCH, limiter=limiter)
+            response.raise_for_status()
+            found = parse_search_response(response.text)
+        except Exception as e:
+            stats.failed_requests += 1
+            print(f"Warning: Bulk search for {len(batch)} identifier(s) failed, scraping them individually: {e}")
+            continue
+        for identifier, count in found.items():
+            if identifier in wanted:
+                counts[identifier] = count
+    stats.resolved += len(counts)
+    return counts
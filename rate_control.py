@@ -0,0 +1,193 @@
+"""
+Adaptive Rate Control
+An AIMD (additive-increase, multiplicative-decrease) rate limiter that speeds
+up while archive.org answers quickly and successfully, and backs off on
+throttling (429/503), gateway errors, timeouts and rising latency, honoring
+Retry-After.
+"""
+
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from batch import RateLimiter
+
+# Response codes that mean archive.org wants us to slow down
+THROTTLE_STATUS_CODES = (429, 502, 503, 504)
+
+MIN_RATE = 0.05  # Never slow down below one request every 20 seconds
+RATE_INCREASE = 0.02  # Requests/second added per healthy response
+DECREASE_FACTOR = 0.5  # Rate and concurrency multiplier on throttling or timeouts
+LATENCY_DECREASE_FACTOR = 0.8  # Gentler multiplier when responses only get slow
+DECREASE_COOLDOWN_SECONDS = 2.0  # At most one decrease per cooldown (one burst of errors = one signal)
+HEALTHY_RESPONSES_PER_SLOT = 4  # Healthy responses per in-flight slot before concurrency grows by one
+DEFAULT_LATENCY_TARGET = 3.0  # Seconds; a smoothed response time above this counts as congestion
+LATENCY_SMOOTHING = 0.2  # Weight of the newest sample in the latency moving average
+MAX_RETRY_AFTER_SECONDS = 300  # Cap on how long a Retry-After header may pause us
+SLOT_WAIT_SECONDS = 0.05  # Poll interval while all concurrency slots are taken
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header (delay in seconds or an HTTP date).
+
+    Args:
+        value: The header value
+
+    Returns:
+        Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    Token bucket whose rate and concurrency limit adapt to archive.org's responses.
+
+    Used like RateLimiter: every request takes a token, and every identifier
+    holds a concurrency slot (acquire_slot() before it, release() after),
+    plus it must receive response signals: register it with
+    http_client.set_response_observer() so every fetch reports to observe()
+    or observe_failure().
+    """
+
+    def __init__(self, rate: float, max_rate: float, max_concurrency: int,
+                 concurrency: Optional[int] = None, min_rate: float = MIN_RATE,
+                 latency_target: float = DEFAULT_LATENCY_TARGET):
+        super().__init__(rate)
+        self.min_rate = min(min_rate, rate)
+        self.max_rate = max(max_rate, rate)
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency_limit = max(1, min(concurrency or self.max_concurrency, self.max_concurrency))
+        self.latency_target = latency_target
+        self.latency = None  # Smoothed response time (seconds)
+        self.backoffs = 0  # Number of multiplicative decreases so far
+        self.throttled = 0  # Number of throttling responses/timeouts seen
+        self._active = 0
+        self._healthy = 0
+        self._last_decrease = 0.0
+        self._paused_until = 0.0
+
+    @classmethod
+    def from_delay(cls, delay: float, min_delay: float, max_concurrency: int,
+                   concurrency: Optional[int] = None) -> 'AdaptiveRateLimiter':
+        """
+        Build a limiter that starts at one request every `delay` seconds and
+        may speed up to one every `min_delay` seconds.
+
+        Args:
+            delay: Starting delay between requests
+            min_delay: Shortest delay the limiter may reach
+            max_concurrency: Most identifiers allowed in flight
+            concurrency: Starting concurrency limit (defaults to max_concurrency)
+        """
+        return cls(1.0 / delay, 1.0 / min_delay, max_concurrency, concurrency)
+
+    def try_acquire(self) -> float:
+        """
+        Take a request token if one is available and no Retry-After pause is on.
+
+        Returns:
+            0 on success, otherwise the seconds to wait before retrying
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            return self._take_token(now)
+
+    def try_acquire_slot(self) -> float:
+        """
+        Take a concurrency slot for one identifier if one is free.
+
+        Returns:
+            0 on success, otherwise the seconds to wait before retrying
+        """
+        with self._lock:
+            if self._active >= self.concurrency_limit:
+                return SLOT_WAIT_SECONDS
+            self._active += 1
+            return 0
+
+    def release(self):
+        """Free the concurrency slot taken by acquire_slot()"""
+        with self._lock:
+            self._active = max(0, self._active - 1)
+
+    def observe(self, status_code: int, latency: float, headers=None):
+        """
+        Record one archive.org response.
+
+        Args:
+            status_code: HTTP status code
+            latency: Seconds until the response headers arrived
+            headers: Response headers (for Retry-After)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if status_code in THROTTLE_STATUS_CODES:
+                self.throttled += 1
+                retry_after = parse_retry_after(headers.get('Retry-After')) if headers is not None else None
+                self._decrease(now, DECREASE_FACTOR, retry_after)
+                return
+
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+            if self.latency > self.latency_target:
+                self._decrease(now, LATENCY_DECREASE_FACTOR)
+                return
+
+            # Additive increase of the rate, and of concurrency once per window of healthy responses
+            self.rate = min(self.max_rate, self.rate + RATE_INCREASE)
+            self._healthy += 1
+            if self._healthy >= self.concurrency_limit * HEALTHY_RESPONSES_PER_SLOT:
+                self._healthy = 0
+                self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1)
+
+    def observe_failure(self):
+        """Record a timeout or connection error"""
+        with self._lock:
+            self.throttled += 1
+            self._decrease(time.monotonic(), DECREASE_FACTOR)
+
+    def _decrease(self, now: float, factor: float, retry_after: Optional[float] = None):
+        """Multiplicative decrease (call with the lock held)"""
+        if retry_after is not None:
+            self._paused_until = max(self._paused_until, now + min(retry_after, MAX_RETRY_AFTER_SECONDS))
+        self._healthy = 0
+        if now - self._last_decrease < DECREASE_COOLDOWN_SECONDS:
+            return
+        self._last_decrease = now
+        self.backoffs += 1
+        self.rate = max(self.min_rate, self.rate * factor)
+        self.concurrency_limit = max(1, int(self.concurrency_limit * factor))
+        self._tokens = min(self._tokens, 0.0)  # No burst right after backing off
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Return the controller's current state, for progress output and metrics.
+
+        Returns:
+            Dict with rate (requests/second), concurrency_limit, active,
+            latency (smoothed seconds), backoffs, throttled and paused_for (seconds)
+        """
+        with self._lock:
+            return {
+                'rate': round(self.rate, 3),
+                'concurrency_limit': self.concurrency_limit,
+                'active': self._active,
+                'latency': round(self.latency, 3) if self.latency is not None else None,
+                'backoffs': self.backoffs,
+                'throttled': self.throttled,
+                'paused_for': round(max(0.0, self._paused_until - time.monotonic()), 3),
+            }
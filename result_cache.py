@@ -0,0 +1,168 @@
+"""
+Persistent Result Cache
+Stores the final result dictionary for each identifier in a local SQLite file,
+so overlapping runs don't refetch everything from archive.org.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict
+
+DEFAULT_CACHE_FILE = os.getenv('SCRAPER_CACHE_FILE', '.page_number_cache.sqlite3')
+
+# Time-to-live per result status (seconds)
+SUCCESS_TTL_SECONDS = 30 * 24 * 3600  # Page counts of existing items rarely change
+NOT_FOUND_TTL_SECONDS = 24 * 3600  # Items may be published later
+FAILURE_TTL_SECONDS = 3600  # Extraction failures are often transient
+RETRYABLE_TTL_SECONDS = 0  # Known-transient failures (timeouts, 429/5xx) are not cached
+
+DEFAULT_MAX_ENTRIES = 500000  # Least recently used entries are evicted beyond this
+EVICTION_INTERVAL = 1000  # Check the size bound every N writes
+
+STATUS_SUCCESS = 'success'
+STATUS_NOT_FOUND = 'not_found'
+STATUS_FAILURE = 'failure'
+STATUS_RETRYABLE = 'retryable'
+
+
+def result_status(result: Dict) -> str:
+    """
+    Classify a result dictionary for TTL purposes.
+
+    Args:
+        result: A result dictionary from scrape_page_number
+
+    Returns:
+        One of STATUS_SUCCESS, STATUS_NOT_FOUND, STATUS_RETRYABLE or STATUS_FAILURE
+    """
+    if result.get('success'):
+        return STATUS_SUCCESS
+    if result.get('retryable'):
+        return STATUS_RETRYABLE
+    if (result.get('error') or '').startswith('Identifier not found (404)'):
+        return STATUS_NOT_FOUND
+    return STATUS_FAILURE
+
+
+class ResultCache:
+    """
+    SQLite-backed cache of scrape results keyed by identifier.
+
+    Entries expire after a TTL that depends on their status, and the least
+    recently used entries are evicted once max_entries is exceeded. A single
+    connection is shared by all worker threads behind a lock.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_FILE,
+                 success_ttl: float = SUCCESS_TTL_SECONDS,
+                 not_found_ttl: float = NOT_FOUND_TTL_SECONDS,
+                 failure_ttl: float = FAILURE_TTL_SECONDS,
+                 retryable_ttl: float = RETRYABLE_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttls = {
+            STATUS_SUCCESS: success_ttl,
+            STATUS_NOT_FOUND: not_found_ttl,
+            STATUS_FAILURE: failure_ttl,
+            STATUS_RETRYABLE: retryable_ttl,
+        }
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                ' identifier TEXT PRIMARY KEY,'
+                ' result TEXT NOT NULL,'
+                ' method TEXT,'
+                ' status TEXT NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' expires_at REAL NOT NULL,'
+                ' accessed_at REAL NOT NULL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_results_accessed ON results (accessed_at)')
+            self._conn.commit()
+        self.evict()
+
+    def get(self, identifier: str) -> Optional[Dict]:
+        """
+        Look up a cached result.
+
+        Args:
+            identifier: The identifier ID
+
+        Returns:
+            The cached result dictionary, or None if missing or expired
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT result FROM results WHERE identifier = ? AND expires_at > ?',
+                (identifier, now)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE results SET accessed_at = ? WHERE identifier = ?', (now, identifier))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def contains(self, identifier: str) -> bool:
+        """Return True if an unexpired result is cached (without counting a hit)"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM results WHERE identifier = ? AND expires_at > ?',
+                (identifier, time.time())
+            ).fetchone()
+        return row is not None
+
+    def put(self, result: Dict):
+        """
+        Store a result, replacing any previous entry for its identifier.
+        Results whose status has a TTL of 0 are not stored (any older entry is kept).
+
+        Args:
+            result: A result dictionary from scrape_page_number
+        """
+        status = result_status(result)
+        now = time.time()
+        if self.ttls[status] <= 0:
+            return
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO results (identifier, result, method, status, created_at, expires_at, accessed_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (result['identifier'], json.dumps(result, ensure_ascii=False), result.get('method'),
+                 status, now, now + self.ttls[status], now)
+            )
+            self._conn.commit()
+            self._writes += 1
+            check_size = self._writes % EVICTION_INTERVAL == 0
+        if check_size:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones beyond max_entries"""
+        with self._lock:
+            self._conn.execute('DELETE FROM results WHERE expires_at <= ?', (time.time(),))
+            count = self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    'DELETE FROM results WHERE identifier IN '
+                    '(SELECT identifier FROM results ORDER BY accessed_at LIMIT ?)',
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,302 @@
+"""
+Streaming Result Writers
+Write scraping results row by row as they complete (Excel, CSV, JSON Lines,
+Parquet), so memory stays flat on very large runs.
+"""
+
+import csv
+import json
+import os
+from typing import Dict, List, Optional
+
+EXCEL_COLUMNS = ['Identifier', 'URL', 'Page Number', 'Status', 'Error', 'Retryable']
+# Extra columns for instrumented runs (result['metrics'], see instrumentation.py)
+METRIC_COLUMNS = ['Method', 'Methods Tried', 'Requests', 'Bytes', 'Network ms', 'Parse ms', 'Total ms',
+                  'Revalidated', 'Cache']
+MAX_COLUMN_WIDTH = 50  # Excel column width cap (characters)
+PARQUET_BATCH_ROWS = 10000  # Rows buffered per Parquet row group
+PARTIAL_SUFFIX = '.partial.jsonl'  # Readable mid-run copy of an Excel output, until the workbook is saved
+
+# Output formats selected by file extension
+FORMAT_EXTENSIONS = {
+    '.xlsx': 'xlsx',
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.json': 'json',
+    '.parquet': 'parquet',
+}
+
+
+def result_columns(metrics: bool = False) -> List[str]:
+    """Return the spreadsheet columns, with METRIC_COLUMNS when metrics are included"""
+    return EXCEL_COLUMNS + METRIC_COLUMNS if metrics else EXCEL_COLUMNS
+
+
+def result_to_row(result: Dict, metrics: bool = False) -> List:
+    """
+    Convert a result dictionary to a spreadsheet row (see result_columns).
+
+    Args:
+        result: A result dictionary from scrape_page_number
+        metrics: Append the METRIC_COLUMNS values (blank when the result has no metrics)
+
+    Returns:
+        List of cell values
+    """
+    row = [
+        result['identifier'],
+        result['url'],
+        result['page_number'] if result['page_number'] else 'N/A',
+        'Success' if result['success'] else 'Failed',
+        (result.get('error') or '') if not result['success'] else '',
+        'Yes' if result.get('retryable') else ''
+    ]
+    if metrics:
+        counters = result.get('metrics') or {}
+        row += [
+            result.get('method') or '',
+            ' > '.join(counters.get('methods_tried') or []),
+            counters.get('requests', ''),
+            counters.get('bytes', ''),
+            counters.get('network_ms', ''),
+            counters.get('parse_ms', ''),
+            counters.get('total_ms', ''),
+            counters.get('revalidated', ''),
+            counters.get('cache') or '',
+        ]
+    return row
+
+
+class ResultWriter:
+    """
+    Base class for streaming writers; use as a context manager or call close().
+    With metrics=True, tabular formats add the per-identifier instrumentation
+    columns (JSON formats always keep the full result, metrics included).
+    """
+
+    def __init__(self, path: str, metrics: bool = False):
+        self.path = path
+        self.metrics = metrics
+        self.columns = result_columns(metrics)
+        self.rows_written = 0
+
+    def write(self, result: Dict):
+        """Write one result"""
+        self._write(result)
+        self.rows_written += 1
+
+    def _write(self, result: Dict):
+        raise NotImplementedError
+
+    def close(self):
+        """Finish the output file"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CsvResultWriter(ResultWriter):
+    """CSV with the Excel columns; each row is flushed so the file is usable mid-run"""
+
+    def __init__(self, path: str, metrics: bool = False):
+        super().__init__(path, metrics)
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.columns)
+
+    def _write(self, result: Dict):
+        self._writer.writerow(result_to_row(result, self.metrics))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlResultWriter(ResultWriter):
+    """One full result dictionary per line; each line is flushed so the file is usable mid-run"""
+
+    def __init__(self, path: str, metrics: bool = False):
+        super().__init__(path, metrics)
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def _write(self, result: Dict):
+        self._file.write(json.dumps(result, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class JsonResultWriter(ResultWriter):
+    """A JSON array of result dictionaries, written incrementally (used as the Excel fallback)"""
+
+    def __init__(self, path: str, metrics: bool = False):
+        super().__init__(path, metrics)
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write('[')
+
+    def _write(self, result: Dict):
+        separator = ',\n  ' if self.rows_written else '\n  '
+        self._file.write(separator + json.dumps(result, ensure_ascii=False))
+
+    def close(self):
+        self._file.write('\n]\n' if self.rows_written else ']\n')
+        self._file.close()
+
+
+class XlsxResultWriter(ResultWriter):
+    """
+    Excel output built with openpyxl's write-only mode.
+
+    An .xlsx file is a ZIP archive that can only be written once all rows are
+    known (write-only worksheets also need column widths before the first
+    row), so the workbook itself only appears on close. Until then results
+    are spooled, one flushed JSON line each, to partial_path next to the
+    output ("results.xlsx.partial.jsonl"), which can be read mid-run and is
+    deleted once the workbook is saved. Memory use does not grow with the
+    number of rows. If saving fails, the spooled results can still be
+    exported with export_json().
+    """
+
+    def __init__(self, path: str, metrics: bool = False):
+        super().__init__(path, metrics)
+        from openpyxl import Workbook  # Fail early if openpyxl is missing
+        self._workbook_class = Workbook
+        self._widths = [len(column) for column in self.columns]
+        self.partial_path = path + PARTIAL_SUFFIX
+        self._spool = open(self.partial_path, 'w+', encoding='utf-8')
+
+    def _write(self, result: Dict):
+        for idx, value in enumerate(result_to_row(result, self.metrics)):
+            self._widths[idx] = max(self._widths[idx], len(str(value)))
+        self._spool.write(json.dumps(result, ensure_ascii=False) + '\n')
+        self._spool.flush()
+
+    def _spooled_results(self):
+        self._spool.seek(0)
+        for line in self._spool:
+            yield json.loads(line)
+
+    def close(self):
+        from openpyxl.utils import get_column_letter
+        workbook = self._workbook_class(write_only=True)
+        worksheet = workbook.create_sheet('Results')
+        for idx, width in enumerate(self._widths, 1):
+            worksheet.column_dimensions[get_column_letter(idx)].width = min(width + 2, MAX_COLUMN_WIDTH)
+        worksheet.append(self.columns)
+        for result in self._spooled_results():
+            worksheet.append(result_to_row(result, self.metrics))
+        workbook.save(self.path)
+        self._discard_spool()
+
+    def _discard_spool(self):
+        self._spool.close()
+        os.remove(self.partial_path)
+
+    def export_json(self, path: str):
+        """
+        Write the spooled results to a JSON file instead (fallback when the
+        workbook could not be saved).
+
+        Args:
+            path: JSON output file path
+        """
+        with JsonResultWriter(path, self.metrics) as writer:
+            for result in self._spooled_results():
+                writer.write(result)
+        self._discard_spool()
+
+
+class ParquetResultWriter(ResultWriter):
+    """
+    Parquet output with typed columns, written one row group at a time.
+    Instrumentation counters become top-level columns (requests, bytes, ...).
+    Requires the optional pyarrow package.
+    """
+
+    def __init__(self, path: str, metrics: bool = False):
+        super().__init__(path, metrics)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        fields = [
+            ('identifier', pa.string()),
+            ('url', pa.string()),
+            ('page_number', pa.int64()),
+            ('method', pa.string()),
+            ('success', pa.bool_()),
+            ('error', pa.string()),
+            ('retryable', pa.bool_()),
+        ]
+        self._metric_fields = [
+            ('methods_tried', pa.list_(pa.string())),
+            ('requests', pa.int64()),
+            ('bytes', pa.int64()),
+            ('network_ms', pa.float64()),
+            ('parse_ms', pa.float64()),
+            ('total_ms', pa.float64()),
+            ('revalidated', pa.int64()),
+            ('cache', pa.string()),
+        ] if metrics else []
+        self._schema = pa.schema(fields + self._metric_fields)
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._buffer = []
+
+    def _write(self, result: Dict):
+        row = {name: result.get(name) for name in self._schema.names}
+        counters = result.get('metrics') or {}
+        for name, _ in self._metric_fields:
+            row[name] = counters.get(name)
+        self._buffer.append(row)
+        if len(self._buffer) >= PARQUET_BATCH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._writer.write_table(self._pa.Table.from_pylist(self._buffer, schema=self._schema))
+            self._buffer = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+WRITERS = {
+    'xlsx': XlsxResultWriter,
+    'csv': CsvResultWriter,
+    'jsonl': JsonlResultWriter,
+    'json': JsonResultWriter,
+    'parquet': ParquetResultWriter,
+}
+
+
+def output_format(path: str) -> str:
+    """
+    Pick the output format from a file extension.
+    Unknown extensions fall back to Excel, as save_results always has.
+
+    Args:
+        path: Output file path
+
+    Returns:
+        Format name (xlsx, csv, jsonl, json or parquet)
+    """
+    return FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'xlsx')
+
+
+def open_result_writer(path: str, fmt: Optional[str] = None, metrics: bool = False) -> ResultWriter:
+    """
+    Open a streaming writer for the given output file.
+
+    Args:
+        path: Output file path
+        fmt: Output format (defaults to the one implied by the extension)
+        metrics: Include the per-identifier instrumentation columns
+
+    Returns:
+        A ResultWriter instance
+    """
+    return WRITERS[fmt or output_format(path)](path, metrics)
@@ -0,0 +1,110 @@
+"""
+Retry and Timeout Policy
+One configurable policy for every archive.org fetch: separate connect/read
+timeouts per kind of request, jittered exponential backoff for retrying
+idempotent GETs, and an overall deadline per identifier.
+"""
+
+import random
+import time
+from typing import Dict, Optional, Tuple
+
+DEFAULT_CONNECT_TIMEOUT = 5.0  # Seconds to establish a connection
+DEFAULT_READ_TIMEOUT = 10.0  # Seconds to wait for data on an open connection
+DEFAULT_MAX_ATTEMPTS = 3  # Tries per request (1 = no retries)
+DEFAULT_BACKOFF_BASE = 0.5  # First retry waits up to this many seconds
+DEFAULT_BACKOFF_MAX = 8.0  # Upper bound for a single backoff
+DEFAULT_DEADLINE = 60.0  # Seconds allowed for one identifier, across all its requests
+
+# Status codes worth retrying (rate limiting and transient server errors)
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Request kinds, for per-strategy timeouts
+KIND_DETAILS = 'details'
+KIND_METADATA = 'metadata'
+KIND_PAGE_NUMBERS_JSON = 'page_numbers_json'
+KIND_SCANDATA = 'scandata'
+KIND_SEARCH = 'search'
+
+# Secondary strategies get shorter read timeouts so one slow candidate file
+# can't use up the identifier's whole deadline
+DEFAULT_KIND_TIMEOUTS = {
+    KIND_PAGE_NUMBERS_JSON: (DEFAULT_CONNECT_TIMEOUT, 5.0),
+    KIND_SCANDATA: (DEFAULT_CONNECT_TIMEOUT, 5.0),
+}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when an identifier's overall deadline has passed"""
+
+
+class RetryPolicy:
+    """
+    Timeouts, retries and deadline for archive.org GET requests.
+
+    Args:
+        connect_timeout: Default connect timeout in seconds
+        read_timeout: Default read timeout in seconds
+        kind_timeouts: Per-kind (connect, read) overrides, e.g. {'scandata': (5, 5)}
+        max_attempts: Tries per request, including the first
+        backoff_base: Backoff scale; attempt n waits up to base * 2**n seconds
+        backoff_max: Maximum single backoff in seconds
+        deadline: Seconds allowed per identifier (None for no deadline)
+        retry_statuses: Status codes that are retried
+    """
+
+    def __init__(self, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 kind_timeouts: Optional[Dict[str, Tuple[float, float]]] = None,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 backoff_base: float = DEFAULT_BACKOFF_BASE,
+                 backoff_max: float = DEFAULT_BACKOFF_MAX,
+                 deadline: Optional[float] = DEFAULT_DEADLINE,
+                 retry_statuses: Tuple[int, ...] = RETRYABLE_STATUS_CODES):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.kind_timeouts = dict(DEFAULT_KIND_TIMEOUTS if kind_timeouts is None else kind_timeouts)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.retry_statuses = tuple(retry_statuses)
+
+    def timeout(self, kind: Optional[str] = None) -> Tuple[float, float]:
+        """Return the (connect, read) timeout for a kind of request"""
+        return self.kind_timeouts.get(kind, (self.connect_timeout, self.read_timeout))
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Return a jittered delay before retry number `attempt` (0-based).
+        Uses "full jitter": a random delay up to the exponential bound, so
+        workers that failed together don't retry together.
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def start_deadline(self) -> Optional[float]:
+        """Return the monotonic deadline for an identifier starting now (None if unlimited)"""
+        return time.monotonic() + self.deadline if self.deadline else None
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """
+    Return the seconds left before a deadline.
+
+    Raises:
+        DeadlineExceeded: If the deadline has already passed
+    """
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("Deadline exceeded for this identifier")
+    return left
+
+
+def clamp_timeout(timeout: Tuple[float, float], deadline: Optional[float]) -> Tuple[float, float]:
+    """Shorten a (connect, read) timeout so it doesn't run past the deadline"""
+    left = remaining(deadline)
+    if left is None:
+        return timeout
+    return min(timeout[0], left), min(timeout[1], left)
@@ -3,21 +3,97 @@ Archive.org Page Number Scraper
 Scrapes page numbers from archive.org book pages using the identifier ID.
 """
 
-import requests
-from bs4 import BeautifulSoup
 import re
+import io
+import os
+import html
+import tempfile
+import zipfile
+from xml.etree import ElementTree
 import sys
 import json
-import time
-from typing import Optional, List, Dict
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Tuple, Iterable, Generator, Any
 import argparse
-import pandas as pd
+import functools
 from datetime import datetime
 
+import http_client
+from item_context import ItemContext
+from result_cache import ResultCache, DEFAULT_CACHE_FILE
+from http_cache import ValidatorStore
+from checkpoint import CheckpointWriter, load_checkpoint
+from batch import RateLimiter, scrape_batch, DEFAULT_WORKERS, MAX_WORKERS
+from rate_control import AdaptiveRateLimiter
+from strategy_stats import StrategyStats
+from instrumentation import ItemMetrics, MetricsSummary, empty_metrics, parsing, CACHE_HIT, CACHE_MISS
+from identifiers import RequestPlan, plan_identifier, plan_batch, iter_plans
+from ingest import iter_identifiers, unique
+from prefetch import prefetch_page_counts, PrefetchStats, DEFAULT_PREFETCH_BATCH_SIZE
+from sharding import FileRateLimiter, parse_shard, shard_of, select_shard, shard_path, merge_shards, run_shard_processes
+from retry_policy import (
+    RetryPolicy,
+    DeadlineExceeded,
+    KIND_SCANDATA,
+    KIND_PAGE_NUMBERS_JSON,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    DEFAULT_MAX_ATTEMPTS,
+    DEFAULT_DEADLINE,
+)
+from result_writers import ResultWriter, XlsxResultWriter, open_result_writer, output_format
+
 # Rate limiting configuration
 DEFAULT_DELAY_SECONDS = 1.5  # Default delay between requests (1.5 seconds)
 MIN_DELAY_SECONDS = 0.5  # Minimum delay to prevent too aggressive scraping
 
+# Directory for stored responses used by conditional (304) revalidation
+DEFAULT_HTTP_CACHE_DIR = '.http_cache'
+
+# Larger runs skip the per-identifier listing in the summary (see the output file)
+SUMMARY_LIST_LIMIT = 100
+
+# With --adaptive, print the controller's current rate every N identifiers
+ADAPTIVE_REPORT_INTERVAL = 25
+
+# Names of the extraction methods, recorded in each result as 'method'
+METHOD_HTML = 'html'
+METHOD_PAGE_NUMBERS_JSON = 'page_numbers_json'
+METHOD_SCANDATA = 'scandata'
+METHOD_METADATA = 'metadata'
+METHOD_PAGE_FILES = 'page_files'
+METHOD_IMAGECOUNT = 'imagecount'  # Resolved by the bulk search prefetch
+
+# Methods that need their own requests, in their default order. The HTML
+# method always runs first (it only reuses the details page); these may be
+# reordered per identifier family by StrategyStats.
+FALLBACK_METHODS = (METHOD_PAGE_NUMBERS_JSON, METHOD_SCANDATA, METHOD_METADATA)
+
+# Default file for --strategy-stats
+DEFAULT_STRATEGY_STATS_FILE = 'strategy_stats.json'
+
+# Streaming scandata parsing: read size per chunk, and how much of a
+# scandata ZIP is kept in memory before spilling to a temporary file
+SCANDATA_CHUNK_SIZE = 64 * 1024
+ZIP_SPOOL_MAX_BYTES = 1024 * 1024
+
+# Precompiled patterns, run over raw text before any HTML parsing
+PAGE_SLASH_PATTERN = re.compile(r'\((\d+)/(\d+)\)')  # "(1/268)"
+PAGE_OF_PATTERN = re.compile(r'\((\d+)\s+of\s+(\d+)\)', re.IGNORECASE)  # "(1 of 268)"
+PAGE_FILE_PATTERN = re.compile(r'page[_-]?(\d+)', re.IGNORECASE)  # "page_001.jpg"
+CURRENT_PAGE_CLASS_PATTERN = re.compile('BRcurrentpage')
+PAGE_NUMBERS_JSON_LINK_PATTERN = re.compile(
+    r'<a\b[^>]*?\shref\s*=\s*(?:"([^"]*page_numbers\.json[^"]*)"|\'([^\']*page_numbers\.json[^\']*)\')',
+    re.IGNORECASE
+)
+
+# Threads used to race page_numbers.json URL candidates against each other
+CANDIDATE_WORKERS = 16
+
+_candidate_executor = None
+_candidate_executor_lock = threading.Lock()
+
 
 def construct_url(identifier: str) -> str:
     """
@@ -30,467 +106,1163 @@ def construct_url(identifier: str) -> str:
         The full URL to the archive.org details page
     """
     # Use identifier as-is (it may already include .emory.edu or be plain text/numeric)
-    return f"https://archive.org/details/{identifier}"
+    return http_client.archive_url(f"details/{identifier}")
 
 
-def get_page_number_from_scandata(identifier: str) -> Optional[int]:
+class LeafCountParser:
     """
-    Try to get page number from archive.org's scandata.xml file.
-    This file contains leafCount which is the total number of pages.
+    Incremental scandata XML parser that stops at the first <leafCount>.
+    
+    Feed it chunks as they arrive; elements are discarded as soon as they
+    are parsed, so memory stays constant however large the file is.
+    """
+    
+    def __init__(self):
+        self._parser = ElementTree.XMLPullParser(events=('start', 'end'))
+        self._open_elements = []
+        self.leaf_count = None
+        self.done = False
+    
+    def feed(self, chunk) -> bool:
+        """
+        Parse the next chunk of XML.
+        
+        Args:
+            chunk: The next piece of the document (bytes or text)
+        
+        Returns:
+            True once parsing is finished (leafCount found or the XML is invalid)
+        """
+        if self.done:
+            return True
+        try:
+            self._parser.feed(chunk)
+            for event, element in self._parser.read_events():
+                if event == 'start':
+                    self._open_elements.append(element)
+                    continue
+                self._open_elements.pop()
+                # Ignore any XML namespace, e.g. "{ns}leafCount"
+                if element.tag.rsplit('}', 1)[-1] == 'leafCount':
+                    self.done = True
+                    if len(element) == 0 and element.text:
+                        try:
+                            self.leaf_count = int(element.text.strip())
+                        except ValueError:
+                            pass
+                    break
+                # Detach finished elements so the tree never grows (events are
+                # processed in order, so every child parsed so far is done with)
+                if self._open_elements:
+                    del self._open_elements[-1][:]
+        except ElementTree.ParseError:
+            self.done = True
+        return self.done
+
+
+def stream_leaf_count(chunks: Iterable) -> Optional[int]:
+    """
+    Extract the leafCount from scandata XML delivered in chunks, stopping
+    as soon as it is found.
+    
+    Args:
+        chunks: Iterable of XML chunks (bytes or text)
+    
+    Returns:
+        The leaf count if found, None otherwise
+    """
+    parser = LeafCountParser()
+    for chunk in chunks:
+        if parser.feed(chunk):
+            break
+    return parser.leaf_count
+
+
+def parse_leaf_count(xml_content) -> Optional[int]:
+    """
+    Extract the leafCount (total number of pages) from scandata XML.
+    
+    Args:
+        xml_content: The scandata XML as text or bytes
+    
+    Returns:
+        The leaf count if found, None otherwise
+    """
+    chunks = (xml_content[i:i + SCANDATA_CHUNK_SIZE] for i in range(0, len(xml_content), SCANDATA_CHUNK_SIZE))
+    return stream_leaf_count(chunks)
+
+
+def scandata_zip_leaf_count(zip_source) -> Optional[int]:
+    """
+    Extract the leafCount from a scandata ZIP archive, streaming the
+    scandata.xml member through the incremental parser.
+    
+    Args:
+        zip_source: A seekable file object holding the ZIP archive
+    
+    Returns:
+        The leaf count if found, None otherwise
+    """
+    with zipfile.ZipFile(zip_source) as zip_file:
+        # Look for scandata.xml in the ZIP
+        xml_files = [f for f in zip_file.namelist() if f.endswith('scandata.xml')]
+        if not xml_files:
+            return None
+        with zip_file.open(xml_files[0]) as member:
+            return stream_leaf_count(iter(lambda: member.read(SCANDATA_CHUNK_SIZE), b''))
+
+
+def parse_scandata_zip(content: bytes) -> Optional[int]:
+    """
+    Extract the leafCount from a scandata ZIP archive.
+    
+    Args:
+        content: The raw ZIP file bytes
+    
+    Returns:
+        The leaf count if found, None otherwise
+    """
+    return scandata_zip_leaf_count(io.BytesIO(content))
+
+
+def spool_chunks(chunks: Iterable[bytes]):
+    """
+    Copy downloaded chunks into a temporary file that stays in memory up to
+    ZIP_SPOOL_MAX_BYTES and spills to disk beyond that.
+    
+    Args:
+        chunks: Iterable of body chunks
+    
+    Returns:
+        The spooled file, rewound to the start
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_BYTES)
+    for chunk in chunks:
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def stream_scandata_response(response, is_zip: bool) -> Optional[int]:
+    """
+    Extract the leafCount from a streamed scandata response.
+    XML is parsed as it downloads and the connection is closed once leafCount
+    is found; ZIPs are spooled (bounded memory) and their member streamed.
+    
+    Args:
+        response: A streamed requests Response
+        is_zip: Whether the file is a scandata ZIP
+    
+    Returns:
+        The leaf count if found, None otherwise
+    """
+    try:
+        if is_zip:
+            with spool_chunks(response.iter_content(SCANDATA_CHUNK_SIZE)) as spool:
+                return scandata_zip_leaf_count(spool)
+        return stream_leaf_count(response.iter_content(SCANDATA_CHUNK_SIZE))
+    finally:
+        response.close()
+
+
+def find_scandata_files(files: List[Dict]) -> List[str]:
+    """
+    Find scandata files (both .xml and .zip) in a metadata file list.
+    
+    Args:
+        files: File dictionaries from the metadata API
+    
+    Returns:
+        List of scandata file names
+    """
+    return [f.get('name') for f in files if 'scandata' in f.get('name', '').lower() and 
+            (f.get('name', '').endswith('.xml') or f.get('name', '').endswith('.zip'))]
+
+
+def page_numbers_json_candidates(identifier: str) -> List[str]:
+    """
+    Build the page_numbers.json URLs derived from the identifier itself.
+    
+    Args:
+        identifier: The identifier ID (various formats)
+    
+    Returns:
+        Candidate URLs in priority order (see identifiers.page_numbers_json_names)
+    """
+    return plan_identifier(identifier).page_numbers_json_urls()
+
+
+def find_page_numbers_json_links(html_content: str) -> List[str]:
+    """
+    Find links to page_numbers.json in the raw details page HTML.
+    
+    Args:
+        html_content: The HTML content of the details page
+    
+    Returns:
+        Absolute URLs in priority order (later links on the page first)
+    """
+    json_urls = []
+    if 'page_numbers.json' not in html_content:
+        return json_urls
+    for match in PAGE_NUMBERS_JSON_LINK_PATTERN.finditer(html_content):
+        href = html.unescape(match.group(1) or match.group(2))
+        if href:
+            # Convert relative URL to absolute
+            if href.startswith('/'):
+                json_url = http_client.archive_url(href)
+            else:
+                json_url = href
+            json_urls.insert(0, json_url)
+    return json_urls
+
+
+def parse_page_numbers_json(text: str) -> Optional[int]:
+    """
+    Count the pages listed in a page_numbers.json document.
+    
+    Args:
+        text: The JSON document text
+    
+    Returns:
+        The number of pages if any are listed, None otherwise
+    """
+    data = json.loads(text)
+    pages = data.get('pages', [])
+    if pages:
+        return len(pages)
+    return None
+
+
+def page_number_from_files(files: List[Dict]) -> Optional[int]:
+    """
+    Derive a page count from page image files in a metadata file list.
+    
+    Args:
+        files: File dictionaries from the metadata API
+    
+    Returns:
+        The total page number if found, None otherwise
+    """
+    # Look for page number files (JPEG images of pages)
+    page_images = [f for f in files if f.get('format') in ['JPEG', 'JPEG Thumb'] 
+                  and ('page' in f.get('name', '').lower() or f.get('name', '').endswith(('.jpg', '.jpeg')))]
+    
+    # Try to extract page numbers from filenames
+    if page_images:
+        max_page = 0
+        for f in page_images:
+            name = f.get('name', '')
+            # Look for page numbers in filename (e.g., page_001.jpg, p123.jpg, etc.)
+            page_match = PAGE_FILE_PATTERN.search(name)
+            if page_match:
+                page_num = int(page_match.group(1))
+                max_page = max(max_page, page_num)
+        
+        # If we found page numbers in filenames, use that
+        if max_page > 0:
+            return max_page
+        
+        # Otherwise, count unique page-related files
+        return len(page_images)
+    
+    return None
+
+
+def page_number_from_page_files(files: List[Dict]) -> Optional[int]:
+    """
+    Last-resort page count from JPEG files named after pages.
+    
+    Args:
+        files: File dictionaries from the metadata API
+    
+    Returns:
+        The highest page number found (if more than 1), None otherwise
+    """
+    # Don't count ZIP files as individual pages - they contain multiple pages
+    page_files = [f for f in files if f.get('format') == 'JPEG' and 'page' in f.get('name', '').lower()]
+    if page_files:
+        # Try to extract from filenames - get the maximum page number
+        max_page = 0
+        for f in page_files:
+            name = f.get('name', '')
+            # Look for patterns like page_001, page001, p001, etc.
+            page_match = PAGE_FILE_PATTERN.search(name)
+            if page_match:
+                page_num = int(page_match.group(1))
+                max_page = max(max_page, page_num)
+        # Only use if we found a reasonable page number (more than 1)
+        if max_page > 1:
+            return max_page
+    return None
+
+
+def page_number_from_html(html_content: str, get_soup) -> Optional[int]:
+    """
+    Extract the displayed page count (e.g. "1/268") from details page HTML.
+    
+    Args:
+        html_content: The HTML content of the page
+        get_soup: Callable returning the parsed BeautifulSoup tree of the page
+    
+    Returns:
+        The total page number if found, None otherwise
+    """
+    # First, search the entire HTML content for page number patterns
+    # This catches dynamically loaded content and various formats
+    html_text = html_content
+    
+    # Look for patterns like "(1/268)", "Page — (1/268)", etc.
+    # Find all matches and use the one with the highest total (most likely to be correct)
+    page_patterns = PAGE_SLASH_PATTERN.findall(html_text)
+    if page_patterns:
+        # Get the maximum total page number found
+        max_total = max(int(total) for current, total in page_patterns)
+        # Only use if it's a reasonable number (more than 1)
+        if max_total > 1:
+            return max_total
+    
+    # Also search for "of" patterns like "(1 of 268)"
+    of_patterns = PAGE_OF_PATTERN.findall(html_text)
+    if of_patterns:
+        max_total = max(int(total) for current, total in of_patterns)
+        if max_total > 1:
+            return max_total
+    
+    # The remaining lookups all target BRcurrentpage elements, so only build
+    # the (expensive) soup when the raw HTML actually contains one
+    if 'BRcurrentpage' not in html_text:
+        return None
+    soup = get_soup()
+    if soup is None:
+        return None
+    
+    # Try to find the span element with class "BRcurrentpage BRmax"
+    span_element = soup.find('span', class_='BRcurrentpage BRmax')
+    if span_element:
+        text = span_element.get_text(strip=True)
+        match = PAGE_SLASH_PATTERN.search(text)
+        if match:
+            total_pages = int(match.group(2))  # group(2) is the total
+            return total_pages
+    
+    # Try to find BRcurrentpage BRmin element
+    span_element_min = soup.find('span', class_='BRcurrentpage BRmin')
+    if span_element_min:
+        text = span_element_min.get_text(strip=True)
+        match = PAGE_OF_PATTERN.search(text)
+        if match:
+            total_pages = int(match.group(2))  # group(2) is the total
+            return total_pages
+    
+    # Search for any element with BRcurrentpage class
+    all_current_page = soup.find_all(class_=CURRENT_PAGE_CLASS_PATTERN)
+    for element in all_current_page:
+        text = element.get_text(strip=True)
+        match = PAGE_SLASH_PATTERN.search(text)
+        if match:
+            total_pages = int(match.group(2))  # group(2) is the total
+            return total_pages
+        match = PAGE_OF_PATTERN.search(text)
+        if match:
+            total_pages = int(match.group(2))  # group(2) is the total
+            return total_pages
+    
+    return None
+
+
+# Fetches the strategy steps yield, as (FETCH_*, *args) tuples. Each backend
+# performs them with its own fetchers (SYNC_FETCHERS here, and
+# async_scraper.ASYNC_FETCHERS) and sends back the result, or throws the
+# exception into the steps, so the fallback chain itself exists only once.
+FETCH_DETAILS = 'details'  # () -> (page count found by the streaming scan or None, details HTML)
+FETCH_DETAILS_HTML = 'details_html'  # () -> details HTML, or None if it can't be fetched
+FETCH_FILES = 'files'  # () -> file list from the metadata API (empty if unavailable)
+FETCH_LEAF_COUNT = 'leaf_count'  # (url, is_zip) -> leafCount of a scandata file, or None
+FETCH_PAGE_NUMBERS_JSON = 'page_numbers_json'  # (urls) -> first page count found, in priority order, or None
+
+
+def page_numbers_json_steps(identifier: str, context) -> Generator[Tuple, Any, Optional[int]]:
+    """
+    Strategy steps for page_numbers.json (see get_page_number_from_json).
     
     Args:
         identifier: The identifier ID
+        context: The backend's item context (for its plan and known file names)
     
     Returns:
         The total page number if found, None otherwise
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    # Try multiple patterns for finding the page_numbers.json file (those the
+    # item's file list rules out are skipped, if it has been fetched already)
+    patterns_to_try = context.plan.page_numbers_json_urls(context.known_file_names())
+    
+    # Links found in the HTML page take priority over the derived patterns
+    try:
+        html_content = yield (FETCH_DETAILS_HTML,)
+        if html_content is not None:
+            patterns_to_try = find_page_numbers_json_links(html_content) + patterns_to_try
+    except Exception:
+        pass
+    
+    # All patterns are fetched concurrently; the first success in priority
+    # order wins and the remaining requests are cancelled
+    return (yield (FETCH_PAGE_NUMBERS_JSON, list(dict.fromkeys(patterns_to_try))))
+
+
+def scandata_steps(identifier: str, context) -> Generator[Tuple, Any, Optional[int]]:
+    """
+    Strategy steps for scandata.xml/.zip (see get_page_number_from_scandata).
     
+    Args:
+        identifier: The identifier ID
+        context: The backend's item context (for its plan and known file names)
+    
+    Returns:
+        The total page number if found, None otherwise
+    """
     # Method 1: Try to find scandata file from metadata API (most reliable)
+    tried = set()
     try:
-        metadata_url = f"https://archive.org/metadata/{identifier}"
-        response = requests.get(metadata_url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            metadata = json.loads(response.text)
-            files = metadata.get('files', [])
-            
-            # Find scandata files (both .xml and .zip)
-            scandata_files = [f for f in files if 'scandata' in f.get('name', '').lower() and 
-                             (f.get('name', '').endswith('.xml') or f.get('name', '').endswith('.zip'))]
-            
-            # Try each scandata file found
-            for file_info in scandata_files:
-                scandata_name = file_info.get('name')
-                scandata_url = f"https://archive.org/download/{identifier}/{scandata_name}"
-                try:
-                    scandata_response = requests.get(scandata_url, headers=headers, timeout=10)
-                    if scandata_response.status_code == 200:
-                        # Handle ZIP files
-                        if scandata_name.endswith('.zip'):
-                            import zipfile
-                            import io
-                            try:
-                                zip_file = zipfile.ZipFile(io.BytesIO(scandata_response.content))
-                                # Look for scandata.xml in the ZIP
-                                xml_files = [f for f in zip_file.namelist() if f.endswith('scandata.xml')]
-                                if xml_files:
-                                    xml_content = zip_file.read(xml_files[0]).decode('utf-8')
-                                    soup = BeautifulSoup(xml_content, 'xml')
-                                    leaf_count = soup.find('leafCount')
-                                    if leaf_count and leaf_count.string:
-                                        try:
-                                            return int(leaf_count.string.strip())
-                                        except ValueError:
-                                            continue
-                            except Exception:
-                                continue
-                        else:
-                            # Handle XML files directly
-                            soup = BeautifulSoup(scandata_response.text, 'xml')
-                            leaf_count = soup.find('leafCount')
-                            if leaf_count and leaf_count.string:
-                                try:
-                                    return int(leaf_count.string.strip())
-                                except ValueError:
-                                    continue
-                except Exception:
-                    continue
+        # Try each scandata file found
+        for scandata_name in find_scandata_files((yield (FETCH_FILES,))):
+            scandata_url = http_client.archive_url(f"download/{identifier}/{scandata_name}")
+            tried.add(scandata_url)
+            try:
+                leaf_count = yield (FETCH_LEAF_COUNT, scandata_url, scandata_name.endswith('.zip'))
+                if leaf_count is not None:
+                    return leaf_count
+            except Exception:
+                continue
     except Exception:
         pass
     
-    # Method 2: Try standard pattern {identifier}_scandata.xml
+    # Method 2: Try standard pattern {identifier}_scandata.xml, unless the
+    # item's file list rules it out (or listed it, so Method 1 already tried it)
     try:
-        scandata_url = f"https://archive.org/download/{identifier}/{identifier}_scandata.xml"
-        response = requests.get(scandata_url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'xml')
-            leaf_count = soup.find('leafCount')
-            if leaf_count and leaf_count.string:
-                try:
-                    return int(leaf_count.string.strip())
-                except ValueError:
-                    pass
+        scandata_url = context.plan.scandata_url(context.known_file_names())
+        if scandata_url is None or scandata_url in tried:
+            return None
+        return (yield (FETCH_LEAF_COUNT, scandata_url, False))
     except Exception:
         pass
     
     return None
 
 
-def get_page_number_from_json(identifier: str) -> Optional[int]:
+def metadata_steps(identifier: str, context) -> Generator[Tuple, Any, Optional[int]]:
     """
-    Try to get page number from archive.org's page_numbers.json file.
-    Handles different identifier formats and tries multiple URL patterns.
+    Strategy steps for the metadata API file list (see get_page_number_from_metadata).
     
     Args:
-        identifier: The identifier ID (various formats)
+        identifier: The identifier ID
+        context: The backend's item context
     
     Returns:
         The total page number if found, None otherwise
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    try:
+        return page_number_from_files((yield (FETCH_FILES,)))
+    except Exception:
+        pass
     
-    # Try multiple patterns for finding the page_numbers.json file
-    patterns_to_try = []
+    return None
+
+
+# Fallback method steps by name
+FALLBACK_STEPS = {
+    METHOD_PAGE_NUMBERS_JSON: page_numbers_json_steps,
+    METHOD_SCANDATA: scandata_steps,
+    METHOD_METADATA: metadata_steps,
+}
+
+
+def extraction_steps(html_content: str, identifier: str, context,
+                     stats: Optional[StrategyStats] = None,
+                     html_page_count: Optional[int] = None) -> Generator[Tuple, Any, Tuple[Optional[int], Optional[str]]]:
+    """
+    Steps of the whole extraction chain (see extract_page_number_with_method).
     
-    # Pattern 1: {identifier}/{identifier_underscores}_page_numbers.json
-    identifier_underscores = identifier.replace('.', '_').replace('-', '_')
-    patterns_to_try.append(f"https://archive.org/download/{identifier}/{identifier_underscores}_page_numbers.json")
+    Args:
+        html_content: The HTML content of the page
+        identifier: The identifier ID for constructing URLs
+        context: The backend's item context
+        stats: Optional per-family strategy statistics to order by and update
+        html_page_count: Page count the streaming details scan already found
     
-    # Pattern 2: If identifier contains dots, try splitting and reconstructing
-    if '.' in identifier:
-        parts = identifier.split('.')
-        if len(parts) >= 2:
-            # For identifiers like "04315104.1697.emory.edu" -> "04315104_1697_page_numbers.json"
-            base_parts = [p for p in parts if p != 'emory' and p != 'edu']
-            if base_parts:
-                base_underscores = '_'.join(base_parts)
-                patterns_to_try.append(f"https://archive.org/download/{identifier}/{base_underscores}_page_numbers.json")
+    Returns:
+        Tuple of (page number, method name), or (None, None) if not found
+    """
+    # Method 1: Try to parse HTML first (most accurate - shows displayed page count)
+    # This gets the displayed page count which matches what users see (e.g., "1/268")
+    attempted = [METHOD_HTML]
+    page_count = html_page_count
+    if not page_count:
+        with parsing(context.metrics):
+            page_count = page_number_from_html(html_content, context.soup)
+    if page_count:
+        method = METHOD_HTML
+    else:
+        # Methods 2-4: page_numbers.json, scandata.xml (may include covers/blank
+        # pages, so less accurate than HTML), then the metadata API
+        method = None
+        order = stats.order(identifier, FALLBACK_METHODS) if stats is not None else FALLBACK_METHODS
+        for name in order:
+            attempted.append(name)
+            page_count = yield from FALLBACK_STEPS[name](identifier, context)
+            if page_count:
+                method = name
+                break
     
-    # Pattern 3: Try finding the JSON link in the HTML page
-    try:
-        details_url = f"https://archive.org/details/{identifier}"
-        response = requests.get(details_url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            # Find all links to page_numbers.json
-            links = soup.find_all('a', href=True)
-            for link in links:
-                href = link.get('href', '')
-                if 'page_numbers.json' in href:
-                    # Convert relative URL to absolute
-                    if href.startswith('/'):
-                        json_url = f"https://archive.org{href}"
-                    else:
-                        json_url = href
-                    patterns_to_try.insert(0, json_url)  # Prioritize this pattern
-    except Exception:
-        pass
+    if stats is not None:
+        stats.record(identifier, attempted, method)
+    if context.metrics is not None:
+        context.metrics.methods_tried.extend(attempted)
+    return (page_count, method) if method else (None, None)
+
+
+def item_steps(identifier: str, context,
+               stats: Optional[StrategyStats] = None) -> Generator[Tuple, Any, Dict[str, any]]:
+    """
+    Steps of one identifier's scrape: the details page, the extraction chain
+    and a last look at the page image files. Errors fetching the details page
+    propagate for the backend to report.
     
-    # Try all patterns
-    for json_url in patterns_to_try:
+    Args:
+        identifier: The identifier ID
+        context: The backend's item context
+        stats: Optional strategy statistics shared by the batch
+    
+    Returns:
+        The result dictionary (see build_result)
+    """
+    # Fetch the details page once; every extraction method shares it via the context.
+    # A streamed page stops downloading as soon as its page counter has been seen
+    html_page_count, html_content = yield (FETCH_DETAILS,)
+    page_number, method = yield from extraction_steps(html_content, identifier, context, stats, html_page_count)
+    
+    if page_number is None:
+        # Try one more time with a direct metadata check if all methods failed
+        # This handles edge cases where the page loads but methods don't work
         try:
-            response = requests.get(json_url, headers=headers, timeout=10)
-            if response.status_code == 200:
-                data = json.loads(response.text)
-                pages = data.get('pages', [])
-                if pages:
-                    return len(pages)
+            if context.metrics is not None:
+                context.metrics.methods_tried.append(METHOD_PAGE_FILES)
+            page_number = page_number_from_page_files((yield (FETCH_FILES,)))
+            method = METHOD_PAGE_FILES
         except Exception:
-            continue
+            pass  # Silently fail if this fallback doesn't work
+    
+    return build_result(identifier, construct_url(identifier), page_number, method,
+                        transient=context.transient_failures > 0)
+
+
+def _read_details(context: ItemContext) -> Tuple[Optional[int], str]:
+    """Fetch and read the details page, raising requests' HTTPError if it isn't OK"""
+    response = context.details_response()
+    if not response.ok:
+        response.close()  # A streamed error page is never read
+        response.raise_for_status()
+    return context.read_details()
+
+
+def _fetch_leaf_count(context: ItemContext, scandata_url: str, is_zip: bool) -> Optional[int]:
+    """Stream a scandata file and extract its leafCount (None unless it is a 200)"""
+    # Streamed so revalidation keeps only the leaf count, not the (large) body
+    response = context.get(scandata_url, kind=KIND_SCANDATA, stream=True)
+    with response:
+        if response.status_code != 200:
+            return None
+        # Handle ZIP and XML files without holding the whole body in memory
+        return context.parse_cached(response, lambda r: stream_scandata_response(r, is_zip))
+
+
+def _get_candidate_executor() -> ThreadPoolExecutor:
+    """Return the shared thread pool used to fetch URL candidates concurrently"""
+    global _candidate_executor
+    if _candidate_executor is None:
+        with _candidate_executor_lock:
+            if _candidate_executor is None:
+                _candidate_executor = ThreadPoolExecutor(max_workers=CANDIDATE_WORKERS, thread_name_prefix='candidate')
+    return _candidate_executor
+
+
+def _fetch_page_numbers_json(json_url: str, cancelled: threading.Event, context: ItemContext) -> Optional[int]:
+    """
+    Fetch and parse one page_numbers.json candidate, unless the race is already decided.
+    The body is streamed so a cancelled request is dropped before it is downloaded.
+    """
+    if cancelled.is_set():
+        return None
+    response = context.get(json_url, kind=KIND_PAGE_NUMBERS_JSON, stream=True)
+    try:
+        if response.status_code != 200 or cancelled.is_set():
+            return None
+        return context.parse_cached(response, lambda r: parse_page_numbers_json(r.text))
+    finally:
+        response.close()
+
+
+def _race_page_numbers_json(context: ItemContext, json_urls: List[str]) -> Optional[int]:
+    """Fetch page_numbers.json candidates on the candidate pool; the first success in priority order wins"""
+    cancelled = threading.Event()
+    executor = _get_candidate_executor()
+    futures = [executor.submit(_fetch_page_numbers_json, json_url, cancelled, context) for json_url in json_urls]
+    try:
+        for future in futures:
+            try:
+                page_count = future.result()
+            except Exception:
+                continue
+            if page_count:
+                return page_count
+    finally:
+        cancelled.set()
+        for future in futures:
+            future.cancel()
     
     return None
 
 
-def get_page_number_from_metadata(identifier: str) -> Optional[int]:
+# Threaded fetchers performing the steps' FETCH_* requests on an ItemContext
+SYNC_FETCHERS = {
+    FETCH_DETAILS: _read_details,
+    FETCH_DETAILS_HTML: ItemContext.details_html,
+    FETCH_FILES: ItemContext.files,
+    FETCH_LEAF_COUNT: _fetch_leaf_count,
+    FETCH_PAGE_NUMBERS_JSON: _race_page_numbers_json,
+}
+
+
+def run_steps(steps: Generator[Tuple, Any, Any], context: ItemContext) -> Any:
+    """
+    Run strategy steps on this thread, performing each fetch they yield with
+    SYNC_FETCHERS (async_scraper.run_steps is the event-loop counterpart).
+    
+    Args:
+        steps: Steps generator (e.g. item_steps or a FALLBACK_STEPS entry)
+        context: The identifier's ItemContext
+    
+    Returns:
+        The value the steps return
+    """
+    value, error = None, None
+    while True:
+        try:
+            fetch = steps.send(value) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            value, error = SYNC_FETCHERS[fetch[0]](context, *fetch[1:]), None
+        except Exception as e:
+            value, error = None, e
+
+
+def get_page_number_from_scandata(identifier: str, context: Optional[ItemContext] = None) -> Optional[int]:
+    """
+    Try to get page number from archive.org's scandata.xml file.
+    This file contains leafCount which is the total number of pages.
+    
+    Args:
+        identifier: The identifier ID
+        context: Shared item context (metadata is fetched once per identifier)
+    
+    Returns:
+        The total page number if found, None otherwise
+    """
+    context = context or ItemContext(identifier)
+    return run_steps(scandata_steps(identifier, context), context)
+
+
+def get_page_number_from_json(identifier: str, context: Optional[ItemContext] = None) -> Optional[int]:
+    """
+    Try to get page number from archive.org's page_numbers.json file.
+    Handles different identifier formats and tries multiple URL patterns.
+    
+    Args:
+        identifier: The identifier ID (various formats)
+        context: Shared item context (details page is fetched once per identifier)
+    
+    Returns:
+        The total page number if found, None otherwise
+    """
+    context = context or ItemContext(identifier)
+    return run_steps(page_numbers_json_steps(identifier, context), context)
+
+
+def get_page_number_from_metadata(identifier: str, context: Optional[ItemContext] = None) -> Optional[int]:
     """
     Try to get page number from archive.org's metadata API.
     Looks for JP2 ZIP files and counts pages from scandata or file patterns.
     
     Args:
         identifier: The identifier ID
+        context: Shared item context (metadata is fetched once per identifier)
     
     Returns:
         The total page number if found, None otherwise
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    context = context or ItemContext(identifier)
+    return run_steps(metadata_steps(identifier, context), context)
+
+
+def extract_page_number(html_content: str, identifier: str, context: Optional[ItemContext] = None) -> Optional[int]:
+    """
+    Extract the total page number from the HTML content.
+    See extract_page_number_with_method for the methods tried.
     
-    try:
-        metadata_url = f"https://archive.org/metadata/{identifier}"
-        response = requests.get(metadata_url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            metadata = json.loads(response.text)
-            files = metadata.get('files', [])
-            
-            # Look for JP2 ZIP files (these contain page images)
-            jp2_files = [f for f in files if 'jp2' in f.get('name', '').lower() or 
-                         f.get('format') == 'Single Page Processed JP2 ZIP']
-            
-            # Look for page number files (JPEG images of pages)
-            page_images = [f for f in files if f.get('format') in ['JPEG', 'JPEG Thumb'] 
-                          and ('page' in f.get('name', '').lower() or f.get('name', '').endswith(('.jpg', '.jpeg')))]
-            
-            # Try to extract page numbers from filenames
-            if page_images:
-                max_page = 0
-                for f in page_images:
-                    name = f.get('name', '')
-                    # Look for page numbers in filename (e.g., page_001.jpg, p123.jpg, etc.)
-                    page_match = re.search(r'page[_-]?(\d+)', name, re.IGNORECASE)
-                    if page_match:
-                        page_num = int(page_match.group(1))
-                        max_page = max(max_page, page_num)
-                
-                # If we found page numbers in filenames, use that
-                if max_page > 0:
-                    return max_page
-                
-                # Otherwise, count unique page-related files
-                return len(page_images)
-    except Exception:
-        pass
+    Args:
+        html_content: The HTML content of the page
+        identifier: The identifier ID for constructing URLs
+        context: Shared item context reused by the fallback methods
     
-    return None
+    Returns:
+        The total page number if found, None otherwise
+    """
+    page_count, _ = extract_page_number_with_method(html_content, identifier, context)
+    return page_count
+
+
+# Fallback methods by name
+FALLBACK_STRATEGIES = {
+    METHOD_PAGE_NUMBERS_JSON: get_page_number_from_json,
+    METHOD_SCANDATA: get_page_number_from_scandata,
+    METHOD_METADATA: get_page_number_from_metadata,
+}
 
 
-def extract_page_number(html_content: str, identifier: str) -> Optional[int]:
+def extract_page_number_with_method(html_content: str, identifier: str,
+                                    context: Optional[ItemContext] = None,
+                                    stats: Optional[StrategyStats] = None,
+                                    html_page_count: Optional[int] = None) -> Tuple[Optional[int], Optional[str]]:
     """
-    Extract the total page number from the HTML content.
+    Extract the total page number and report which method found it.
     
     Tries multiple methods in order of reliability:
-    1. scandata.xml (contains leafCount - most reliable)
+    1. HTML parsing (displayed page count, e.g. "1/268")
     2. page_numbers.json file
-    3. Metadata API
-    4. HTML parsing (fallback)
+    3. scandata.xml (contains leafCount)
+    4. Metadata API
+    
+    With strategy statistics, methods 2-4 are tried in the order that has
+    worked best for the identifier's family, and the outcome is recorded.
     
     Args:
         html_content: The HTML content of the page
         identifier: The identifier ID for constructing URLs
+        context: Shared item context reused by the fallback methods
+        stats: Optional per-family strategy statistics to order by and update
+        html_page_count: Page count the streaming details scan already found
+            (method 1 then needs no parsing; see ItemContext.read_details)
     
     Returns:
-        The total page number if found, None otherwise
+        Tuple of (page number, method name), or (None, None) if not found
     """
-    # Method 1: Try to parse HTML first (most accurate - shows displayed page count)
-    # This gets the displayed page count which matches what users see (e.g., "1/268")
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    # First, search the entire HTML content for page number patterns
-    # This catches dynamically loaded content and various formats
-    html_text = html_content
+    if context is None:
+        context = ItemContext(identifier)
+        context.set_details_html(html_content)
+    return run_steps(extraction_steps(html_content, identifier, context, stats, html_page_count), context)
+
+
+def build_result(identifier: str, url: str, page_number: Optional[int], method: Optional[str] = None,
+                 transient: bool = False) -> Dict[str, any]:
+    """
+    Build the result dictionary for an identifier whose details page loaded.
     
-    # Look for patterns like "(1/268)", "Page — (1/268)", etc.
-    # Find all matches and use the one with the highest total (most likely to be correct)
-    page_patterns = re.findall(r'\((\d+)/(\d+)\)', html_text)
-    if page_patterns:
-        # Get the maximum total page number found
-        max_total = max(int(total) for current, total in page_patterns)
-        # Only use if it's a reasonable number (more than 1)
-        if max_total > 1:
-            return max_total
+    Args:
+        identifier: The identifier ID
+        url: The details page URL
+        page_number: The extracted page number (None if not found)
+        method: Name of the extraction method that found the page number
+        transient: Some fetches failed transiently (timeouts, 429/5xx), so a
+            missing page number is worth retrying later
     
-    # Also search for "of" patterns like "(1 of 268)"
-    of_patterns = re.findall(r'\((\d+)\s+of\s+(\d+)\)', html_text, re.IGNORECASE)
-    if of_patterns:
-        max_total = max(int(total) for current, total in of_patterns)
-        if max_total > 1:
-            return max_total
+    Returns:
+        A dictionary with identifier, url, page_number, method, success status
+        and whether a failure is retryable
+    """
+    error = None
+    if page_number is None:
+        error = 'Page number could not be extracted from available sources'
+        if transient:
+            error += ' (some requests failed transiently; retry later)'
+    return {
+        'identifier': identifier,
+        'url': url,
+        'page_number': page_number,
+        'method': method if page_number is not None else None,
+        'success': page_number is not None,
+        'error': error,
+        'retryable': page_number is None and transient
+    }
+
+
+def build_error_result(identifier: str, url: str, error_msg: str, retryable: bool = False) -> Dict[str, any]:
+    """
+    Build the result dictionary for an identifier that failed to scrape.
     
-    # Try to find the span element with class "BRcurrentpage BRmax"
-    span_element = soup.find('span', class_='BRcurrentpage BRmax')
-    if span_element:
-        text = span_element.get_text(strip=True)
-        match = re.search(r'\((\d+)/(\d+)\)', text)
-        if match:
-            total_pages = int(match.group(2))  # group(2) is the total
-            return total_pages
+    Args:
+        identifier: The identifier ID
+        url: The details page URL
+        error_msg: Description of the failure
+        retryable: Whether the failure is transient (timeouts, 429/5xx) rather than permanent
     
-    # Try to find BRcurrentpage BRmin element
-    span_element_min = soup.find('span', class_='BRcurrentpage BRmin')
-    if span_element_min:
-        text = span_element_min.get_text(strip=True)
-        match = re.search(r'\((\d+)\s+of\s+(\d+)\)', text, re.IGNORECASE)
-        if match:
-            total_pages = int(match.group(2))  # group(2) is the total
-            return total_pages
+    Returns:
+        A dictionary with identifier, url, page_number, success status and
+        whether the failure is retryable
+    """
+    return {
+        'identifier': identifier,
+        'url': url,
+        'page_number': None,
+        'method': None,
+        'success': False,
+        'error': error_msg,
+        'retryable': retryable
+    }
+
+
+def describe_http_error(status_code: int, error_msg: str) -> str:
+    """Turn an HTTP error on the details page into a friendlier message"""
+    if status_code == 404:
+        return "Identifier not found (404) - URL may be incorrect or item doesn't exist"
+    return error_msg
+
+
+def scrape_page_number(identifier: str, cache: Optional[ResultCache] = None, refresh: bool = False,
+                       limiter: Optional[RateLimiter] = None,
+                       stats: Optional[StrategyStats] = None,
+                       prefetched: Optional[Dict[str, int]] = None,
+                       instrument: bool = False,
+                       plan: Optional[RequestPlan] = None) -> Dict[str, any]:
+    """
+    Scrape the page number for a given identifier.
     
-    # Search for any element with BRcurrentpage class
-    all_current_page = soup.find_all(class_=re.compile('BRcurrentpage'))
-    for element in all_current_page:
-        text = element.get_text(strip=True)
-        match = re.search(r'\((\d+)/(\d+)\)', text)
-        if match:
-            total_pages = int(match.group(2))  # group(2) is the total
-            return total_pages
-        match = re.search(r'\((\d+)\s+of\s+(\d+)\)', text, re.IGNORECASE)
-        if match:
-            total_pages = int(match.group(2))  # group(2) is the total
-            return total_pages
+    Args:
+        identifier: The identifier ID to scrape
+        cache: Optional persistent result cache to read from and write to
+        refresh: Ignore cached entries (fresh results are still written to the cache)
+        limiter: Global rate limiter: every request to archive.org takes one of its
+            tokens, and the identifier holds one of its concurrency slots while scraped
+        stats: Optional strategy statistics shared by the batch (orders the fallback methods)
+        prefetched: Page counts resolved by the bulk search prefetch; these identifiers
+            are not scraped individually
+        instrument: Add per-identifier request, byte and timing counters as
+            result['metrics'] (see instrumentation.ItemMetrics)
+        plan: The identifier's request plan, when the batch was planned up front
+            (identifiers.iter_plans); planned here otherwise
     
-    # Method 2: Try to get from page_numbers.json
-    page_count = get_page_number_from_json(identifier)
-    if page_count:
-        return page_count
+    Returns:
+        A dictionary with identifier, url, page_number, method, and success status
+    """
+    cached = cached_result(identifier, cache, refresh, instrument)
+    if cached is not None:
+        return cached
     
-    # Method 3: Try scandata.xml (may include covers/blank pages, so less accurate than HTML)
-    page_count = get_page_number_from_scandata(identifier)
-    if page_count:
-        return page_count
+    metrics = ItemMetrics() if instrument else None
+    if prefetched is not None and identifier in prefetched:
+        result = build_result(identifier, construct_url(identifier), prefetched[identifier], METHOD_IMAGECOUNT)
+    elif limiter is None:
+        result = _scrape_page_number_uncached(identifier, stats, metrics, plan)
+    else:
+        limiter.acquire_slot()
+        try:
+            result = _scrape_page_number_uncached(identifier, stats, metrics, plan, limiter)
+        finally:
+            limiter.release()
+    return store_result(result, cache, metrics)
+
+
+def cached_result(identifier: str, cache: Optional[ResultCache] = None, refresh: bool = False,
+                  instrument: bool = False) -> Optional[Dict[str, any]]:
+    """
+    Look an identifier up in the result cache (the first step of every backend's scrape).
     
-    # Method 4: Try metadata API
-    page_count = get_page_number_from_metadata(identifier)
-    if page_count:
-        return page_count
+    Args:
+        identifier: The identifier ID
+        cache: Optional persistent result cache
+        refresh: Ignore cached entries
+        instrument: Mark a hit with cache-hit metrics
     
-    return None
+    Returns:
+        The cached result, or None if it has to be scraped
+    """
+    if cache is None or refresh:
+        return None
+    result = cache.get(identifier)
+    if result is not None and instrument:
+        result = dict(result, metrics=empty_metrics(CACHE_HIT))
+    return result
 
 
-def scrape_page_number(identifier: str) -> Dict[str, any]:
+def store_result(result: Dict[str, any], cache: Optional[ResultCache] = None,
+                 metrics: Optional[ItemMetrics] = None) -> Dict[str, any]:
     """
-    Scrape the page number for a given identifier.
+    Write a freshly scraped result to the result cache and attach its metrics
+    (the last step of every backend's scrape).
     
     Args:
-        identifier: The identifier ID to scrape
+        result: The result dictionary
+        cache: Optional persistent result cache
+        metrics: The identifier's ItemMetrics, when instrumented
     
     Returns:
-        A dictionary with identifier, url, page_number, and success status
+        The result
     """
+    if cache is not None:
+        cache.put(result)
+    if metrics is not None:
+        result['metrics'] = metrics.as_dict(CACHE_MISS if cache is not None else None)
+    return result
+
+
+def _scrape_page_number_uncached(identifier: str, stats: Optional[StrategyStats] = None,
+                                 metrics: Optional[ItemMetrics] = None,
+                                 plan: Optional[RequestPlan] = None,
+                                 limiter: Optional[RateLimiter] = None) -> Dict[str, any]:
+    """Run one identifier's item_steps on this thread, reporting request errors as error results"""
+    import requests  # Deferred so importing this module stays cheap on cold starts
+    
     url = construct_url(identifier)
+    policy = http_client.get_retry_policy()
+    context = ItemContext(identifier, deadline=policy.start_deadline(), metrics=metrics, plan=plan, limiter=limiter)
     
     try:
-        # Send GET request with a user agent to avoid blocking
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        page_number = extract_page_number(response.text, identifier)
-        
-        if page_number is None:
-            # Try one more time with a direct metadata check if all methods failed
-            # This handles edge cases where the page loads but methods don't work
-            try:
-                metadata_url = f"https://archive.org/metadata/{identifier}"
-                metadata_response = requests.get(metadata_url, headers=headers, timeout=10)
-                if metadata_response.status_code == 200:
-                    metadata = json.loads(metadata_response.text)
-                    files = metadata.get('files', [])
-                    # Look for any page-related files as last resort
-                    # But don't count ZIP files as individual pages - they contain multiple pages
-                    page_files = [f for f in files if f.get('format') == 'JPEG' and 'page' in f.get('name', '').lower()]
-                    if page_files:
-                        # Try to extract from filenames - get the maximum page number
-                        max_page = 0
-                        for f in page_files:
-                            name = f.get('name', '')
-                            # Look for patterns like page_001, page001, p001, etc.
-                            page_match = re.search(r'page[_-]?(\d+)', name, re.IGNORECASE)
-                            if page_match:
-                                page_num = int(page_match.group(1))
-                                max_page = max(max_page, page_num)
-                        # Only use if we found a reasonable page number (more than 1)
-                        if max_page > 1:
-                            page_number = max_page
-            except Exception:
-                pass  # Silently fail if this fallback doesn't work
-        
-        return {
-            'identifier': identifier,
-            'url': url,
-            'page_number': page_number,
-            'success': page_number is not None,
-            'error': None if page_number is not None else 'Page number could not be extracted from available sources'
-        }
+        return run_steps(item_steps(identifier, context, stats), context)
     
     except requests.exceptions.HTTPError as e:
         # Handle 404 and other HTTP errors more gracefully
-        error_msg = str(e)
-        if '404' in error_msg:
-            error_msg = f"Identifier not found (404) - URL may be incorrect or item doesn't exist"
-        return {
-            'identifier': identifier,
-            'url': url,
-            'page_number': None,
-            'success': False,
-            'error': error_msg
-        }
+        status_code = e.response.status_code if e.response is not None else None
+        return build_error_result(identifier, url, describe_http_error(status_code, str(e)),
+                                  retryable=status_code in policy.retry_statuses)
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+        return build_error_result(identifier, url, str(e), retryable=True)
     except requests.exceptions.RequestException as e:
-        return {
-            'identifier': identifier,
-            'url': url,
-            'page_number': None,
-            'success': False,
-            'error': str(e)
-        }
+        return build_error_result(identifier, url, str(e))
+    except DeadlineExceeded:
+        return build_error_result(identifier, url, f"Deadline of {policy.deadline}s exceeded for url: {url}", retryable=True)
     except Exception as e:
-        return {
-            'identifier': identifier,
-            'url': url,
-            'page_number': None,
-            'success': False,
-            'error': str(e)
-        }
+        return build_error_result(identifier, url, str(e))
 
 
 def read_ids_from_file(filename: str) -> List[str]:
     """
-    Read identifiers from a text file (one per line).
+    Read identifiers from a text file (one per line, optionally gzip-compressed).
     
     Args:
         filename: Path to the file containing identifiers
     
     Returns:
-        List of identifier strings
+        List of identifier strings, without duplicates
     """
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            ids = [line.strip() for line in f if line.strip()]
-        return ids
+        return list(unique(iter_identifiers(filename)))
     except FileNotFoundError:
         print(f"Error: File '{filename}' not found.")
         return []
 
 
-def save_results(results: List[Dict], output_file: str = 'results.xlsx'):
+def open_output_writer(output_file: str, metrics: bool = False) -> ResultWriter:
     """
-    Save scraping results to an Excel file.
+    Open a streaming writer for the output file, chosen by its extension
+    (.xlsx, .csv, .jsonl, .json or .parquet). Any other extension is saved as
+    Excel. Falls back to JSON if the format's library is not installed.
     
     Args:
-        results: List of result dictionaries
-        output_file: Output filename (should be .xlsx)
+        output_file: Output filename
+        metrics: Include the per-identifier instrumentation columns
+    
+    Returns:
+        A ResultWriter; pass it to close_output_writer when done
     """
-    # Prepare data for Excel
-    excel_data = []
-    for result in results:
-        excel_data.append({
-            'Identifier': result['identifier'],
-            'URL': result['url'],
-            'Page Number': result['page_number'] if result['page_number'] else 'N/A',
-            'Status': 'Success' if result['success'] else 'Failed',
-            'Error': result.get('error', '') if not result['success'] else ''
-        })
-    
-    # Create DataFrame
-    df = pd.DataFrame(excel_data)
-    
-    # Ensure output file has .xlsx extension
-    if not output_file.endswith('.xlsx'):
+    # Ensure unsupported extensions become .xlsx
+    if output_format(output_file) == 'xlsx' and not output_file.endswith('.xlsx'):
         output_file = output_file.rsplit('.', 1)[0] + '.xlsx'
     
-    # Save to Excel
     try:
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Results', index=False)
-            
-            # Get the workbook and worksheet
-            workbook = writer.book
-            worksheet = writer.sheets['Results']
-            
-            # Auto-adjust column widths
-            from openpyxl.utils import get_column_letter
-            for idx, col in enumerate(df.columns, 1):
-                max_length = max(
-                    df[col].astype(str).map(len).max(),
-                    len(col)
-                )
-                column_letter = get_column_letter(idx)
-                worksheet.column_dimensions[column_letter].width = min(max_length + 2, 50)
-        
-        print(f"\nResults saved to {output_file}")
+        return open_result_writer(output_file, metrics=metrics)
+    except ImportError as e:
+        print(f"\nError opening {output_file}: {e}")
+        print("Falling back to JSON format...")
+        return open_result_writer(output_file.rsplit('.', 1)[0] + '.json', 'json', metrics)
+
+
+def close_output_writer(writer: ResultWriter):
+    """
+    Finish an output file opened with open_output_writer. If the Excel
+    workbook cannot be saved, the results are written as JSON instead.
+    
+    Args:
+        writer: The ResultWriter to close
+    """
+    try:
+        writer.close()
+        print(f"\nResults saved to {writer.path}")
     except Exception as e:
+        if not isinstance(writer, XlsxResultWriter):
+            raise
         print(f"\nError saving to Excel: {e}")
         print("Falling back to JSON format...")
-        json_file = output_file.replace('.xlsx', '.json')
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2, ensure_ascii=False)
+        json_file = writer.path.replace('.xlsx', '.json')
+        writer.export_json(json_file)
         print(f"Results saved to {json_file}")
 
 
+def save_results(results: Iterable[Dict], output_file: str = 'results.xlsx'):
+    """
+    Save scraping results to a file (Excel unless the extension says otherwise).
+    
+    Args:
+        results: Result dictionaries (any iterable; rows are written as they arrive)
+        output_file: Output filename
+    """
+    writer = open_output_writer(output_file)
+    for result in results:
+        writer.write(result)
+    close_output_writer(writer)
+
+
+def merge_shard_results(identifiers: List[str], output_file: str, count: int, metrics: bool = False,
+                        results: Optional[List[Dict]] = None) -> int:
+    """
+    Merge the partial results of a sharded run (--shard i/N) into the output
+    file, in the original input order. Identifiers missing from their shard's
+    output (e.g. the shard crashed) get a retryable error result.
+
+    Args:
+        identifiers: The full, deduplicated identifier list of the run
+        output_file: Final output filename (shard files are found next to it)
+        count: Number of shards
+        metrics: Include the per-identifier instrumentation columns
+        results: Optional list the merged results are appended to (e.g. for --json)
+
+    Returns:
+        Number of identifiers missing from the shard outputs
+    """
+    paths = [shard_path(output_file, index, count) for index in range(count)]
+    successful = 0
+    missing = 0
+    writer = open_output_writer(output_file, metrics)
+    for identifier, result in merge_shards(identifiers, paths):
+        if result is None:
+            shard = paths[shard_of(identifier, count)]
+            result = build_error_result(identifier, construct_url(identifier),
+                                        f"Missing from shard output {shard}", retryable=True)
+            missing += 1
+        writer.write(result)
+        successful += 1 if result['success'] else 0
+        if results is not None:
+            results.append(result)
+
+    print(f"\nMerged {count} shard(s): {len(identifiers)} identifier(s), {successful} successful, "
+          f"{len(identifiers) - successful} failed ({missing} missing from shard outputs)")
+    close_output_writer(writer)
+    return missing
+
+
+def shard_stats_path(path: str, index: int, count: int) -> str:
+    """Return the strategy statistics file a shard saves what it learned to (next to --strategy-stats)"""
+    return f"{path}.shard-{index}-of-{count}"
+
+
+def merge_shard_strategy_stats(path: str, count: int):
+    """
+    Add the statistics learned by each shard of a sharded run to the
+    --strategy-stats file. Each shard file holds only its own run's counts,
+    so it is removed once merged and a repeated merge doesn't count it twice.
+
+    Args:
+        path: The --strategy-stats file
+        count: Number of shards
+    """
+    stats = StrategyStats(path)
+    merged = 0
+    for index in range(count):
+        shard_file = shard_stats_path(path, index, count)
+        if os.path.exists(shard_file):
+            stats.load(shard_file)
+            merged += 1
+    stats.save()
+    for index in range(count):
+        try:
+            os.remove(shard_stats_path(path, index, count))
+        except OSError:
+            pass
+    print(f"Merged strategy statistics of {merged} shard(s) into {path}")
+
+
+def print_json_output(results: List[Dict]):
+    """Print results as JSON to stdout (--json)"""
+    print("\nJSON Output:")
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+def print_strategy_orders(stats: StrategyStats, limit: int = 10):
+    """
+    Print the fallback method order learned for the most common identifier families.
+    
+    Args:
+        stats: The strategy statistics
+        limit: Maximum number of families to list
+    """
+    families = []
+    for family, counts in stats.summary().items():
+        seen = max(entry['attempts'] for entry in counts.values())
+        if seen >= stats.min_samples:
+            families.append((seen, family, counts))
+    if not families:
+        return
+    print("Fallback method order by identifier family:")
+    for seen, family, counts in sorted(families, reverse=True)[:limit]:
+        order = stats.order_for_family(family, FALLBACK_METHODS)
+        hits = ', '.join(f"{method} {counts.get(method, {}).get('hits', 0)}/{counts.get(method, {}).get('attempts', 0)}"
+                         for method in (METHOD_HTML,) + tuple(order))
+        print(f"  {family} ({seen} identifiers): {' -> '.join(order)}  [hits: {hits}]")
+
+
+def print_request_plan(plans: List[RequestPlan]):
+    """
+    Print one JSON line per identifier's request plan, then a summary of the
+    families and candidate URL counts (on stderr, so stdout stays JSON lines).
+    
+    Args:
+        plans: Plans from identifiers.plan_batch
+    """
+    families = {}
+    candidates = 0
+    for plan in plans:
+        print(json.dumps(plan.as_dict()))
+        families[plan.family] = families.get(plan.family, 0) + 1
+        candidates += len(plan.urls())
+    by_family = ', '.join(f"{family}: {count}" for family, count in sorted(families.items(), key=lambda item: -item[1]))
+    print(f"Planned {len(plans)} identifier(s), {candidates} candidate URL(s) at most ({by_family})", file=sys.stderr)
+
+
+def print_metrics_summary(summary: MetricsSummary):
+    """
+    Print the instrumentation totals, and which methods the requests and time went to.
+    
+    Args:
+        summary: Totals collected from the results
+    """
+    totals = summary.as_dict()
+    items = max(1, totals['items'])
+    print(f"Requests: {totals['requests']} ({totals['requests'] / items:.2f} per identifier), "
+          f"{totals['bytes'] / 1024:.0f} KB received ({totals['bytes'] / 1024 / items:.1f} KB per identifier)")
+    print(f"Time: {totals['network_ms'] / 1000:.1f}s waiting on the network, {totals['parse_ms'] / 1000:.1f}s parsing")
+    print("Cost by method:")
+    for method, counts in sorted(totals['by_method'].items(), key=lambda item: -item[1]['requests']):
+        print(f"  {method}: {counts['items']} identifier(s), {counts['requests'] / counts['items']:.2f} requests, "
+              f"{counts['bytes'] / 1024 / counts['items']:.1f} KB, {counts['total_ms'] / counts['items']:.0f} ms each")
+
+
+def _shard_argument(value: str) -> Tuple[int, int]:
+    """argparse type for --shard"""
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Scrape page numbers from archive.org books',
@@ -506,8 +1278,47 @@ Examples:
   # Multiple IDs from command line
   python scrape_page_numbers.py 04315104.1697 04315104.1698 04315104.1699
   
-  # Save results to file
-  python scrape_page_numbers.py --file ids.txt --output results.json
+  # Save results to file (.xlsx, .csv, .jsonl, .json or .parquet)
+  python scrape_page_numbers.py --file ids.txt --output results.csv
+  
+  # Scrape with 8 concurrent workers
+  python scrape_page_numbers.py --file ids.txt --workers 8
+  
+  # Let the rate and concurrency adapt to how archive.org responds
+  python scrape_page_numbers.py --file ids.txt --adaptive
+  
+  # Keep 64 identifiers in flight on one asyncio event loop
+  python scrape_page_numbers.py --file ids.txt --backend async --workers 64
+  
+  # Reuse results from earlier runs (or rescrape them with --refresh)
+  python scrape_page_numbers.py --file ids.txt --cache
+  
+  # Rescrape, but skip downloading archive.org files that haven't changed
+  python scrape_page_numbers.py --file ids.txt --cache --refresh --http-cache
+  
+  # Resolve page counts in bulk first; only unresolved identifiers are scraped one by one
+  python scrape_page_numbers.py --file ids.txt --prefetch
+  
+  # Keep the learned per-family method order for the next run
+  python scrape_page_numbers.py --file ids.txt --strategy-stats
+  
+  # Record requests, bytes and network/parse time per identifier in the output
+  python scrape_page_numbers.py --file ids.txt --metrics --output results.csv
+  
+  # Show which URLs would be requested for each identifier, without scraping
+  python scrape_page_numbers.py --file ids.txt --plan
+  
+  # Record progress, then pick up where a crashed run left off
+  python scrape_page_numbers.py --file ids.txt --checkpoint run.jsonl
+  python scrape_page_numbers.py --file ids.txt --checkpoint run.jsonl --resume
+  
+  # Split the run over 4 local processes sharing one rate budget, merged into results.xlsx
+  python scrape_page_numbers.py --file ids.txt --processes 4
+  
+  # Split the run over two machines, then merge the copied shard files on one of them
+  python scrape_page_numbers.py --file ids.txt --shard 0/2    # machine A
+  python scrape_page_numbers.py --file ids.txt --shard 1/2    # machine B
+  python scrape_page_numbers.py --file ids.txt --merge 2
         """
     )
     
@@ -520,20 +1331,22 @@ Examples:
         '--file',
         '-f',
         type=str,
-        help='Path to a text file containing identifiers (one per line)'
+        help='Path to a text file containing identifiers (one per line; .gz files are decompressed)'
     )
     parser.add_argument(
         '--output',
         '-o',
         type=str,
         default='results.xlsx',
-        help='Output file to save results (default: results.xlsx)'
+        help='Output file to save results; format follows the extension: .xlsx, .csv, .jsonl, .json or .parquet (default: results.xlsx). '
+             'CSV and JSONL files are readable mid-run; an .xlsx file is only written when the run ends '
+             '(until then its rows are in OUTPUT.partial.jsonl), and .json/.parquet are complete only at the end'
     )
     parser.add_argument(
         '--json',
         '-j',
         action='store_true',
-        help='Output results as JSON to stdout (also saves Excel file)'
+        help='Output results as JSON to stdout (also saves the output file)'
     )
     parser.add_argument(
         '--delay',
@@ -542,6 +1355,158 @@ Examples:
         default=DEFAULT_DELAY_SECONDS,
         help=f'Delay in seconds between requests (default: {DEFAULT_DELAY_SECONDS}s, minimum: {MIN_DELAY_SECONDS}s)'
     )
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        default=None,
+        help=f'Number of identifiers scraped concurrently (default: {DEFAULT_WORKERS}, maximum: {MAX_WORKERS} for threads); the ceiling with --adaptive (default: {MAX_WORKERS})'
+    )
+    parser.add_argument(
+        '--adaptive',
+        action='store_true',
+        help=f'Adapt rate and concurrency to archive.org: speed up while responses are fast and healthy, back off on 429/503/timeouts (honoring Retry-After). --delay is the starting point; the rate never exceeds one request per {MIN_DELAY_SECONDS}s'
+    )
+    parser.add_argument(
+        '--cache',
+        nargs='?',
+        const=DEFAULT_CACHE_FILE,
+        default=None,
+        metavar='PATH',
+        help=f'Reuse results from a persistent cache file (default file: {DEFAULT_CACHE_FILE})'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Disable the result cache even if --cache is given'
+    )
+    parser.add_argument(
+        '--refresh',
+        action='store_true',
+        help='Ignore cached results and rescrape everything (the cache is still updated)'
+    )
+    parser.add_argument(
+        '--http-cache',
+        nargs='?',
+        const=DEFAULT_HTTP_CACHE_DIR,
+        default=None,
+        metavar='DIR',
+        help=f'Revalidate archive.org responses with ETag/Last-Modified and reuse unchanged ones (default dir: {DEFAULT_HTTP_CACHE_DIR})'
+    )
+    parser.add_argument(
+        '--connect-timeout',
+        type=float,
+        default=DEFAULT_CONNECT_TIMEOUT,
+        help=f'Seconds to wait for a connection to archive.org (default: {DEFAULT_CONNECT_TIMEOUT}s)'
+    )
+    parser.add_argument(
+        '--read-timeout',
+        type=float,
+        default=DEFAULT_READ_TIMEOUT,
+        help=f'Seconds to wait for data from archive.org; page_numbers.json and scandata candidates use at most half of this (default: {DEFAULT_READ_TIMEOUT}s)'
+    )
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=DEFAULT_MAX_ATTEMPTS - 1,
+        help=f'Retries per request after timeouts, connection errors and 429/5xx, with jittered exponential backoff (default: {DEFAULT_MAX_ATTEMPTS - 1})'
+    )
+    parser.add_argument(
+        '--deadline',
+        type=float,
+        default=DEFAULT_DEADLINE,
+        help=f'Seconds allowed per identifier across all its requests; 0 for no limit (default: {DEFAULT_DEADLINE}s)'
+    )
+    parser.add_argument(
+        '--prefetch',
+        action='store_true',
+        help='Look up page counts (imagecount) for many identifiers per request with the archive.org search API first; only identifiers it cannot resolve go through the per-identifier methods'
+    )
+    parser.add_argument(
+        '--prefetch-batch-size',
+        type=int,
+        default=DEFAULT_PREFETCH_BATCH_SIZE,
+        help=f'Identifiers per bulk search request with --prefetch (default: {DEFAULT_PREFETCH_BATCH_SIZE})'
+    )
+    parser.add_argument(
+        '--base-url',
+        type=str,
+        default=None,
+        help='Send archive.org requests to this base URL instead, e.g. a local stub server (default: $ARCHIVE_ORG_BASE_URL or https://archive.org)'
+    )
+    parser.add_argument(
+        '--strategy-stats',
+        nargs='?',
+        const=DEFAULT_STRATEGY_STATS_FILE,
+        default=None,
+        metavar='PATH',
+        help=f'Load and save the per-identifier-family method statistics, so later runs start with the learned order (default file: {DEFAULT_STRATEGY_STATS_FILE})'
+    )
+    parser.add_argument(
+        '--fixed-order',
+        action='store_true',
+        help='Always try the fallback methods in the default order (page_numbers.json, scandata, metadata) instead of learning it per identifier family'
+    )
+    parser.add_argument(
+        '--metrics',
+        action='store_true',
+        help='Record per-identifier instrumentation (method tried, requests, bytes, network vs. parse time, cache outcome) in the output and summary'
+    )
+    parser.add_argument(
+        '--no-stream-details',
+        action='store_true',
+        help='Always download details pages in full (by default reading stops once the page counter has been seen)'
+    )
+    parser.add_argument(
+        '--plan',
+        action='store_true',
+        help='Print the candidate URLs planned for each identifier as JSON lines, without scraping'
+    )
+    parser.add_argument(
+        '--backend',
+        choices=['threads', 'async'],
+        default='threads',
+        help='Concurrency backend: worker threads (default) or a single asyncio event loop (requires aiohttp)'
+    )
+    parser.add_argument(
+        '--checkpoint',
+        type=str,
+        metavar='PATH',
+        help='Append each result to this JSONL file as soon as it is scraped'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Skip identifiers already recorded in the --checkpoint file (retryable failures are scraped again)'
+    )
+    parser.add_argument(
+        '--processes',
+        '-p',
+        type=int,
+        default=None,
+        help='Split the run over this many local processes (one shard each), sharing one rate budget; their results are merged into --output in input order'
+    )
+    parser.add_argument(
+        '--shard',
+        type=_shard_argument,
+        default=None,
+        metavar='INDEX/COUNT',
+        help='Scrape only one shard of the identifiers (e.g. 0/4), split by a stable hash, writing its results next to --output as OUTPUT.shard-INDEX-of-COUNT.jsonl (and what it learned to STRATEGY_STATS.shard-INDEX-of-COUNT)'
+    )
+    parser.add_argument(
+        '--merge',
+        type=int,
+        default=None,
+        metavar='COUNT',
+        help='Merge the results of COUNT --shard runs over the same identifiers into --output, in input order, and their statistics into --strategy-stats, without scraping'
+    )
+    parser.add_argument(
+        '--rate-lock',
+        type=str,
+        default=None,
+        metavar='PATH',
+        help='Share the --delay rate budget with every process on this host using the same lock file'
+    )
     
     args = parser.parse_args()
     
@@ -575,48 +1540,235 @@ Examples:
         sys.exit(1)
     
     # Remove duplicates while preserving order
-    seen = set()
-    identifiers = [id for id in identifiers if id not in seen and not seen.add(id)]
+    identifiers = list(unique(identifiers))
+    
+    if args.plan:
+        if args.base_url:
+            http_client.set_archive_base_url(args.base_url)
+        print_request_plan(plan_batch(identifiers))
+        return
+    
+    if args.merge:
+        results = [] if args.json else None
+        merge_shard_results(identifiers, args.output, args.merge, args.metrics, results)
+        if args.strategy_stats and not args.fixed_order:
+            merge_shard_strategy_stats(args.strategy_stats, args.merge)
+        if results is not None:
+            print_json_output(results)
+        return
+    
+    # Driver: run one shard per process, then merge their results
+    if args.processes and args.processes > 1 and not args.shard:
+        if args.adaptive:
+            print("Error: --adaptive cannot be combined with --processes (each process would adapt on its own).")
+            sys.exit(1)
+        print(f"Scraping {len(identifiers)} identifier(s) in {args.processes} processes...\n")
+        exit_codes = run_shard_processes(os.path.abspath(__file__), sys.argv[1:], identifiers, args.processes)
+        for index, code in enumerate(exit_codes):
+            if code != 0:
+                print(f"Warning: shard {index}/{args.processes} exited with code {code}")
+        results = [] if args.json else None
+        merge_shard_results(identifiers, args.output, args.processes, args.metrics, results)
+        if args.strategy_stats and not args.fixed_order:
+            merge_shard_strategy_stats(args.strategy_stats, args.processes)
+        if results is not None:
+            print_json_output(results)
+        return
+    
+    # This process scrapes one shard, into its own partial results file and checkpoint
+    output_file = args.output
+    if args.shard:
+        shard_index, shard_count = args.shard
+        identifiers = select_shard(identifiers, shard_index, shard_count)
+        output_file = shard_path(args.output, shard_index, shard_count)
+        if args.checkpoint:
+            args.checkpoint = f"{args.checkpoint}.shard-{shard_index}-of-{shard_count}"
+        if not identifiers:
+            print(f"Shard {shard_index}/{shard_count} has no identifiers.")
+            open_result_writer(output_file, 'jsonl', args.metrics).close()
+            return
+    
+    # Identifiers already recorded in the checkpoint are not scraped again
+    completed = {}
+    if args.resume:
+        if not args.checkpoint:
+            print("Error: --resume requires --checkpoint.")
+            sys.exit(1)
+        completed = load_checkpoint(args.checkpoint)
+        # Transient failures are worth another try
+        retrying = sum(1 for identifier in identifiers if completed.get(identifier, {}).get('retryable'))
+        completed = {identifier: result for identifier, result in completed.items() if not result.get('retryable')}
+        resumed = sum(1 for identifier in identifiers if identifier in completed)
+        print(f"Resuming from {args.checkpoint}: {resumed} identifier(s) already done, {retrying} retryable failure(s) to retry")
+    pending_identifiers = [identifier for identifier in identifiers if identifier not in completed]
+    checkpoint = CheckpointWriter(args.checkpoint) if args.checkpoint else None
+    
+    requested_workers = args.workers or (MAX_WORKERS if args.adaptive else DEFAULT_WORKERS)
+    if args.backend == 'async':
+        import async_scraper
+        workers = max(1, min(requested_workers, async_scraper.MAX_CONCURRENCY))
+    else:
+        workers = max(1, min(requested_workers, MAX_WORKERS))
+    
+    if args.shard:
+        print(f"Shard {args.shard[0]}/{args.shard[1]}: scraping page numbers for {len(identifiers)} identifier(s)...")
+    else:
+        print(f"Scraping page numbers for {len(identifiers)} identifier(s)...")
+    if args.adaptive:
+        print(f"Rate limit: adaptive, starting at {delay} seconds between requests (up to {workers} worker(s), {args.backend} backend)\n")
+    else:
+        print(f"Rate limit: {delay} seconds between requests ({workers} worker(s), {args.backend} backend)\n")
     
-    print(f"Scraping page numbers for {len(identifiers)} identifier(s)...")
-    print(f"Rate limit: {delay} seconds between requests\n")
+    if args.base_url:
+        http_client.set_archive_base_url(args.base_url)
     
+    if args.http_cache:
+        http_client.set_validator_store(ValidatorStore(args.http_cache))
+    
+    if args.no_stream_details:
+        http_client.set_details_streaming(False)
+    
+    # Secondary strategies (page_numbers.json, scandata) get shorter read timeouts
+    short_read = args.read_timeout / 2
+    http_client.set_retry_policy(RetryPolicy(
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        kind_timeouts={
+            KIND_PAGE_NUMBERS_JSON: (args.connect_timeout, short_read),
+            KIND_SCANDATA: (args.connect_timeout, short_read),
+        },
+        max_attempts=max(0, args.retries) + 1,
+        deadline=args.deadline or None,
+    ))
+    
+    # Learn which fallback method works for each identifier family as the batch runs
+    # A shard starts from the shared statistics file but saves only what it learned to its own file
+    stats = None
+    stats_baseline = None
+    if not args.fixed_order:
+        stats = StrategyStats(args.strategy_stats)
+        if args.strategy_stats:
+            print(f"Using strategy statistics: {args.strategy_stats}\n")
+            if args.shard:
+                stats_baseline = stats.summary()
+    
+    cache = None
+    if args.cache and not args.no_cache:
+        cache = ResultCache(args.cache)
+        print(f"Using result cache: {args.cache}{' (refreshing)' if args.refresh else ''}\n")
+    
+    # Every request takes a token from one global rate limiter (cache hits send none); results come back in input order
+    if args.adaptive:
+        limiter = AdaptiveRateLimiter.from_delay(delay, MIN_DELAY_SECONDS, workers, concurrency=min(workers, DEFAULT_WORKERS))
+        http_client.set_response_observer(limiter)
+    elif args.rate_lock:
+        limiter = FileRateLimiter.from_delay(args.rate_lock, delay)
+    else:
+        limiter = RateLimiter.from_delay(delay)
+    
+    # Resolve what we can with bulk search requests; cached identifiers don't need it
+    prefetched = None
+    if args.prefetch:
+        lookup = [identifier for identifier in pending_identifiers
+                  if cache is None or args.refresh or not cache.contains(identifier)]
+        prefetch_stats = PrefetchStats()
+        prefetched = prefetch_page_counts(lookup, args.prefetch_batch_size, limiter, prefetch_stats)
+        print(f"Prefetch: resolved {len(prefetched)} of {len(lookup)} identifier(s) "
+              f"in {prefetch_stats.requests} search request(s); scraping the rest individually\n")
+    
+    if args.backend == 'async':
+        batch_results = async_scraper.scrape_batch(pending_identifiers, workers, limiter, cache=cache,
+                                                   refresh=args.refresh, stats=stats, prefetched=prefetched,
+                                                   instrument=args.metrics)
+    else:
+        scrape = functools.partial(scrape_page_number, cache=cache, refresh=args.refresh, limiter=limiter, stats=stats,
+                                   prefetched=prefetched, instrument=args.metrics)
+        # The batch is planned once, as it is fed to the workers, and each plan drives its item's requests
+        batch_results = scrape_batch(iter_plans(pending_identifiers), lambda plan: scrape(plan.identifier, plan=plan),
+                                     workers)
+    
+    # Results are written to the output file as they arrive, in input order;
+    # they are only kept in memory when needed for the summary listing or --json
+    keep_results = args.json or len(identifiers) <= SUMMARY_LIST_LIMIT
     results = []
+    successful = 0
+    retryable = 0
+    metrics_summary = MetricsSummary() if args.metrics else None
+    if args.shard:
+        writer = open_result_writer(output_file, 'jsonl', args.metrics)
+    else:
+        writer = open_output_writer(output_file, args.metrics)
     for i, identifier in enumerate(identifiers, 1):
-        # Add delay before processing (except for the first one)
-        if i > 1:
-            time.sleep(delay)
-        
-        print(f"[{i}/{len(identifiers)}] Processing: {identifier}")
-        result = scrape_page_number(identifier)
-        results.append(result)
-        
-        if result['success']:
-            print(f"  ✓ Found {result['page_number']} pages")
+        if identifier in completed:
+            result = completed[identifier]
         else:
-            error_msg = result.get('error', 'Page number not found')
-            print(f"  ✗ Error: {error_msg}")
+            result = next(batch_results)
+            if checkpoint is not None:
+                checkpoint.write(result)
+            
+            print(f"[{i}/{len(identifiers)}] Processed: {result['identifier']}")
+            
+            if result['success']:
+                print(f"  ✓ Found {result['page_number']} pages")
+            else:
+                error_msg = result.get('error', 'Page number not found')
+                print(f"  ✗ Error: {error_msg}")
+            
+            if args.adaptive and i % ADAPTIVE_REPORT_INTERVAL == 0:
+                state = limiter.snapshot()
+                print(f"  Adaptive rate: {state['rate']} requests/s, concurrency {state['concurrency_limit']}")
+        
+        writer.write(result)
+        successful += 1 if result['success'] else 0
+        retryable += 1 if result.get('retryable') else 0
+        if metrics_summary is not None:
+            metrics_summary.add(result)
+        if keep_results:
+            results.append(result)
     
     # Display summary
     print("\n" + "="*60)
     print("SUMMARY")
     print("="*60)
-    successful = sum(1 for r in results if r['success'])
-    print(f"Total processed: {len(results)}")
+    print(f"Total processed: {len(identifiers)}")
     print(f"Successful: {successful}")
-    print(f"Failed: {len(results) - successful}")
-    print("\nResults:")
-    for result in results:
-        status = f"✓ {result['page_number']} pages" if result['success'] else f"✗ {result.get('error', 'Not found')}"
-        print(f"  {result['identifier']}: {status}")
+    print(f"Failed: {len(identifiers) - successful}")
+    if retryable:
+        hint = " (rerun with --resume to retry them)" if args.checkpoint else ""
+        print(f"  Retryable (transient) failures: {retryable}{hint}")
+    if cache is not None:
+        print(f"Cache hits: {cache.hits}")
+    if http_client.get_validator_store() is not None:
+        print(f"Unchanged responses revalidated (304): {http_client.get_validator_store().revalidated}")
+    if args.adaptive:
+        state = limiter.snapshot()
+        print(f"Final adaptive rate: {state['rate']} requests/s, concurrency {state['concurrency_limit']} "
+              f"({state['backoffs']} backoff(s), {state['throttled']} throttled/timed-out request(s))")
+    if stats is not None:
+        print_strategy_orders(stats)
+    if metrics_summary is not None and metrics_summary.items:
+        print_metrics_summary(metrics_summary)
+    if len(identifiers) <= SUMMARY_LIST_LIMIT:
+        print("\nResults:")
+        for result in results:
+            status = f"✓ {result['page_number']} pages" if result['success'] else f"✗ {result.get('error', 'Not found')}"
+            print(f"  {result['identifier']}: {status}")
     
-    # Save results
-    save_results(results, args.output)
+    # Finish the output file
+    close_output_writer(writer)
+    if cache is not None:
+        cache.close()
+    if checkpoint is not None:
+        checkpoint.close()
+    if stats is not None and args.strategy_stats:
+        if args.shard:
+            stats.save(shard_stats_path(args.strategy_stats, *args.shard), baseline=stats_baseline)
+        else:
+            stats.save()
     
-    # Output JSON if requested
-    if args.json:
-        print("\nJSON Output:")
-        print(json.dumps(results, indent=2, ensure_ascii=False))
+    # Output JSON if requested (a shard's results are in its shard file; the driver prints them merged)
+    if args.json and not args.shard:
+        print_json_output(results)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,265 @@
+"""
+Sharded Runs Across Processes and Machines
+Splits an identifier list into N shards by a stable hash of each identifier,
+so a large run can be spread over several processes (one BeautifulSoup-bound
+Python process per core) or machines. Each shard writes its results to its
+own partial JSONL file; merge_shards() reads them back in the original input
+order.
+
+Processes on one host share a single rate budget through a lock file
+(FileRateLimiter), so sharding doesn't multiply the load on archive.org.
+"""
+
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SHARD_SPEC_PATTERN = re.compile(r'^(\d+)/(\d+)$')
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    Parse a shard spec such as "0/4" (the first of four shards).
+
+    Args:
+        spec: "index/count", with 0 <= index < count
+
+    Returns:
+        Tuple of (index, count)
+
+    Raises:
+        ValueError: The spec is malformed or out of range
+    """
+    match = SHARD_SPEC_PATTERN.match(spec.strip())
+    if not match:
+        raise ValueError(f"Invalid shard {spec!r} (expected INDEX/COUNT, e.g. 0/4)")
+    index, count = int(match.group(1)), int(match.group(2))
+    if count < 1 or index >= count:
+        raise ValueError(f"Invalid shard {spec!r} (INDEX must be between 0 and COUNT-1)")
+    return index, count
+
+
+def shard_of(identifier: str, count: int) -> int:
+    """
+    Return the shard an identifier belongs to. The hash is stable across
+    processes, machines and Python versions (unlike hash()).
+
+    Args:
+        identifier: The identifier ID
+        count: Number of shards
+
+    Returns:
+        Shard index in range(count)
+    """
+    digest = hashlib.blake2b(identifier.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count
+
+
+def select_shard(identifiers: Iterable[str], index: int, count: int) -> List[str]:
+    """Return the identifiers of one shard, in input order"""
+    return [identifier for identifier in identifiers if shard_of(identifier, count) == index]
+
+
+def shard_path(path: str, index: int, count: int) -> str:
+    """
+    Return the partial results file of a shard, next to the final output.
+
+    e.g. ("results.xlsx", 0, 4) -> "results.shard-0-of-4.jsonl"
+    """
+    base = path.rsplit('.', 1)[0] if '.' in os.path.basename(path) else path
+    return f"{base}.shard-{index}-of-{count}.jsonl"
+
+
+class _ShardReader:
+    """Reads a shard's partial results in order, one lookahead line at a time"""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'r', encoding='utf-8') if os.path.exists(path) else None
+        self._next = None
+        self._advance()
+
+    def _advance(self):
+        self._next = None
+        while self._file is not None:
+            line = self._file.readline()
+            if not line:
+                self._file.close()
+                self._file = None
+                return
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # Truncated line from a shard that died mid-write
+            if isinstance(result, dict) and 'identifier' in result:
+                self._next = result
+                return
+
+    def take(self, identifier: str) -> Optional[Dict]:
+        """Return the next result if it is for this identifier (otherwise it is missing)"""
+        if self._next is None or self._next['identifier'] != identifier:
+            return None
+        result = self._next
+        self._advance()
+        return result
+
+
+def merge_shards(identifiers: Iterable[str], paths: List[str]) -> Iterator[Tuple[str, Optional[Dict]]]:
+    """
+    Merge shard partial results back into input order, streaming (each
+    shard file is already in input order, so only one line per shard is
+    held in memory).
+
+    Args:
+        identifiers: The full, deduplicated identifier list the shards were cut from
+        paths: Partial results file of each shard, by shard index
+
+    Yields:
+        (identifier, result) in input order; result is None if its shard
+        has no result for it (e.g. the shard crashed)
+    """
+    readers = [_ShardReader(path) for path in paths]
+    for identifier in identifiers:
+        yield identifier, readers[shard_of(identifier, len(readers))].take(identifier)
+
+
+@contextmanager
+def _file_lock(file):
+    """Hold an exclusive lock on an open file (fcntl, or msvcrt on Windows)"""
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileRateLimiter:
+    """
+    Rate limiter shared by every process (and thread) on a host through a
+    lock file, with the same interface as batch.RateLimiter.
+
+    The file holds the earliest time the next request may be sent; taking
+    a token moves it one interval on, so all processes together send at
+    most `rate` requests per second. Concurrency is not limited.
+    """
+
+    def __init__(self, path: str, rate: float):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.path = path
+        self.rate = rate
+        self.interval = 1.0 / rate
+        self._file = open(path, 'a+b')
+        self._lock = threading.Lock()  # flock is per open file, so threads also need a lock
+
+    @classmethod
+    def from_delay(cls, path: str, delay: float) -> 'FileRateLimiter':
+        """
+        Build a limiter that allows one request every `delay` seconds across all processes.
+
+        Args:
+            path: The shared lock file (created if missing)
+            delay: Seconds between requests
+        """
+        return cls(path, 1.0 / delay)
+
+    def try_acquire(self) -> float:
+        """
+        Take the next request token if its time has come, without blocking.
+
+        Returns:
+            0 if a token was taken, otherwise the seconds to wait before retrying
+        """
+        with self._lock, _file_lock(self._file):
+            self._file.seek(0)
+            try:
+                next_start = float(self._file.read().decode('ascii') or 0)
+            except ValueError:
+                next_start = 0.0
+            now = time.time()
+            if next_start > now:
+                return next_start - now
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.write(repr(now + self.interval).encode('ascii'))
+            self._file.flush()
+            return 0
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def try_acquire_slot(self) -> float:
+        """Take a concurrency slot for one identifier (always free here)"""
+        return 0
+
+    def acquire_slot(self):
+        """Take a concurrency slot for one identifier (always free here)"""
+
+    def release(self):
+        """Free the slot taken by acquire_slot() (no-op here)"""
+
+    def close(self):
+        """Close the lock file"""
+        self._file.close()
+
+
+def run_shard_processes(script: str, argv: List[str], identifiers: List[str], count: int) -> List[int]:
+    """
+    Run `count` shards of a CLI run as local processes sharing one rate budget.
+
+    Each process gets the original arguments plus the full identifier list
+    (as a file), its --shard and a common --rate-lock file.
+
+    Args:
+        script: Path of the CLI script
+        argv: The original command-line arguments
+        identifiers: The deduplicated identifiers of the whole run
+        count: Number of processes (shards)
+
+    Returns:
+        Exit code of each shard process
+    """
+    with tempfile.TemporaryDirectory(prefix='scraper_shards_') as directory:
+        ids_path = os.path.join(directory, 'identifiers.txt')
+        with open(ids_path, 'w', encoding='utf-8') as f:
+            for identifier in identifiers:
+                f.write(identifier + '\n')
+        lock_path = os.path.join(directory, 'rate.lock')
+        processes = [
+            subprocess.Popen([sys.executable, script] + argv +
+                             ['--file', ids_path, '--shard', f'{index}/{count}', '--rate-lock', lock_path])
+            for index in range(count)
+        ]
+        try:
+            return [process.wait() for process in processes]
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+            raise
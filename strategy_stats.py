@@ -0,0 +1,165 @@
+"""
+Strategy Hit Statistics
+Records which extraction method finds the page count for each identifier
+family and reorders the fallback chain accordingly, so families whose page
+count always comes from a late method (e.g. scandata) stop paying for the
+earlier methods' round-trips. Statistics can be saved to a JSON file and
+reused by later runs.
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from identifiers import classify_identifier, identifier_shape
+
+STATS_VERSION = 3  # Versions 1 and 2 used other family keys; such files are ignored
+MIN_SAMPLES = 5  # Identifiers of a family seen before its statistics change the order
+DEMOTE_MIN_ATTEMPTS = 20  # A method that never hit in this many attempts is tried only as a last resort
+
+
+def family_keys(identifier: str) -> Tuple[str, str]:
+    """
+    Return the statistics keys of an identifier, coarse to fine: its family
+    (identifiers.classify_identifier) and its family plus shape
+    (identifiers.identifier_shape).
+
+    e.g. "04315104.1697" -> ("dotted", "dotted/9.9")
+    """
+    family = classify_identifier(identifier)
+    return family, f"{family}/{identifier_shape(identifier)}"
+
+
+class StrategyStats:
+    """
+    Thread-safe per-family hit counts for the extraction methods.
+
+    Each identifier is counted under two keys (see family_keys): its family,
+    the same one request plans are built for, and its family and shape, so
+    that e.g. "a9a" and "9a" names learn separately. The order comes from
+    the shape key once it has min_samples identifiers, and from the family
+    key until then.
+
+    For each family and method, 'attempts' counts identifiers the method was
+    tried on and 'hits' those where it found the page count.
+    """
+
+    def __init__(self, path: Optional[str] = None, min_samples: int = MIN_SAMPLES):
+        self.path = path
+        self.min_samples = min_samples
+        self._families = {}  # family -> method -> {'attempts': n, 'hits': n}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def load(self, path: str):
+        """Merge statistics saved by an earlier run (an unreadable file is ignored)"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read strategy statistics from {path}: {e}")
+            return
+        if data.get('version') != STATS_VERSION:
+            return
+        with self._lock:
+            for family, methods in data.get('families', {}).items():
+                for method, counts in methods.items():
+                    entry = self._entry(family, method)
+                    entry['attempts'] += int(counts.get('attempts', 0))
+                    entry['hits'] += int(counts.get('hits', 0))
+
+    def save(self, path: Optional[str] = None, baseline: Optional[Dict[str, Dict[str, Dict[str, int]]]] = None):
+        """
+        Write the statistics to a JSON file (atomically replaced).
+
+        Args:
+            path: File to write (defaults to the path the statistics were loaded from)
+            baseline: Counters to leave out (from an earlier summary()), so the
+                file holds only what was recorded since, e.g. by one shard
+        """
+        path = path or self.path
+        if not path:
+            return
+        families = self.summary()
+        for family, methods in (baseline or {}).items():
+            for method, counts in methods.items():
+                entry = families.get(family, {}).get(method)
+                if entry is not None:
+                    entry['attempts'] = max(0, entry['attempts'] - counts['attempts'])
+                    entry['hits'] = max(0, entry['hits'] - counts['hits'])
+        data = {'version': STATS_VERSION, 'families': families}
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def _entry(self, family: str, method: str) -> Dict[str, int]:
+        """Return the counters for a family and method (call with the lock held)"""
+        return self._families.setdefault(family, {}).setdefault(method, {'attempts': 0, 'hits': 0})
+
+    def record(self, identifier: str, attempted: Sequence[str], winner: Optional[str]):
+        """
+        Record the outcome of one identifier's fallback chain.
+
+        Args:
+            identifier: The identifier ID
+            attempted: Methods that were tried, in order
+            winner: The method that found the page count (None if none did)
+        """
+        keys = family_keys(identifier)
+        with self._lock:
+            for key in keys:
+                for method in attempted:
+                    entry = self._entry(key, method)
+                    entry['attempts'] += 1
+                    if method == winner:
+                        entry['hits'] += 1
+
+    def order(self, identifier: str, methods: Sequence[str]) -> List[str]:
+        """
+        Return methods in the order to try them for an identifier.
+
+        The statistics of the identifier's shape are used once it has
+        min_samples identifiers recorded, otherwise those of its family.
+        Until the family has min_samples identifiers too, the given
+        (default) order is kept. After that, methods are sorted by hit rate,
+        ties keeping the default order, and methods that never hit in
+        DEMOTE_MIN_ATTEMPTS attempts go last.
+
+        Args:
+            identifier: The identifier ID
+            methods: Methods in their default order
+
+        Returns:
+            The reordered list of methods
+        """
+        family, shape = family_keys(identifier)
+        with self._lock:
+            counts = self._families.get(shape)
+            key = shape if counts and max(entry['attempts'] for entry in counts.values()) >= self.min_samples else family
+        return self.order_for_family(key, methods)
+
+    def order_for_family(self, family: str, methods: Sequence[str]) -> List[str]:
+        """Return methods in the order to try them for a family (see order())"""
+        with self._lock:
+            counts = self._families.get(family)
+            if not counts or max(entry['attempts'] for entry in counts.values()) < self.min_samples:
+                return list(methods)
+            stats = {method: dict(counts.get(method, {'attempts': 0, 'hits': 0})) for method in methods}
+
+        def sort_key(indexed):
+            index, method = indexed
+            entry = stats[method]
+            demoted = entry['attempts'] >= DEMOTE_MIN_ATTEMPTS and entry['hits'] == 0
+            # Smoothed hit rate, so untried methods sit between proven and failing ones
+            rate = (entry['hits'] + 1) / (entry['attempts'] + 2)
+            return demoted, -rate, index
+
+        return [method for _, method in sorted(enumerate(methods), key=sort_key)]
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """Return a copy of the counters: family -> method -> {'attempts', 'hits'}"""
+        with self._lock:
+            return json.loads(json.dumps(self._families))